@@ -15,6 +15,29 @@ import uuid
 from app import db
 from models.models import Events, EventTeams
 from event_handlers.stability_party.item_system import get_team_items, use_item, complete_item_activation
+from event_handlers.stability_party.read_versions import team_etag
+from helper.http_cache import conditional_json_response
+
+def _team_inventory(event_id, team_id, event_uuid, team_uuid):
+    """Build a team's inventory response (only when it isn't cached)"""
+    # Check if event exists
+    event = Events.query.filter_by(id=event_uuid).first()
+    if not event:
+        return jsonify({"error": "Event not found"}), 404
+        
+    # Check if team exists and belongs to this event
+    team = EventTeams.query.filter_by(id=team_uuid, event_id=event_uuid).first()
+    if not team:
+        return jsonify({"error": "Team not found or does not belong to this event"}), 404
+        
+    # Get items
+    items = get_team_items(team_id, event_id)
+    
+    return jsonify({
+        "team_name": team.name,
+        "item_count": len(items),
+        "items": items
+    }), 200
 
 @app.route('/events/<event_id>/teams/<team_id>/items/inventory', methods=['GET'])
 def get_team_inventory(event_id, team_id):
@@ -36,24 +59,8 @@ def get_team_inventory(event_id, team_id):
         except ValueError:
             return jsonify({"error": "Invalid UUID format"}), 400
             
-        # Check if event exists
-        event = Events.query.filter_by(id=event_uuid).first()
-        if not event:
-            return jsonify({"error": "Event not found"}), 404
-            
-        # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_uuid, event_id=event_uuid).first()
-        if not team:
-            return jsonify({"error": "Team not found or does not belong to this event"}), 404
-            
-        # Get items
-        items = get_team_items(team_id, event_id)
-        
-        return jsonify({
-            "team_name": team.name,
-            "item_count": len(items),
-            "items": items
-        }), 200
+        etag = team_etag("inventory", event_uuid, team_uuid, items=True)
+        return conditional_json_response(etag, lambda: _team_inventory(event_id, team_id, event_uuid, team_uuid))
         
     except Exception as e:
         logging.error(f"Error getting team inventory: {str(e)}")
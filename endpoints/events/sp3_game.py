@@ -1,80 +1,62 @@
 from app import app, db
-from flask import request, jsonify
-from models.models import Events, EventTeams, EventTeamMemberMappings, EventTriggers, EventTasks, EventChallenges
-from models.stability_party_3 import SP3Regions, SP3EventTiles, SP3EventTileChallengeMapping
+from flask import Response, request, jsonify, stream_with_context
+from models.models import Events, EventTeams, EventTeamMemberMappings
+from models.stability_party_3 import SP3Regions, SP3EventTiles
 from event_handlers.stability_party.stability_party_handler import SaveData, is_shop_tile, is_star_tile, is_dock_tile
+from event_handlers.stability_party.board_graph import BoardGraph, get_board_graph
+from event_handlers.stability_party.trigger_index import TriggerIndex, get_trigger_index
+from event_handlers.stability_party.board_distances import get_board_distances
+from event_handlers.stability_party.standings import get_event_standings, refresh_event_standings, serialize_standing
+from event_handlers.stability_party.read_versions import team_etag
+from event_handlers.stability_party.live_updates import LIVE_UPDATES_KEEPALIVE_SECONDS, LIVE_UPDATES_LONG_POLL_SECONDS, build_event_snapshot, format_sse, live_hub
 import logging
 import json
 from datetime import datetime, timezone
 from helper.helpers import ModelEncoder
+from helper.http_cache import conditional_json_response
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def get_tile_name(tile_id):
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
+def get_tile_name(graph: BoardGraph, tile_id):
+    tile = graph.tile(tile_id)
     return tile.name if tile else "Unknown Tile"
 
-def get_region_name(region_id):
-    region = SP3Regions.query.filter_by(id=region_id).first()
+def get_region_name(graph: BoardGraph, region_id):
+    region = graph.region(region_id)
     return region.name if region else "Unknown Region"
 
-def get_tile_description(tile_id):
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
+def get_tile_description(graph: BoardGraph, tile_id):
+    tile = graph.tile(tile_id)
     return tile.description if tile else "No description available"
 
-def get_challenge_progress_string(challenge_id, tile_progress):
-    challenge = EventChallenges.query.filter_by(id=challenge_id).first()
+def get_challenge_progress_string(index: TriggerIndex, challenge_id, tile_progress):
+    challenge = index.challenges.get(str(challenge_id))
     if not challenge:
-        return "Unknown challenge"
+        return ["Unknown challenge"]
 
     task_strings = []
-
-    tasks = challenge.tasks
-    for task_id in tasks:
-        task = EventTasks.query.filter_by(id=task_id).first()
+    progress = tile_progress.get(str(challenge_id), {})
+    for task_id in challenge.tasks:
+        task = index.tasks.get(task_id)
         if task:
-            triggers = task.triggers
-            trigger_list = []
-            for trigger_id in triggers:
-                trigger = EventTriggers.query.filter_by(id=trigger_id).first()
-                if trigger.type == "DROP":
-                    trigger_list.append(f"{trigger.trigger}{" from " + trigger.source if trigger.source else ""}")
-                elif trigger.type == "KC":
-                    trigger_list.append(f"{trigger.trigger} KC")
-            triggers_message = " OR ".join(trigger_list)
-        
-            if str(challenge_id) in tile_progress:
-                progress = tile_progress[str(challenge_id)]
-                if task_id in progress:
-                    task_progress = progress[task_id]
-                    task_strings.append(f"{task_progress}/{task.quantity} {triggers_message}")
-                    continue
-            
-            task_strings.append(f"0/{task.quantity} {triggers_message}")
+            task_strings.append(f"{progress.get(task_id, 0)}/{task.quantity} {index.task_label(task)}")
 
     return task_strings
 
-def get_team_tile_challenges(save):
+def get_team_tile_challenges(index: TriggerIndex, save):
     if save.currentChallenges:
         return save.currentChallenges
     
     if save.currentTile:
-        challenges = SP3EventTileChallengeMapping.query.filter_by(
-            tile_id=save.currentTile,
-            type="TILE"
-        ).all()
-
-        return [challenge.challenge_id for challenge in challenges]
+        return [mapping.challenge_id for mapping in index.get_tile_challenges(save.currentTile) if mapping.type == "TILE"]
     
     return []
 
-def get_team_regional_challenges(save):
-    region = SP3Regions.query.filter_by(id=save.islandId).first()
-    if not region:
+def get_team_regional_challenges(index: TriggerIndex, save):
+    if save.islandId is None:
         return []
-    
-    return region.challenges if region.challenges else []
+    return index.get_region_challenges(save.islandId)
 
 @app.route("/events/<event_id>/users/<discord_id>/team", methods=['GET'])
 def get_user_team(event_id, discord_id):
@@ -100,224 +82,207 @@ def get_user_team(event_id, discord_id):
         logging.error(f"Error getting user team: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _team_stats(event_id, team_id):
+    """Build a team's /stats response (only when it isn't cached)"""
+    logging.info(f"Getting stats for team {team_id} in event {event_id}")
+    
+    # Check if event exists and is a SP3 event
+    event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+    if not event:
+        logging.warning(f"Event {event_id} not found or not a Stability Party event")
+        return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+    
+    # Check if team exists and belongs to this event
+    team: EventTeams = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+    if team is None:
+        logging.warning(f"Team {team_id} not found or does not belong to event {event_id}")
+        return jsonify({"error": "Team not found or does not belong to this event"}), 404
+    
+    logging.debug(f"Found team {team.name} (ID: {team_id})")
+    
+    # Get team members
+    members: EventTeamMemberMappings = EventTeamMemberMappings.query.filter_by(event_id=event_id, team_id=team_id).all()
+    logging.debug(f"Found {len(members)} team members")
+    member_names = [member.username for member in members]
+    
+    # Get team stats
+    save = SaveData.from_dict(team.data)
+    
+    # Find the current tile information
+    current_tile = SP3EventTiles.query.filter_by(
+        id=save.currentTile,
+        event_id=event_id
+    ).first()
+    
+    tile_info = None
+    if current_tile:
+        logging.debug(f"Current tile: {current_tile.name}")
+        tile_info = {
+            "id": str(current_tile.id),
+            "name": current_tile.name,
+            "description": current_tile.description
+        }
+    else:
+        logging.warning(f"Current tile information not found for tile {save.currentTile}")
+    
+    # Find the current island/region information
+    current_region = SP3Regions.query.filter_by(
+        event_id=event_id,
+        id=save.islandId
+    ).first()
+    
+    region_info = None
+    if current_region:
+        logging.debug(f"Current region: {current_region.name}")
+        region_info = {
+            "id": str(current_region.id),
+            "name": current_region.name,
+            "description": current_region.description
+        }
+    else:
+        logging.warning(f"Current region information not found for island ID {save.islandId}")
+    
+    star_locations: list[dict] = []
+    graph = get_board_graph(event_id)
+    distances = get_board_distances(event_id, graph)
+    for star_tile in event.data["star_tiles"]:
+        tile = graph.tile(star_tile)
+        if tile:
+            region = graph.region(tile.region_id)
+            star_locations.append({
+                "tile": str(tile.id),
+                "name": tile.name,
+                "description": tile.description,
+                "region": region.name if region else "Unknown Region",
+                "distance": distances.distance(save.currentTile, tile.id)
+            })
+
+    stats = {
+        "team_name": team.name,
+        "captain": str(team.captain),
+        "members": member_names,
+        "stars": save.stars,
+        "coins": save.coins,
+        "current_location": {
+            "tile": save.currentTile,
+            "tile_info": tile_info,
+            "region": region_info
+        },
+        "tile_completed": save.isTileCompleted,
+        "equipment": save.equipment.to_dict(),
+        "buffs": save.buffs,
+        "debuffs": save.debuffs,
+        "items": save.itemList,
+        "is_rolling": save.isRolling,
+        "event_star_locations": star_locations,
+        "nearest_star_distance": distances.nearest(save.currentTile, graph.star_tiles)[1]
+    }
+    
+    logging.info(f"Successfully retrieved stats for team {team.name} (ID: {team_id})")
+    return jsonify(stats), 200
+
 @app.route("/events/<event_id>/teams/<team_id>/stats", methods=['GET'])
 def get_team_stats(event_id, team_id):
     """Get the current stats for a team"""
     try:
-        logging.info(f"Getting stats for team {team_id} in event {event_id}")
-        
-        # Check if event exists and is a SP3 event
-        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
-        if not event:
-            logging.warning(f"Event {event_id} not found or not a Stability Party event")
-            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
-        
-        # Check if team exists and belongs to this event
-        team: EventTeams = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
-        if team is None:
-            logging.warning(f"Team {team_id} not found or does not belong to event {event_id}")
-            return jsonify({"error": "Team not found or does not belong to this event"}), 404
-        
-        logging.debug(f"Found team {team.name} (ID: {team_id})")
-        
-        # Get team members
-        members: EventTeamMemberMappings = EventTeamMemberMappings.query.filter_by(event_id=event_id, team_id=team_id).all()
-        logging.debug(f"Found {len(members)} team members")
-        member_names = [member.username for member in members]
-        
-        # Get team stats
-        save = SaveData.from_dict(team.data)
-        
-        # Find the current tile information
-        current_tile = SP3EventTiles.query.filter_by(
-            id=save.currentTile,
-            event_id=event_id
-        ).first()
-        
-        tile_info = None
-        if current_tile:
-            logging.debug(f"Current tile: {current_tile.name}")
-            tile_info = {
-                "id": str(current_tile.id),
-                "name": current_tile.name,
-                "description": current_tile.description
-            }
-        else:
-            logging.warning(f"Current tile information not found for tile {save.currentTile}")
-        
-        # Find the current island/region information
-        current_region = SP3Regions.query.filter_by(
-            event_id=event_id,
-            id=save.islandId
-        ).first()
-        
-        region_info = None
-        if current_region:
-            logging.debug(f"Current region: {current_region.name}")
-            region_info = {
-                "id": str(current_region.id),
-                "name": current_region.name,
-                "description": current_region.description
-            }
-        else:
-            logging.warning(f"Current region information not found for island ID {save.islandId}")
-        
-        star_locations: list[dict] = []
-        star_tiles = event.data["star_tiles"]
-        for star_tile in star_tiles:
-            tile = SP3EventTiles.query.filter_by(
-                event_id=event_id,
-                id=star_tile
-            ).first()
-            if tile:
-                star_locations.append({
-                    "tile": str(tile.id),
-                    "name": tile.name,
-                    "description": tile.description,
-                    "region": get_region_name(tile.region_id)
-                })
-
-        stats = {
-            "team_name": team.name,
-            "captain": str(team.captain),
-            "members": member_names,
-            "stars": save.stars,
-            "coins": save.coins,
-            "current_location": {
-                "tile": save.currentTile,
-                "tile_info": tile_info,
-                "region": region_info
-            },
-            "tile_completed": save.isTileCompleted,
-            "equipment": save.equipment.to_dict(),
-            "buffs": save.buffs,
-            "debuffs": save.debuffs,
-            "items": save.itemList,
-            "is_rolling": save.isRolling,
-            "event_star_locations": star_locations
-        }
-        
-        logging.info(f"Successfully retrieved stats for team {team.name} (ID: {team_id})")
-        return jsonify(stats), 200
+        etag = team_etag("stats", event_id, team_id, board=True, members=True)
+        return conditional_json_response(etag, lambda: _team_stats(event_id, team_id))
     except Exception as e:
         logging.error(f"Error getting team stats: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def _team_tile_progress(event_id, team_id):
+    """Build a team's /tile-progress response (only when it isn't cached)"""
+    # Check if event exists and is a SP3 event
+    event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+    if not event:
+        return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+    
+    # Check if team exists and belongs to this event
+    team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+    if not team:
+        return jsonify({"error": "Team not found or does not belong to this event"}), 404
+    
+    # Get team data
+    save = SaveData.from_dict(team.data, team.id)
+
+    # Board and challenge definitions come from the compiled caches; the only queries are for the team
+    graph = get_board_graph(event.id)
+    index = get_trigger_index(event.id)
+    tile_challenges = get_team_tile_challenges(index, save)
+    region_challenges = get_team_regional_challenges(index, save)
+
+    tile_progress = []
+    for challenge in tile_challenges:
+        tile_progress.extend(get_challenge_progress_string(index, challenge, save.tileProgress))
+
+    region_progress = []
+    for challenge in region_challenges:
+        region_progress.extend(get_challenge_progress_string(index, challenge, save.tileProgress))
+
+    response = {
+        "team_name": team.name,
+        "current_tile": get_tile_name(graph, save.currentTile),
+        "current_region": get_region_name(graph, save.islandId),
+        "tile_description": get_tile_description(graph, save.currentTile),
+        "tile_progress": tile_progress,
+        "region_progress": region_progress,
+        "is_tile_completed": save.isTileCompleted,
+        "is_rolling": save.isRolling,
+    }
+    
+    return jsonify(response), 200
+
 @app.route("/events/<event_id>/teams/<team_id>/tile-progress", methods=['GET'])
 def get_team_tile_progress(event_id, team_id):
     """Get the current tile progress for a team"""
     try:
-        # Check if event exists and is a SP3 event
-        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
-        if not event:
-            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
-        
-        # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
-        if not team:
-            return jsonify({"error": "Team not found or does not belong to this event"}), 404
-        
-        # Get team data
-        save = SaveData.from_dict(team.data)
-
-        tile_challenges = get_team_tile_challenges(save)
-        region_challenges = get_team_regional_challenges(save)
-
-        tile_progress = []
-        for challenge in tile_challenges:
-            progress_strings = get_challenge_progress_string(challenge, save.tileProgress)
-            for progress_string in progress_strings:
-                tile_progress.append(progress_string)
-
-        region_progress = []
-        for challenge in region_challenges:
-            progress_strings = get_challenge_progress_string(challenge, save.tileProgress)
-            for progress_string in progress_strings:
-                region_progress.append(progress_string)
-
-        response = {
-            "team_name": team.name,
-            "current_tile": get_tile_name(save.currentTile),
-            "current_region": get_region_name(save.islandId),
-            "tile_description": get_tile_description(save.currentTile),
-            "tile_progress": tile_progress,
-            "region_progress": region_progress,
-            "is_tile_completed": save.isTileCompleted,
-            "is_rolling": save.isRolling,
-        }
-        
-        return jsonify(response), 200
+        etag = team_etag("tile-progress", event_id, team_id, board=True, definitions=True)
+        return conditional_json_response(etag, lambda: _team_tile_progress(event_id, team_id))
     except Exception as e:
         logging.error(f"Error getting tile progress: {str(e)}")
         return jsonify({"error": str(e)}), 500
     
+def _team_total_progress(event_id, team_id):
+    """Build a team's /total-progress response (only when it isn't cached)"""
+    # Check if event exists and is a SP3 event
+    event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+    if not event:
+        return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+    
+    # Check if team exists and belongs to this event
+    team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+    if not team:
+        return jsonify({"error": "Team not found or does not belong to this event"}), 404
+    
+    # Get team data
+    save = SaveData.from_dict(team.data, team.id)
+
+    # Get all tile progress
+    for challenge_id, tasks in save.tileProgress.items():
+        for task_id, task_progress in tasks.items():
+            if task_progress >= 1:
+                save.isTileCompleted = True
+                break
+    
+    # Calculate total progress
+    total_progress = {
+        "stars": save.stars,
+        "coins": save.coins,
+        "completed_tiles": save.isTileCompleted,
+        "is_rolling": save.isRolling,
+        "current_tile": str(save.currentTile),
+        "current_region": str(save.islandId)
+    }
+    
+    return jsonify(total_progress), 200
+
 @app.route("/events/<event_id>/teams/<team_id>/total-progress", methods=['GET'])
 def get_team_total_progress(event_id, team_id):
     """Get the total progress of a team in the event"""
     try:
-        # Check if event exists and is a SP3 event
-        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
-        if not event:
-            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
-        
-        # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
-        if not team:
-            return jsonify({"error": "Team not found or does not belong to this event"}), 404
-        
-        # Get team data
-        save = SaveData.from_dict(team.data)
-
-        def get_challenge_progress_string(challenge_id, tile_progress):
-            challenge = EventChallenges.query.filter_by(id=challenge_id).first()
-            if not challenge:
-                return "Unknown challenge"
-
-            task_strings = []
-
-            tasks = challenge.tasks
-            for task_id in tasks:
-                task = EventTasks.query.filter_by(id=task_id).first()
-                if task:
-                    triggers = task.triggers
-                    trigger_list = []
-                    for trigger_id in triggers:
-                        trigger = EventTriggers.query.filter_by(id=trigger_id).first()
-                        if trigger.type == "DROP":
-                            trigger_list.append(f"{trigger.trigger}{" from " + trigger.source if trigger.source else ""}")
-                        elif trigger.type == "KC":
-                            trigger_list.append(f"{trigger.trigger} KC")
-                    triggers_message = " OR ".join(trigger_list)
-                
-                    if str(challenge_id) in tile_progress:
-                        progress = tile_progress[str(challenge_id)]
-                        if task_id in progress:
-                            task_progress = progress[task_id]
-                            task_strings.append(f"{task_progress}/{task.quantity} {triggers_message}")
-                            continue
-                    
-                    task_strings.append(f"0/{task.quantity} {triggers_message}")
-
-            return task_strings
-
-        # Get all tile progress
-        for challenge_id, tasks in save.tileProgress.items():
-            for task_id, task_progress in tasks.items():
-                if task_progress >= 1:
-                    save.isTileCompleted = True
-                    break
-        
-        # Calculate total progress
-        total_progress = {
-            "stars": save.stars,
-            "coins": save.coins,
-            "completed_tiles": save.isTileCompleted,
-            "is_rolling": save.isRolling,
-            "current_tile": str(save.currentTile),
-            "current_region": str(save.islandId)
-        }
-        
-        return jsonify(total_progress), 200
+        etag = team_etag("total-progress", event_id, team_id)
+        return conditional_json_response(etag, lambda: _team_total_progress(event_id, team_id))
     except Exception as e:
         logging.error(f"Error getting total progress: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -339,49 +304,22 @@ def get_event_progress(event_id):
             time_delta = end_time - now
             time_remaining = max(0, time_delta.total_seconds())
         
-        # Get all teams for this event
-        teams = EventTeams.query.filter_by(event_id=event_id).all()
-        
-        # Prepare team standings
-        standings = []
-        for team in teams:
-            save = SaveData.from_dict(team.data)
-            
-            # Get current tile information
-            current_tile = SP3EventTiles.query.filter_by(
-                event_id=event_id, 
-                tile_number=save.currentTile
-            ).first()
-            
-            # Get current region information  
-            current_region = SP3Regions.query.filter_by(
-                event_id=event_id,
-                id=save.islandId
-            ).first()
-            
-            region_name = current_region.name if current_region else "Unknown"
-            
-            standings.append({
-                "team_id": str(team.id),
-                "team_name": team.name,
-                "stars": save.stars,
-                "coins": save.coins,
-                "current_tile": save.currentTile,
-                "current_region": region_name,
-                "tile_completed": save.isTileCompleted
-            })
+        standings_rows = get_event_standings(event.id)
+        if not standings_rows and EventTeams.query.filter_by(event_id=event.id).first() is not None:
+            # Teams whose standings haven't been computed yet (e.g. written before the table existed)
+            refresh_event_standings(event.id)
+            db.session.commit()
+            standings_rows = get_event_standings(event.id)
         
-        # Sort by stars (descending) and then by coins (descending)
-        standings.sort(key=lambda x: (x["stars"], x["coins"]), reverse=True)
-        
-        # Add ranking to each team
-        for i, team in enumerate(standings):
-            team["rank"] = i + 1
+        graph = get_board_graph(event.id)
+        distances = get_board_distances(event.id, graph)
+
+        # Standings are stored ranked by stars, then coins
+        standings = [serialize_standing(row, graph, distances) for row in standings_rows]
         
         # Get event regions/islands
-        regions = SP3Regions.query.filter_by(event_id=event_id).all()
         region_info = []
-        for region in regions:
+        for region in sorted(graph.regions.values(), key=lambda region: region.name):
             region_info.append({
                 "id": str(region.id),
                 "name": region.name,
@@ -397,7 +335,7 @@ def get_event_progress(event_id):
             "time_remaining_seconds": time_remaining,
             "regions": region_info,
             "team_standings": standings,
-            "total_teams": len(teams)
+            "total_teams": len(standings)
         }
         
         return jsonify(response), 200
@@ -405,6 +343,140 @@ def get_event_progress(event_id):
         logging.error(f"Error getting event progress: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/events/<event_id>/distances", methods=['GET'])
+def get_board_distances_endpoint(event_id):
+    """
+    Get board distances (moves along the board; None if unreachable)
+
+    ?from=<tile>&to=<tile>: the distance between two tiles
+    ?from=<tile>: the distance to each star and the nearest one
+    no arguments: the full table
+    """
+    try:
+        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+        if not event:
+            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+
+        graph = get_board_graph(event.id)
+        distances = get_board_distances(event.id, graph)
+        from_tile = request.args.get("from")
+        to_tile = request.args.get("to")
+
+        if from_tile is None:
+            if to_tile is not None:
+                return jsonify({"error": "'to' requires 'from'"}), 400
+            return jsonify(distances.to_dict()), 200
+
+        if graph.tile(from_tile) is None:
+            return jsonify({"error": f"Tile {from_tile} not found on this board"}), 404
+
+        if to_tile is not None:
+            if graph.tile(to_tile) is None:
+                return jsonify({"error": f"Tile {to_tile} not found on this board"}), 404
+            return jsonify({"from": from_tile, "to": to_tile, "distance": distances.distance(from_tile, to_tile)}), 200
+
+        nearest_tile, nearest_distance = distances.nearest(from_tile, graph.star_tiles)
+        return jsonify({
+            "from": from_tile,
+            "stars": [{"tile": star_tile, "distance": distances.distance(from_tile, star_tile)} for star_tile in sorted(graph.star_tiles)],
+            "nearest_star": {"tile": nearest_tile, "distance": nearest_distance} if nearest_tile else None
+        }), 200
+    except Exception as e:
+        logging.error(f"Error getting board distances: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/events/<event_id>/stream", methods=['GET'])
+def stream_event_updates(event_id):
+    """
+    Follow an event's standings and team states as server-sent events
+
+    The first event is a snapshot of the whole event; each later "update"
+    holds the standings rows that changed, teams that left and the state of
+    the teams that were written. Reconnecting with Last-Event-ID (or ?since=)
+    resumes from the last update received.
+    """
+    try:
+        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+        if not event:
+            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+        event_id = event.id
+        cursor = request.headers.get("Last-Event-ID") or request.args.get("since")
+
+        if not live_hub.subscribe(event_id, hold=True):
+            response = jsonify({"error": "Too many open streams, poll /updates instead"})
+            response.headers["Retry-After"] = str(int(LIVE_UPDATES_KEEPALIVE_SECONDS))
+            return response, 503
+        # Don't hold a database connection while the stream is open
+        db.session.close()
+    except Exception as e:
+        logging.error(f"Error opening event stream: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        current = cursor
+        try:
+            yield f"retry: {int(LIVE_UPDATES_KEEPALIVE_SECONDS * 1000)}\n\n"
+            while True:
+                updates = live_hub.wait(event_id, current, LIVE_UPDATES_KEEPALIVE_SECONDS)
+                if updates is None:
+                    snapshot = build_event_snapshot(event_id)
+                    db.session.close()
+                    current = snapshot["cursor"]
+                    yield format_sse(snapshot, "snapshot", current)
+                elif not updates:
+                    yield ": keepalive\n\n"
+                else:
+                    for update in updates:
+                        yield update.sse
+                    current = updates[-1].cursor
+        finally:
+            live_hub.unsubscribe(event_id, hold=True)
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/events/<event_id>/updates", methods=['GET'])
+def poll_event_updates(event_id):
+    """
+    Long-poll an event's updates (the same updates /stream sends)
+
+    ?since=<cursor>: return the updates after it, waiting up to ?wait=
+    seconds for one (less when too many requests are already waiting); without a cursor (or with one that can't be resumed)
+    the response holds a snapshot of the whole event
+    """
+    try:
+        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+        if not event:
+            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+        since = request.args.get("since")
+        try:
+            wait = min(max(float(request.args.get("wait", 0)), 0), LIVE_UPDATES_LONG_POLL_SECONDS)
+        except ValueError:
+            return jsonify({"error": "'wait' must be a number of seconds"}), 400
+
+        # Past the limit of held threads, answer straight away instead of waiting
+        hold = wait > 0 and live_hub.subscribe(event.id, hold=True)
+        if not hold:
+            live_hub.subscribe(event.id)
+            wait = 0
+        try:
+            db.session.close()
+            updates = live_hub.wait(event.id, since, wait)
+            if updates is None:
+                snapshot = build_event_snapshot(event.id)
+                return jsonify({"cursor": snapshot["cursor"], "updates": [snapshot]}), 200
+            return jsonify({
+                "cursor": updates[-1].cursor if updates else since,
+                "updates": [update.message for update in updates]
+            }), 200
+        finally:
+            live_hub.unsubscribe(event.id, hold=hold)
+    except Exception as e:
+        logging.error(f"Error polling event updates: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 class RollProgressionPayload():
     eventId: str
     teamId: str
@@ -601,85 +673,87 @@ def first_island_action(event_id, team_id):
         logging.error(f"Error processing first island action: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/events/<event_id>/teams/<team_id>/available-actions", methods=['GET'])
-def get_available_actions(event_id, team_id):
-    """Get available actions for a team based on their current position"""
-    try:
-        # Check if event exists and is a SP3 event
-        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
-        if not event:
-            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
-        
-        # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
-        if not team:
-            return jsonify({"error": "Team not found or does not belong to this event"}), 404
-        
-        # Load team data
-        save = SaveData.from_dict(team.data)
-        
-        # Get the current tile information
-        current_tile = SP3EventTiles.query.filter_by(
-            event_id=event_id, 
-            tile_number=save.currentTile
-        ).first()
-        
-        if not current_tile:
-            return jsonify({"error": "Current tile information not found"}), 404
-        
-        # Determine available actions
-        available_actions = []
-        
-        # If the tile is completed, they can roll
-        if save.isTileCompleted and not save.isRolling:
+def _available_actions(event_id, team_id):
+    """Build a team's /available-actions response (only when it isn't cached)"""
+    # Check if event exists and is a SP3 event
+    event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+    if not event:
+        return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+    
+    # Check if team exists and belongs to this event
+    team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+    if not team:
+        return jsonify({"error": "Team not found or does not belong to this event"}), 404
+    
+    # Load team data
+    save = SaveData.from_dict(team.data)
+    
+    # Get the current tile from the compiled board (the board is part of the ETag)
+    graph = get_board_graph(event.id)
+    current_tile = graph.tile(save.currentTile)
+    
+    if not current_tile:
+        return jsonify({"error": "Current tile information not found"}), 404
+    
+    # Determine available actions
+    available_actions = []
+    
+    # If the tile is completed, they can roll
+    if save.isTileCompleted and not save.isRolling:
+        available_actions.append({
+            "action": "roll",
+            "description": "Roll dice to move forward"
+        })
+    
+    # If they are in the middle of rolling and on a special tile
+    if save.isRolling:
+        if is_shop_tile(current_tile.id, graph):
             available_actions.append({
-                "action": "roll",
-                "description": "Roll dice to move forward"
+                "action": "buy_item",
+                "description": "Buy an item from the shop"
             })
-        
-        # If they are in the middle of rolling and on a special tile
-        if save.isRolling:
-            if is_shop_tile(current_tile.id):
-                available_actions.append({
-                    "action": "buy_item",
-                    "description": "Buy an item from the shop"
-                })
-            elif is_star_tile(current_tile.id):
+        elif is_star_tile(current_tile.id, graph):
+            available_actions.append({
+                "action": "buy_star",
+                "description": "Buy a star" 
+            })
+        elif is_dock_tile(current_tile.id, graph):
+            # Get available destinations
+            destinations = []
+            for region in graph.regions.values():
+                if str(region.id) != str(save.islandId):  # Don't include current island
+                    destinations.append({
+                        "id": str(region.id),
+                        "name": region.name
+                    })
+            
+            if destinations:
                 available_actions.append({
-                    "action": "buy_star",
-                    "description": "Buy a star" 
+                    "action": "charter_ship",
+                    "description": "Charter a ship to another island",
+                    "destinations": destinations
                 })
-            elif is_dock_tile(current_tile.id):
-                # Get available destinations
-                regions = SP3Regions.query.filter_by(event_id=event_id).all()
-                destinations = []
-                for region in regions:
-                    if region.id != save.islandId:  # Don't include current island
-                        destinations.append({
-                            "id": str(region.id),
-                            "name": region.name
-                        })
-                
-                if destinations:
-                    available_actions.append({
-                        "action": "charter_ship",
-                        "description": "Charter a ship to another island",
-                        "destinations": destinations
-                    })
-        
-        # Return the available actions
-        response = {
-            "current_tile": {
-                "number": save.currentTile,
-                "name": current_tile.name,
-                "description": current_tile.description
-            },
-            "is_completed": save.isTileCompleted,
-            "is_rolling": save.isRolling,
-            "available_actions": available_actions
-        }
-        
-        return jsonify(response), 200
+    
+    # Return the available actions
+    response = {
+        "current_tile": {
+            "number": str(current_tile.id),
+            "name": current_tile.name,
+            "description": current_tile.description
+        },
+        "is_completed": save.isTileCompleted,
+        "is_rolling": save.isRolling,
+        "available_actions": available_actions
+    }
+    
+    return jsonify(response), 200
+
+@app.route("/events/<event_id>/teams/<team_id>/available-actions", methods=['GET'])
+def get_available_actions(event_id, team_id):
+    """Get available actions for a team based on their current position"""
+    try:
+        etag = team_etag("available-actions", event_id, team_id, board=True)
+        return conditional_json_response(etag, lambda: _available_actions(event_id, team_id))
     except Exception as e:
         logging.error(f"Error getting available actions: {str(e)}")
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
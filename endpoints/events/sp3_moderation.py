@@ -3,6 +3,10 @@ from flask import request, jsonify
 from models.models import Events, EventTeams, EventTeamMemberMappings, Users
 from models.stability_party_3 import SP3Regions, SP3EventTiles, SP3EventTileChallengeMapping
 from event_handlers.stability_party.stability_party_handler import SaveData, save_team_data
+from event_handlers.stability_party.save_data import lock_team
+from event_handlers.stability_party.team_journal import undo_last_roll, rebuild_team_state
+from event_handlers.stability_party.board_io import export_board, import_board, invalidate_board_caches
+from models.stability_party_3 import SP3TeamJournal
 from sqlalchemy.orm.attributes import flag_modified
 from helper.discord_helper import create_discord_role, create_discord_text_channel, create_discord_voice_channel, get_event_category_id
 from helper.set_discord_role import add_discord_role
@@ -391,7 +395,7 @@ def force_complete_tile(event_id, team_id):
             return jsonify({"error": "Event not found or not a Stability Party event"}), 404
         
         # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             return jsonify({"error": "Team not found or does not belong to this event"}), 404
         
@@ -430,7 +434,7 @@ def set_team_stars(event_id, team_id):
             return jsonify({"error": "Event not found or not a Stability Party event"}), 404
         
         # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             return jsonify({"error": "Team not found or does not belong to this event"}), 404
         
@@ -466,7 +470,7 @@ def set_team_coins(event_id, team_id):
             return jsonify({"error": "Event not found or not a Stability Party event"}), 404
         
         # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             return jsonify({"error": "Team not found or does not belong to this event"}), 404
         
@@ -501,7 +505,7 @@ def move_team_to_tile(event_id, team_id):
             return jsonify({"error": "Event not found or not a Stability Party event"}), 404
         
         # Check if team exists and belongs to this event
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             return jsonify({"error": "Team not found or does not belong to this event"}), 404
         
@@ -543,20 +547,98 @@ def undo_team_roll(event_id, team_id):
             return jsonify({"error": "Event not found or not a Stability Party event"}), 404
         
         # Check if team exists and belongs to this event
+        team = lock_team(team_id, event_id)
+        if not team:
+            return jsonify({"error": "Team not found or does not belong to this event"}), 404
+        
+        # Restore the snapshot taken right before the team's last roll started
+        snapshot = undo_last_roll(team)
+        if snapshot is None:
+            db.session.rollback()
+            return jsonify({"error": "No roll to undo for this team"}), 400
+        
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Team's last roll undone successfully",
+            "restored_from": snapshot.created_at.isoformat()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error undoing team roll: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/events/<event_id>/moderation/teams/<team_id>/history", methods=['GET'])
+def get_team_history(event_id, team_id):
+    """List a team's most recent state changes, newest first"""
+    try:
         team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
         if not team:
             return jsonify({"error": "Team not found or does not belong to this event"}), 404
         
-        # Load team data
-        save = SaveData.from_dict(team.data)
+        limit = min(int(request.args.get("limit", 50)), 500)
+        entries = SP3TeamJournal.query.filter_by(team_id=team.id).order_by(SP3TeamJournal.id.desc()).limit(limit).all()
+        
+        return json.dumps([entry.serialize() for entry in entries], cls=ModelEncoder), 200
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+    except Exception as e:
+        logging.error(f"Error getting team history: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        # TODO: Undo roll logic
+@app.route("/events/<event_id>/moderation/teams/<team_id>/history/<int:journal_id>", methods=['GET'])
+def get_team_state_at(event_id, team_id, journal_id):
+    """Rebuild a team's data and challenge progress as they were right after a journal entry"""
+    try:
+        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        if not team:
+            return jsonify({"error": "Team not found or does not belong to this event"}), 404
         
-        # Save the updated team data
-        save_team_data(team, save)
+        state = rebuild_team_state(team.id, journal_id)
+        if state is None:
+            return jsonify({"error": "No history recorded for this team at that point"}), 404
+        
+        data, progress = state
+        return jsonify({"journal_id": journal_id, "data": data, "progress": progress}), 200
+    except Exception as e:
+        logging.error(f"Error rebuilding team state: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/events/<event_id>/moderation/board/export", methods=['GET'])
+def export_event_board(event_id):
+    """Export the event's board as a document that import can load into any event"""
+    try:
+        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+        if not event:
+            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+        
+        return jsonify(export_board(event.id)), 200
+    except Exception as e:
+        logging.error(f"Error exporting board: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/events/<event_id>/moderation/board/import", methods=['POST'])
+def import_event_board(event_id):
+    """Load a board document into the event in one transaction (?replace=true overwrites an existing board)"""
+    try:
+        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+        if not event:
+            return jsonify({"error": "Event not found or not a Stability Party event"}), 404
+        
+        document = request.get_json()
+        if not isinstance(document, dict):
+            return jsonify({"error": "Request body must be a board document"}), 400
+        
+        replace = request.args.get("replace", "false").lower() == "true"
+        counts = import_board(event.id, document, replace=replace)
+        db.session.commit()
+        invalidate_board_caches(event.id)
         
-        return jsonify({"message": "Team's last roll undone successfully"}), 200
+        return jsonify({"message": "Board imported successfully", "imported": counts}), 201
+    except (KeyError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({"error": f"Invalid board document: {str(e)}"}), 400
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error undoing team roll: {str(e)}")
+        logging.error(f"Error importing board: {str(e)}")
         return jsonify({"error": str(e)}), 500
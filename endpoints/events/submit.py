@@ -1,7 +1,13 @@
 from app import app, db
 from helper.helpers import ModelEncoder
-from flask import request
+from flask import request, jsonify
 from event_handlers.event_handler import EventHandler, EventSubmission  # Import the centralized event handler system
+from event_handlers.submission_filter import submission_filter
+from event_handlers.submission_dedupe import get_idempotency_key, submission_deduplicator
+from event_handlers.submission_queue import enqueue_submission, ensure_workers_started, get_queue_stats, is_async_ingest_enabled
+from models.models import EventSubmissionQueue
+import logging
+import uuid
 import json
 
 #input:
@@ -32,18 +38,110 @@ def submit_event():
     if data is None:
         return "No JSON received", 400
 
-    # Convert the incoming data to an EventSubmission object
-    event_submission = EventSubmission(
-        rsn=data.get("rsn"),
-        id=data.get("id"),
-        trigger=data.get("trigger"),
-        source=data.get("source"),
-        quantity=data.get("quantity"),
-        totalValue=data.get("totalValue"),
-        type=data.get("type")
-    )
+    event_submission = EventSubmission.from_dict(data)
 
-    # Pass the submission data to the centralized event handler system
-    response = EventHandler.handle_event(event_submission)
+    # Most drops aren't event triggers; skip the handlers entirely for those
+    if not submission_filter.allows(event_submission):
+        return json.dumps({"notifications": []}, cls=ModelEncoder)
+
+    # Dink retries on timeouts; a repeat of a submission we've already taken is dropped
+    key = get_idempotency_key(data, request.headers.get("Idempotency-Key"))
+    idempotency_key = key[0] if key else None
+    if key and not submission_deduplicator.claim(*key):
+        return json.dumps({"notifications": [], "duplicate": True}, cls=ModelEncoder)
+
+    try:
+        if is_async_ingest_enabled():
+            # Store it and let the queue workers process it and deliver the notifications
+            queued = enqueue_submission(data)
+            return json.dumps({"id": queued.id, "status": queued.status}, cls=ModelEncoder), 202
+
+        # Pass the submission data to the centralized event handler system
+        response = EventHandler.handle_event(event_submission)
+    except Exception:
+        # Nothing was applied, so let the client's retry through
+        if idempotency_key:
+            submission_deduplicator.release(idempotency_key)
+        raise
+
+    return json.dumps(response, cls=ModelEncoder)
+
+@app.route("/events/submit/batch", methods=['POST'])
+def submit_event_batch():
+    """
+    Submit an ordered array of submissions in one request
+
+    Submissions for the same team are applied in order against one in-memory
+    save and committed once, so bursts of drops don't rewrite the team data
+    for every item. Notifications come back concatenated in input order.
+    """
+    data = request.get_json()
+    if data is None:
+        return "No JSON received", 400
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        return "Expected a JSON array of submissions", 400
+
+    # Drop anything the whitelist pre-filter rejects; order is preserved
+    allowed = [item for item in data if submission_filter.allows(EventSubmission.from_dict(item))]
+
+    # Each item is deduplicated against earlier requests on its own key, if it has
+    # one; items of the same batch are never duplicates of each other
+    claimed_keys = {}
+    unique = []
+    for item in allowed:
+        key = get_idempotency_key(item)
+        if key is None:
+            unique.append(item)
+            continue
+        if key[0] not in claimed_keys:
+            claimed_keys[key[0]] = submission_deduplicator.claim(*key)
+        if claimed_keys[key[0]]:
+            unique.append(item)
+    if not unique:
+        return json.dumps({"notifications": []}, cls=ModelEncoder)
+
+    try:
+        if is_async_ingest_enabled():
+            # The batch stays together as one queue entry so it is still applied per team in one go
+            queued = enqueue_submission(unique)
+            return json.dumps({"id": queued.id, "status": queued.status}, cls=ModelEncoder), 202
+
+        submissions = [EventSubmission.from_dict(item) for item in unique]
+
+        response = EventHandler.handle_batch(submissions)
+    except Exception:
+        for idempotency_key, claimed in claimed_keys.items():
+            if claimed:
+                submission_deduplicator.release(idempotency_key)
+        raise
 
     return json.dumps(response, cls=ModelEncoder)
+
+@app.route("/events/submit/stats", methods=['GET'])
+def get_submit_stats():
+    """Report pre-filter pass/reject counts, duplicate counts and ingestion queue depth, lag and per-stage timings"""
+    try:
+        return json.dumps({
+            "filter": submission_filter.stats(),
+            "dedupe": submission_deduplicator.stats(),
+            "queue": get_queue_stats(),
+        }, cls=ModelEncoder)
+    except Exception as e:
+        logging.error(f"Error getting submission stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/events/submit/<submission_id>", methods=['GET'])
+def get_queued_submission(submission_id):
+    """Look up the status and notifications of a submission accepted in async mode"""
+    try:
+        queued = EventSubmissionQueue.query.filter_by(id=uuid.UUID(submission_id)).first()
+    except ValueError:
+        return jsonify({"error": "Invalid submission ID format"}), 400
+    if queued is None:
+        return jsonify({"error": "Submission not found"}), 404
+    return json.dumps(queued.serialize(), cls=ModelEncoder)
+
+@app.before_request
+def start_submission_workers():
+    # Workers start with the first request so CLI commands (migrations) never spawn them
+    ensure_workers_started()
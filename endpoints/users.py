@@ -5,6 +5,7 @@ from flask import request
 from models.models import Users, Splits, ClanPointsLog
 from models.models import ClanApplications, RankApplications, TierApplications, DiaryApplications, TimeSplitApplications
 from models.models import EventTeamMemberMappings, EventTeams
+from event_handlers.team_member_index import invalidate_team_member_index
 import json
 import logging
 from datetime import datetime, timezone
@@ -340,6 +341,8 @@ def remove_user_alt(id):
     EventTeamMemberMappings.query.filter_by(username=altName).delete()
 
     db.session.commit()
+    # Bulk deletes skip ORM events, so drop the cached member indexes by hand
+    invalidate_team_member_index()
     
     return json.dumps(user.serialize(), cls=ModelEncoder)
 
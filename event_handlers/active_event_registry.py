@@ -0,0 +1,132 @@
+"""
+In-process registry of events and their time windows
+
+Event handlers run on every Dink submission, and each of them used to query the
+events table just to find out which event (if any) it should act on. The events
+table is tiny, so the registry keeps a snapshot of every event that hasn't
+finished yet and answers "which STABILITY_PARTY events are live right now"
+from memory:
+- Start/end windows are evaluated at read time, so events flip on and off
+  exactly at their boundaries without waiting for a refresh
+- Several concurrent events of the same type are supported
+- The snapshot is refreshed every ACTIVE_EVENT_REFRESH_SECONDS, and immediately
+  after any Events row is inserted, updated or deleted through this process
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import object_session
+
+from app import db
+from models.models import Events
+
+ACTIVE_EVENT_REFRESH_SECONDS = int(os.getenv("ACTIVE_EVENT_REFRESH_SECONDS", "60"))
+
+def _as_utc(value: datetime) -> datetime:
+    # Event times are stored naive and treated as UTC throughout the codebase
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+class ActiveEvent:
+    """Read-only snapshot of an Events row"""
+
+    def __init__(self, id: uuid.UUID, type: str, name: str, thread_id: str | None, start_time: datetime, end_time: datetime) -> None:
+        self.id = id
+        self.type = type
+        self.name = name
+        self.thread_id = thread_id
+        self.start_time = _as_utc(start_time)
+        self.end_time = _as_utc(end_time)
+
+    def is_live(self, now: datetime) -> bool:
+        return self.start_time <= now <= self.end_time
+
+class ActiveEventRegistry:
+    def __init__(self) -> None:
+        self._events_by_type: Dict[str, List[ActiveEvent]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _needs_refresh(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > ACTIVE_EVENT_REFRESH_SECONDS
+
+    def refresh(self) -> None:
+        """Reload every event that hasn't ended yet"""
+        now = datetime.now(timezone.utc)
+        rows = db.session.query(
+            Events.id, Events.type, Events.name, Events.thread_id, Events.start_time, Events.end_time
+        ).filter(Events.end_time >= now.replace(tzinfo=None)).order_by(Events.start_time).all()
+
+        events_by_type: Dict[str, List[ActiveEvent]] = {}
+        for row in rows:
+            events_by_type.setdefault(row.type, []).append(
+                ActiveEvent(row.id, row.type, row.name, row.thread_id, row.start_time, row.end_time)
+            )
+
+        self._events_by_type = events_by_type
+        self._loaded_at = time.monotonic()
+        logging.debug(f"Active event registry refreshed with {len(rows)} current or upcoming events")
+
+    def _ensure_fresh(self) -> None:
+        if not self._needs_refresh():
+            return
+        with self._lock:
+            if self._needs_refresh():
+                self.refresh()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def get_events(self, event_type: str) -> List[ActiveEvent]:
+        """Get every current or upcoming event of a type, ordered by start time"""
+        self._ensure_fresh()
+        return list(self._events_by_type.get(event_type, []))
+
+    def get_active_events(self, event_type: str, now: Optional[datetime] = None) -> List[ActiveEvent]:
+        """Get every event of a type whose window contains now, ordered by start time"""
+        now = _as_utc(now) if now else datetime.now(timezone.utc)
+        return [event for event in self.get_events(event_type) if event.is_live(now)]
+
+    def get_active_event(self, event_type: str, now: Optional[datetime] = None) -> Optional[ActiveEvent]:
+        """Get the earliest-started live event of a type, if any"""
+        active = self.get_active_events(event_type, now)
+        return active[0] if active else None
+
+active_events = ActiveEventRegistry()
+
+def invalidate_active_events() -> None:
+    active_events.invalidate()
+
+# Only these columns are captured in the snapshot; updates to event.data (which
+# handlers do constantly) don't need to throw the registry away
+_SNAPSHOT_COLUMNS = ("type", "name", "thread_id", "start_time", "end_time")
+
+def _on_events_updated(mapper, connection, target) -> None:
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in _SNAPSHOT_COLUMNS):
+        _on_events_changed(mapper, connection, target)
+
+def _on_events_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info["active_events_dirty"] = True
+    active_events.invalidate()
+
+def _on_commit(session) -> None:
+    # Invalidate again once the change is visible to other sessions, so a refresh
+    # that raced the flush doesn't keep the old window around until the next TTL
+    if session.info.pop("active_events_dirty", False):
+        active_events.invalidate()
+
+sa_event.listen(Events, "after_insert", _on_events_changed)
+sa_event.listen(Events, "after_update", _on_events_updated)
+sa_event.listen(Events, "after_delete", _on_events_changed)
+sa_event.listen(db.session, "after_commit", _on_commit)
@@ -18,11 +18,15 @@ description_phrases = [
 ]
 
 def gnome_child_bone_handler(submission: EventSubmission) -> list[NotificationResponse]:
-    # Grab the 'Dink Testing' event
-    event = Events.query.filter(Events.type=="DINK_TEST").first()
-
     # Example logic for handling the event
-    if submission.trigger.lower() == "bones" and submission.source.lower() == "gnome child":
+    if submission.trigger.lower() == "bones" and (submission.source or "").lower() == "gnome child":
+        # Grab the 'Dink Testing' event. Any DINK_TEST event counts, not only one inside its
+        # start/end window, so this isn't an active_events lookup; the trigger check above
+        # keeps the query off every other submission
+        event = Events.query.filter(Events.type=="DINK_TEST").first()
+        if event is None:
+            return None
+
         # Use the helper function to modify event.data
         update_jsonb_field(event, "data", lambda data: data.update({"kills": data.get("kills", 0) + 1}))
         
@@ -18,6 +18,18 @@ class EventSubmission:
     totalValue: int | None
     type: str | None
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "EventSubmission":
+        return cls(
+            rsn=data.get("rsn"),
+            id=data.get("id"),
+            trigger=data.get("trigger"),
+            source=data.get("source"),
+            quantity=data.get("quantity"),
+            totalValue=data.get("totalValue"),
+            type=data.get("type")
+        )
+
 class NotificationAuthor:
     def __init__(self, name: str, icon_url: str | None = None, url: str | None = None) -> None:
         self.name = name
@@ -83,9 +95,10 @@ class NotificationResponse:
 
 class EventHandler:
     handlers = []
+    batch_handlers = {}
 
     @classmethod
-    def register_handler(cls, handler):
+    def register_handler(cls, handler, batch_handler=None):
         # make sure the handler is a function that takes an EventSubmission object and returns a NotificationResponse object
         if not callable(handler):
             raise ValueError("Handler must be a callable function")
@@ -100,18 +113,57 @@ class EventHandler:
         if handler.__annotations__["return"] != list[NotificationResponse]:
             raise ValueError("Handler must return a list of NotificationResponse objects")
         
+        # A batch handler takes an ordered list of submissions and returns one list of notifications per submission
+        if batch_handler is not None:
+            if not callable(batch_handler):
+                raise ValueError("Batch handler must be a callable function")
+            if batch_handler.__annotations__.get("submissions") != list[EventSubmission]:
+                raise ValueError("Batch handler must accept a list of EventSubmission objects as the first argument")
+            if batch_handler.__annotations__.get("return") != list[list[NotificationResponse]]:
+                raise ValueError("Batch handler must return a list of NotificationResponse lists")
+            cls.batch_handlers[handler] = batch_handler
+
         # Register the handler
         cls.handlers.append(handler)
         logging.info(f"Handler {handler.__name__} registered successfully.")
 
     @classmethod
-    def handle_event(cls, data: EventSubmission):
-        notifications: list[NotificationResponse] = []
+    def _run(cls, progress, key: str, call):
+        """Run one handler call, through progress.run(key, call) when given (the submission queue skips calls an earlier attempt committed)"""
+        if progress is None:
+            return call()
+        return progress.run(key, call)
+
+    @classmethod
+    def handle_event(cls, data: EventSubmission, progress=None):
+        notifications: list[dict] = []
+        for handler in cls.handlers:
+            responses = cls._run(progress, f"{handler.__name__}:0", lambda: [notif.to_dict() for notif in handler(data) or []])
+            notifications.extend(responses)
+        return {"notifications": notifications}
+
+    @classmethod
+    def handle_batch(cls, submissions: list[EventSubmission], progress=None):
+        """
+        Handle an ordered list of submissions, letting handlers with a batch version process them together
+
+        Notifications are returned in input order; for each submission, handlers contribute in registration order.
+        """
+        per_submission: list[list[dict]] = [[] for _ in submissions]
         for handler in cls.handlers:
-            responses: list[NotificationResponse] = handler(data)
-            if not responses:
-                continue
-            
-            for notif in responses:
-                notifications.append(notif.to_dict())
+            batch_handler = cls.batch_handlers.get(handler)
+            if batch_handler is not None:
+                results = cls._run(progress, f"{handler.__name__}:batch", lambda: [
+                    [notif.to_dict() for notif in responses or []] for responses in batch_handler(submissions)
+                ])
+            else:
+                results = [
+                    cls._run(progress, f"{handler.__name__}:{position}", lambda: [notif.to_dict() for notif in handler(submission) or []])
+                    for position, submission in enumerate(submissions)
+                ]
+
+            for position, responses in enumerate(results):
+                per_submission[position].extend(responses)
+
+        notifications = [notif for responses in per_submission for notif in responses]
         return {"notifications": notifications}
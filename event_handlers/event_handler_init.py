@@ -1,7 +1,11 @@
 from event_handlers.event_handler import EventHandler
+from event_handlers.submission_filter import submission_filter
 from event_handlers.dink_test.gnome_child_bone_handler import gnome_child_bone_handler
-from event_handlers.stability_party.stability_party_handler import stability_party_handler
+from event_handlers.stability_party.stability_party_handler import stability_party_handler, stability_party_batch_handler
 
 # Register your event handlers here
 EventHandler.register_handler(gnome_child_bone_handler)
-EventHandler.register_handler(stability_party_handler)
+EventHandler.register_handler(stability_party_handler, batch_handler=stability_party_batch_handler)
+
+# Triggers handled without database trigger rows must be let through the submission pre-filter
+submission_filter.register_static_trigger("bones", "gnome child")
@@ -0,0 +1,96 @@
+"""
+All-pairs shortest distances over an event's board
+
+Distances are the number of moves along nextTiles (what a roll spends), found
+by a BFS from every tile of the compiled BoardGraph. They are kept as one flat
+array('H') of n*n entries per event, so a lookup is two dict hits and an index.
+Charters between islands aren't moves, so tiles only reachable by docking are
+unreachable (None).
+
+The table is cached against the graph's layout_fingerprint: moving stars or
+rebuilding an unchanged board doesn't recompute it, any change to the tiles does.
+"""
+
+import logging
+import threading
+import uuid
+from array import array
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+from event_handlers.stability_party.board_graph import BoardGraph, get_board_graph
+
+UNREACHABLE = 0xFFFF
+
+class BoardDistances:
+    def __init__(self, graph: BoardGraph) -> None:
+        self.layout_fingerprint = graph.layout_fingerprint
+        self.tile_ids: tuple[str, ...] = tuple(graph.tiles)
+        self.index: Dict[str, int] = {tile_id: position for position, tile_id in enumerate(self.tile_ids)}
+        size = len(self.tile_ids)
+        if size >= UNREACHABLE:
+            raise ValueError(f"Board for event {graph.event_id} has too many tiles ({size}) for a distance table")
+
+        adjacency = [
+            [self.index[str(next_id)] for next_id in graph.tiles[tile_id].next_tiles if str(next_id) in self.index]
+            for tile_id in self.tile_ids
+        ]
+        self.table = array("H", [UNREACHABLE]) * (size * size)
+        for source in range(size):
+            row = source * size
+            self.table[row + source] = 0
+            queue = deque([source])
+            while queue:
+                current = queue.popleft()
+                distance = self.table[row + current] + 1
+                for neighbour in adjacency[current]:
+                    if self.table[row + neighbour] == UNREACHABLE:
+                        self.table[row + neighbour] = distance
+                        queue.append(neighbour)
+
+    def distance(self, from_tile_id, to_tile_id) -> Optional[int]:
+        """Moves needed to get from one tile to another, or None if it can't be reached"""
+        source = self.index.get(str(from_tile_id))
+        target = self.index.get(str(to_tile_id))
+        if source is None or target is None:
+            return None
+        distance = self.table[source * len(self.tile_ids) + target]
+        return None if distance == UNREACHABLE else distance
+
+    def nearest(self, from_tile_id, tile_ids: Iterable) -> tuple[Optional[str], Optional[int]]:
+        """The closest reachable tile of tile_ids and its distance, or (None, None)"""
+        best_tile, best_distance = None, None
+        for tile_id in tile_ids:
+            distance = self.distance(from_tile_id, tile_id)
+            if distance is not None and (best_distance is None or distance < best_distance):
+                best_tile, best_distance = str(tile_id), distance
+        return best_tile, best_distance
+
+    def to_dict(self) -> dict:
+        size = len(self.tile_ids)
+        return {
+            "tiles": list(self.tile_ids),
+            "distances": [
+                [None if distance == UNREACHABLE else distance for distance in self.table[row * size:(row + 1) * size]]
+                for row in range(size)
+            ]
+        }
+
+_distances: Dict[str, BoardDistances] = {}
+_lock = threading.Lock()
+
+def get_board_distances(event_id: uuid.UUID, graph: Optional[BoardGraph] = None) -> BoardDistances:
+    """Get the distance table for an event's current board, computing it when the board has changed"""
+    graph = graph or get_board_graph(event_id)
+    key = str(event_id)
+    distances = _distances.get(key)
+    if distances is not None and distances.layout_fingerprint == graph.layout_fingerprint:
+        return distances
+
+    with _lock:
+        distances = _distances.get(key)
+        if distances is None or distances.layout_fingerprint != graph.layout_fingerprint:
+            distances = BoardDistances(graph)
+            _distances[key] = distances
+            logging.debug(f"Computed board distances for event {event_id}: {len(distances.tile_ids)} tiles")
+    return distances
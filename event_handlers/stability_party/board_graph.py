@@ -0,0 +1,298 @@
+"""
+In-process compiled Stability Party board
+
+A single roll used to look the same tile up in sp3_event_tiles several times
+(and re-read the event's star list for every star check). The board for an
+event is now compiled once into an immutable BoardGraph:
+- per tile: name, description, region, category and dock/shop/island start flags
+- adjacency: nextTiles as tuples of tile IDs
+- per region: name, description, hotspot flag, charter destinations and start tile
+- the current star tiles, the region each is on, and per region the tiles a
+  star may be moved to (everything but docks and shops)
+
+so movement and star checks are plain dict/set lookups with no queries.
+
+A graph is dropped whenever a tile or region of its event is inserted, updated
+or deleted through the ORM, and again once that change commits. When the
+event's data changes (a star moves) only the stars are swapped into the
+existing graph. Anything cached by a transaction that rolls back is dropped.
+It is also rebuilt once older than BOARD_GRAPH_MAX_AGE_SECONDS as a safety net
+for edits made outside the ORM.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import random
+import logging
+import threading
+from types import MappingProxyType
+from typing import Collection, Dict, Mapping, Optional
+
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import object_session
+
+from app import db
+from models.models import Events
+from models.stability_party_3 import SP3EventTiles, SP3Regions
+
+BOARD_GRAPH_MAX_AGE_SECONDS = int(os.getenv("BOARD_GRAPH_MAX_AGE_SECONDS", "900"))
+
+class TileNode:
+    __slots__ = ("id", "event_id", "region_id", "name", "description", "category", "next_tiles", "is_dock", "is_shop", "is_island_start")
+
+    def __init__(self, tile: SP3EventTiles) -> None:
+        data = tile.data or {}
+        self.id: uuid.UUID = tile.id
+        self.event_id: uuid.UUID = tile.event_id
+        self.region_id: Optional[uuid.UUID] = tile.region_id
+        self.name: str = tile.name
+        self.description: Optional[str] = tile.description
+        self.category: Optional[str] = data.get("category")
+        self.next_tiles: tuple[uuid.UUID, ...] = tuple(uuid.UUID(str(tile_id)) for tile_id in data.get("nextTiles", []) or [])
+        self.is_dock: bool = bool(data.get("isDock", False))
+        self.is_shop: bool = bool(data.get("isShop", False))
+        self.is_island_start: bool = bool(data.get("isIslandStart", False))
+
+class RegionNode:
+    __slots__ = ("id", "name", "description", "is_hotspot", "charter")
+
+    def __init__(self, region: SP3Regions) -> None:
+        data = region.data or {}
+        self.id: uuid.UUID = region.id
+        self.name: str = region.name
+        self.description: Optional[str] = region.description
+        self.is_hotspot: bool = bool(data.get("isHotspot", False))
+        # {destination region ID: cost}
+        self.charter: Mapping[str, int] = MappingProxyType(dict(data.get("charter", {}) or {}))
+
+class BoardGraph:
+    def __init__(self, event_id: uuid.UUID, tiles: Dict[str, TileNode], regions: Dict[str, RegionNode], star_tiles: frozenset[str], base: Optional["BoardGraph"] = None) -> None:
+        self.event_id = event_id
+        self.tiles: Mapping[str, TileNode] = MappingProxyType(tiles)
+        self.regions: Mapping[str, RegionNode] = MappingProxyType(regions)
+        if base is not None:
+            # Same board with different stars; reuse what only depends on the tiles
+            self.board_version = base.board_version
+            self.layout_fingerprint = base.layout_fingerprint
+            self.island_starts = base.island_starts
+            self.placement_pools = base.placement_pools
+        else:
+            # Identifies this layout of tiles; derived data (e.g. distances) is cached against it
+            self.board_version = object()
+            self.layout_fingerprint = _layout_fingerprint(tiles, regions)
+            island_starts: Dict[str, TileNode] = {}
+            placement_pools: Dict[str, list[TileNode]] = {}
+            for node in tiles.values():
+                if node.region_id is None:
+                    continue
+                if node.is_island_start:
+                    island_starts.setdefault(str(node.region_id), node)
+                if not node.is_dock and not node.is_shop:
+                    placement_pools.setdefault(str(node.region_id), []).append(node)
+            self.island_starts: Mapping[str, TileNode] = MappingProxyType(island_starts)
+            # {region ID: tiles a star may be moved to}
+            self.placement_pools: Mapping[str, tuple[TileNode, ...]] = MappingProxyType({region_id: tuple(pool) for region_id, pool in placement_pools.items()})
+        self.star_tiles = star_tiles
+        # {star tile ID: region ID}
+        self.star_regions: Mapping[str, str] = MappingProxyType({
+            tile_id: str(tiles[tile_id].region_id)
+            for tile_id in star_tiles
+            if tile_id in tiles and tiles[tile_id].region_id is not None
+        })
+        self.regions_with_star = frozenset(self.star_regions.values())
+        # Same board content (stars included) gives the same fingerprint in every process, e.g. for ETags
+        self.fingerprint = hashlib.sha1(f"{self.layout_fingerprint}|{sorted(star_tiles)}".encode()).hexdigest()[:16]
+        self.built_at = time.monotonic()
+
+    def with_star_tiles(self, star_tiles: frozenset[str]) -> "BoardGraph":
+        """The same board with the stars moved"""
+        graph = BoardGraph(self.event_id, dict(self.tiles), dict(self.regions), star_tiles, base=self)
+        graph.built_at = self.built_at
+        return graph
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.built_at > BOARD_GRAPH_MAX_AGE_SECONDS
+
+    def tile(self, tile_id) -> Optional[TileNode]:
+        if tile_id is None:
+            return None
+        return self.tiles.get(str(tile_id))
+
+    def region(self, region_id) -> Optional[RegionNode]:
+        if region_id is None:
+            return None
+        return self.regions.get(str(region_id))
+
+    def island_start_tile(self, region_id) -> Optional[TileNode]:
+        if region_id is None:
+            return None
+        return self.island_starts.get(str(region_id))
+
+    def next_tiles(self, tile_id) -> tuple[uuid.UUID, ...]:
+        node = self.tile(tile_id)
+        return node.next_tiles if node else ()
+
+    def is_star_tile(self, tile_id) -> bool:
+        return str(tile_id) in self.star_tiles
+
+    def region_has_star(self, region_id) -> bool:
+        return str(region_id) in self.regions_with_star
+
+    def random_star_candidate(self, blocked_regions: Collection[str] = (), blocked_tiles: Collection[str] = (), rng=random) -> Optional[TileNode]:
+        """
+        Pick a tile to move a star to, uniformly from the placement pools of
+        regions not in blocked_regions, skipping tiles in blocked_tiles (the
+        current stars). Returns None if there is no such tile.
+        """
+        pools = [pool for region_id, pool in self.placement_pools.items() if region_id not in blocked_regions]
+        total = sum(len(pool) for pool in pools)
+        if not total:
+            return None
+
+        # Stars are few, so rejection sampling almost always succeeds first try
+        for _ in range(len(blocked_tiles) + 8):
+            index = rng.randrange(total)
+            for pool in pools:
+                if index < len(pool):
+                    node = pool[index]
+                    break
+                index -= len(pool)
+            if str(node.id) not in blocked_tiles:
+                return node
+
+        remaining = [node for pool in pools for node in pool if str(node.id) not in blocked_tiles]
+        return rng.choice(remaining) if remaining else None
+
+def _node_values(node) -> tuple:
+    return tuple(
+        sorted(value.items()) if isinstance(value, Mapping) else value
+        for value in (getattr(node, slot) for slot in node.__slots__)
+    )
+
+def _layout_fingerprint(tiles: Dict[str, TileNode], regions: Dict[str, RegionNode]) -> str:
+    content = (
+        [_node_values(tiles[tile_id]) for tile_id in sorted(tiles)],
+        [_node_values(regions[region_id]) for region_id in sorted(regions)]
+    )
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+def compile_board_graph(event_id: uuid.UUID, tiles: list, regions: list, star_tiles) -> BoardGraph:
+    """Compile tile and region rows (models, or anything with the same attributes) into a BoardGraph"""
+    return BoardGraph(
+        event_id,
+        {str(tile.id): TileNode(tile) for tile in tiles},
+        {str(region.id): RegionNode(region) for region in regions},
+        frozenset(str(tile_id) for tile_id in star_tiles or [])
+    )
+
+def build_board_graph(event_id: uuid.UUID) -> BoardGraph:
+    event = db.session.get(Events, event_id)
+    graph = compile_board_graph(
+        event_id,
+        SP3EventTiles.query.filter_by(event_id=event_id).all(),
+        SP3Regions.query.filter_by(event_id=event_id).all(),
+        _star_tiles_of(event) if event else ()
+    )
+
+    logging.debug(f"Built board graph for event {event_id}: {len(graph.tiles)} tiles, {len(graph.regions)} regions, {len(graph.star_tiles)} stars")
+    return graph
+
+_graphs: Dict[str, BoardGraph] = {}
+_tile_events: Dict[str, uuid.UUID] = {}
+_lock = threading.Lock()
+
+def get_board_graph(event_id: uuid.UUID) -> BoardGraph:
+    """Get the compiled board for an event, building it on first use"""
+    key = str(event_id)
+    graph = _graphs.get(key)
+    if graph is not None and not graph.is_stale():
+        return graph
+
+    with _lock:
+        graph = _graphs.get(key)
+        if graph is None or graph.is_stale():
+            graph = build_board_graph(event_id)
+            _graphs[key] = graph
+            for tile_id in graph.tiles:
+                _tile_events[tile_id] = graph.event_id
+    return graph
+
+def pin_board_graph(graph: BoardGraph) -> None:
+    """Cache a graph built elsewhere (e.g. from a board document) for its event; it never goes stale"""
+    graph.built_at = float("inf")
+    with _lock:
+        _graphs[str(graph.event_id)] = graph
+        for tile_id in graph.tiles:
+            _tile_events[tile_id] = graph.event_id
+
+def get_board_graph_for_tile(tile_id) -> Optional[BoardGraph]:
+    """Get the compiled board that contains a tile, for callers that only have a tile ID"""
+    if tile_id is None:
+        return None
+    event_id = _tile_events.get(str(tile_id))
+    if event_id is None:
+        event_id = db.session.query(SP3EventTiles.event_id).filter(SP3EventTiles.id == tile_id).scalar()
+        if event_id is None:
+            return None
+    return get_board_graph(event_id)
+
+def invalidate_board_graph(event_id: Optional[uuid.UUID] = None) -> None:
+    """Drop the compiled board for an event (or every event) after it changes"""
+    with _lock:
+        if event_id is None:
+            _graphs.clear()
+            _tile_events.clear()
+        else:
+            _graphs.pop(str(event_id), None)
+
+def _star_tiles_of(event: Events) -> frozenset[str]:
+    return frozenset(str(tile_id) for tile_id in ((event.data or {}).get("star_tiles", []) or []))
+
+def _apply_star_tiles(event_id, star_tiles: frozenset[str]) -> None:
+    with _lock:
+        graph = _graphs.get(str(event_id))
+        if graph is not None and graph.star_tiles != star_tiles:
+            _graphs[str(event_id)] = graph.with_star_tiles(star_tiles)
+
+def _mark_dirty(target, event_id) -> None:
+    invalidate_board_graph(event_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("board_graph_dirty", set()).add(event_id)
+
+def _on_board_changed(mapper, connection, target) -> None:
+    _mark_dirty(target, target.event_id)
+
+def _on_event_changed(mapper, connection, target) -> None:
+    # Only the stars in event.data are part of the board; swap them into the
+    # compiled graph instead of rebuilding it
+    if inspect(target).attrs.data.history.has_changes():
+        star_tiles = _star_tiles_of(target)
+        _apply_star_tiles(target.id, star_tiles)
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("board_graph_stars", {})[target.id] = star_tiles
+
+def _on_commit(session) -> None:
+    # Apply again once the change is visible to other sessions, so a rebuild
+    # that raced the flush doesn't keep the old board around
+    for event_id in session.info.pop("board_graph_dirty", set()):
+        invalidate_board_graph(event_id)
+    for event_id, star_tiles in session.info.pop("board_graph_stars", {}).items():
+        _apply_star_tiles(event_id, star_tiles)
+
+def _on_rollback(session) -> None:
+    # The cached graph may hold changes that never committed
+    for event_id in session.info.pop("board_graph_dirty", set()):
+        invalidate_board_graph(event_id)
+    for event_id in session.info.pop("board_graph_stars", {}):
+        invalidate_board_graph(event_id)
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    sa_event.listen(SP3EventTiles, _event_name, _on_board_changed)
+    sa_event.listen(SP3Regions, _event_name, _on_board_changed)
+sa_event.listen(Events, "after_update", _on_event_changed)
+sa_event.listen(db.session, "after_commit", _on_commit)
+sa_event.listen(db.session, "after_rollback", _on_rollback)
@@ -0,0 +1,294 @@
+"""
+Stability Party board import/export
+
+A board is a single JSON document in which rows refer to each other by
+symbolic keys instead of UUIDs:
+
+    {
+        "version": 1,
+        "triggers":   [{"key", "trigger", "source", "type"}],
+        "tasks":      [{"key", "triggers": [trigger keys], "quantity", "value"}],
+        "challenges": [{"key", "type", "tasks": [task keys], "value"}],
+        "regions":    [{"key", "name", "description", "image", "coordinates",
+                        "challenges": [challenge keys],
+                        "data": {..., "charter": {region key: cost}}}],
+        "tiles":      [{"key", "region": region key, "name", "description", "image", "coordinates",
+                        "data": {..., "nextTiles": [tile keys]},
+                        "challenges": [{"challenge": challenge key, "type", "data"}]}],
+        "star_tiles": [tile keys]
+    }
+
+export_board() writes the existing IDs as keys. import_board() gives every
+key a fresh UUID, so an export can be imported into another event to clone a
+board, and loads everything with one bulk INSERT per table in the caller's
+transaction. Triggers are shared between events: an existing trigger with the
+same trigger/source/type is reused instead of inserting a duplicate.
+"""
+
+import copy
+import uuid
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, select
+
+from app import db
+from models.models import Events, EventChallenges, EventChallengeTasks, EventTasks, EventTaskTriggers, EventTriggers, EventTriggerMappings
+from models.stability_party_3 import SP3Regions, SP3RegionChallenges, SP3EventTiles, SP3EventTileChallengeMapping
+from event_handlers.stability_party.definition_links import link_rows, load_challenge_tree
+from event_handlers.stability_party.board_graph import invalidate_board_graph
+from event_handlers.stability_party.trigger_index import invalidate_trigger_index
+from event_handlers.submission_filter import invalidate_submission_filter
+
+BOARD_DOCUMENT_VERSION = 1
+
+def export_board(event_id: uuid.UUID) -> Dict[str, Any]:
+    """Build the board document for an event"""
+    event = db.session.get(Events, event_id)
+    if event is None:
+        raise ValueError(f"Event {event_id} not found")
+
+    regions = SP3Regions.query.filter_by(event_id=event_id).order_by(SP3Regions.name).all()
+    tiles = SP3EventTiles.query.filter_by(event_id=event_id).order_by(SP3EventTiles.name).all()
+    tile_ids = [tile.id for tile in tiles]
+    mappings = SP3EventTileChallengeMapping.query.filter(SP3EventTileChallengeMapping.tile_id.in_(tile_ids)).all() if tile_ids else []
+
+    tile_challenges: Dict[str, List[dict]] = {}
+    for mapping in mappings:
+        tile_challenges.setdefault(str(mapping.tile_id), []).append({
+            "challenge": str(mapping.challenge_id),
+            "type": mapping.type,
+            "data": mapping.data
+        })
+
+    challenge_ids = {str(challenge_id) for region in regions for challenge_id in (region.challenges or [])}
+    challenge_ids.update(str(mapping.challenge_id) for mapping in mappings)
+    challenges, tasks, triggers = load_challenge_tree(challenge_ids)
+
+    return {
+        "version": BOARD_DOCUMENT_VERSION,
+        "triggers": [
+            {"key": str(trigger.id), "trigger": trigger.trigger, "source": trigger.source, "type": trigger.type}
+            for trigger in triggers
+        ],
+        "tasks": [
+            {"key": str(task.id), "triggers": [str(t) for t in task.triggers or []], "quantity": task.quantity, "value": task.value}
+            for task in tasks
+        ],
+        "challenges": [
+            {"key": str(challenge.id), "type": challenge.type, "tasks": [str(t) for t in challenge.tasks or []], "value": challenge.value}
+            for challenge in challenges
+        ],
+        "regions": [
+            {
+                "key": str(region.id),
+                "name": region.name,
+                "description": region.description,
+                "image": region.image,
+                "coordinates": region.coordinates,
+                "challenges": [str(c) for c in region.challenges or []],
+                "data": region.data
+            }
+            for region in regions
+        ],
+        "tiles": [
+            {
+                "key": str(tile.id),
+                "region": str(tile.region_id) if tile.region_id else None,
+                "name": tile.name,
+                "description": tile.description,
+                "image": tile.image,
+                "coordinates": tile.coordinates,
+                "data": tile.data,
+                "challenges": tile_challenges.get(str(tile.id), [])
+            }
+            for tile in tiles
+        ],
+        "star_tiles": [str(tile_id) for tile_id in (event.data or {}).get("star_tiles", []) or []]
+    }
+
+class _KeyMap:
+    """Symbolic keys of one kind of row -> new UUIDs"""
+
+    def __init__(self, kind: str, rows: List[dict]) -> None:
+        self.kind = kind
+        self.ids: Dict[str, uuid.UUID] = {}
+        for row in rows:
+            key = row.get("key")
+            if key is None:
+                raise ValueError(f"Every {kind} needs a key")
+            if str(key) in self.ids:
+                raise ValueError(f"Duplicate {kind} key {key}")
+            self.ids[str(key)] = uuid.uuid4()
+
+    def __getitem__(self, key) -> uuid.UUID:
+        try:
+            return self.ids[str(key)]
+        except KeyError:
+            raise ValueError(f"Unknown {self.kind} key {key}") from None
+
+    def resolve(self, keys) -> List[str]:
+        return [str(self[key]) for key in keys or []]
+
+def _resolve_triggers(rows: List[dict], keys: _KeyMap) -> List[dict]:
+    """Point trigger keys at existing identical triggers where possible; returns the rows still to insert"""
+    existing = {
+        (trigger.trigger, trigger.source, trigger.type): trigger.id
+        for trigger in EventTriggers.query.filter(EventTriggers.trigger.in_(list({row["trigger"] for row in rows}))).all()
+    } if rows else {}
+
+    new_rows = []
+    for row in rows:
+        signature = (row["trigger"], row.get("source"), row.get("type", "DROP"))
+        if signature in existing:
+            keys.ids[str(row["key"])] = existing[signature]
+            continue
+        existing[signature] = keys[row["key"]]
+        new_rows.append({"id": keys[row["key"]], "trigger": row["trigger"], "source": row.get("source"), "type": signature[2]})
+    return new_rows
+
+def invalidate_board_caches(event_id: uuid.UUID) -> None:
+    """
+    Drop everything cached from an event's board definitions
+
+    Bulk inserts don't fire the mapper events these caches listen to; call
+    again after committing an import.
+    """
+    invalidate_board_graph(event_id)
+    invalidate_trigger_index(event_id)
+    invalidate_submission_filter()
+
+def _delete_board(event_id: uuid.UUID) -> None:
+    # Challenge/task rows aren't scoped to an event and are left in place
+    tile_ids = select(SP3EventTiles.id).where(SP3EventTiles.event_id == event_id)
+    SP3EventTileChallengeMapping.query.filter(SP3EventTileChallengeMapping.tile_id.in_(tile_ids)).delete(synchronize_session=False)
+    SP3EventTiles.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+    SP3Regions.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+    EventTriggerMappings.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+
+def import_board(event_id: uuid.UUID, document: Dict[str, Any], replace: bool = False) -> Dict[str, int]:
+    """
+    Load a board document into an event (the caller commits)
+
+    Raises ValueError (or KeyError for a missing field) if the document is
+    invalid, or ValueError if the event already has a board and replace isn't
+    set. Returns the number of rows inserted per table.
+    """
+    event = Events.query.filter_by(id=event_id).with_for_update().first()
+    if event is None:
+        raise ValueError(f"Event {event_id} not found")
+    if document.get("version", BOARD_DOCUMENT_VERSION) != BOARD_DOCUMENT_VERSION:
+        raise ValueError(f"Unsupported board document version {document.get('version')}")
+
+    if db.session.query(SP3EventTiles.id).filter(SP3EventTiles.event_id == event_id).first() is not None \
+            or db.session.query(SP3Regions.id).filter(SP3Regions.event_id == event_id).first() is not None:
+        if not replace:
+            raise ValueError("Event already has a board; set replace to overwrite it")
+        _delete_board(event_id)
+
+    trigger_rows = document.get("triggers", [])
+    task_rows = document.get("tasks", [])
+    challenge_rows = document.get("challenges", [])
+    region_rows = document.get("regions", [])
+    tile_rows = document.get("tiles", [])
+
+    trigger_keys = _KeyMap("trigger", trigger_rows)
+    task_keys = _KeyMap("task", task_rows)
+    challenge_keys = _KeyMap("challenge", challenge_rows)
+    region_keys = _KeyMap("region", region_rows)
+    tile_keys = _KeyMap("tile", tile_rows)
+
+    # Resolve every reference before inserting anything, so a bad document fails cleanly
+    triggers = _resolve_triggers(trigger_rows, trigger_keys)
+    tasks = [
+        {"id": task_keys[row["key"]], "triggers": trigger_keys.resolve(row.get("triggers")), "quantity": row.get("quantity", 1), "value": row.get("value", 1)}
+        for row in task_rows
+    ]
+    challenges = [
+        {"id": challenge_keys[row["key"]], "type": row.get("type", "OR"), "tasks": task_keys.resolve(row.get("tasks")), "value": row.get("value", 1)}
+        for row in challenge_rows
+    ]
+
+    regions = []
+    for row in region_rows:
+        data = copy.deepcopy(row.get("data") or {})
+        if "charter" in data:
+            data["charter"] = {str(region_keys[key]): cost for key, cost in (data["charter"] or {}).items()}
+        regions.append({
+            "id": region_keys[row["key"]],
+            "event_id": event.id,
+            "name": row["name"],
+            "description": row.get("description"),
+            "image": row.get("image"),
+            "challenges": challenge_keys.resolve(row.get("challenges")),
+            "coordinates": row.get("coordinates"),
+            "data": data
+        })
+
+    tiles = []
+    tile_challenges = []
+    for row in tile_rows:
+        data = copy.deepcopy(row.get("data") or {})
+        data["nextTiles"] = tile_keys.resolve(data.get("nextTiles"))
+        tile_id = tile_keys[row["key"]]
+        tiles.append({
+            "id": tile_id,
+            "event_id": event.id,
+            "region_id": region_keys[row["region"]] if row.get("region") is not None else None,
+            "name": row["name"],
+            "description": row.get("description"),
+            "image": row.get("image"),
+            "coordinates": row.get("coordinates"),
+            "data": data
+        })
+        for mapping in row.get("challenges", []):
+            tile_challenges.append({
+                "id": uuid.uuid4(),
+                "tile_id": tile_id,
+                "challenge_id": challenge_keys[mapping["challenge"]],
+                "type": mapping.get("type", "TILE"),
+                "data": mapping.get("data")
+            })
+
+    star_tiles = tile_keys.resolve(document.get("star_tiles"))
+    trigger_mappings = [
+        {"id": uuid.uuid4(), "event_id": event.id, "trigger_id": trigger_id}
+        for trigger_id in sorted({trigger_keys[row["key"]] for row in trigger_rows}, key=str)
+    ]
+
+    # Bulk inserts don't fire the listeners that keep the definition link tables in step
+    task_triggers = [link for row in tasks for link in link_rows(row["id"], row["triggers"], "task_id", "trigger_id")]
+    challenge_tasks = [link for row in challenges for link in link_rows(row["id"], row["tasks"], "challenge_id", "task_id")]
+    region_challenges = [link for row in regions for link in link_rows(row["id"], row["challenges"], "region_id", "challenge_id")]
+
+    # Parents before children; each is a single executemany INSERT
+    for model, rows in (
+        (EventTriggers, triggers),
+        (EventTasks, tasks),
+        (EventTaskTriggers, task_triggers),
+        (EventChallenges, challenges),
+        (EventChallengeTasks, challenge_tasks),
+        (SP3Regions, regions),
+        (SP3RegionChallenges, region_challenges),
+        (SP3EventTiles, tiles),
+        (SP3EventTileChallengeMapping, tile_challenges),
+        (EventTriggerMappings, trigger_mappings),
+    ):
+        if rows:
+            db.session.execute(insert(model), rows)
+
+    event.data = {**(event.data or {}), "star_tiles": star_tiles}
+
+    invalidate_board_caches(event.id)
+
+    counts = {
+        "triggers": len(triggers),
+        "tasks": len(tasks),
+        "challenges": len(challenges),
+        "regions": len(regions),
+        "tiles": len(tiles),
+        "tile_challenges": len(tile_challenges),
+        "trigger_mappings": len(trigger_mappings)
+    }
+    logging.info(f"Imported board into event {event.id}: {counts}")
+    return counts
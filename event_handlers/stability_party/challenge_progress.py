@@ -0,0 +1,182 @@
+"""
+Challenge/task progress stored per row in sp3_challenge_progress
+
+Progress used to live in EventTeams.data["tileProgress"], so every tick rewrote
+the team's whole JSONB document. SaveData.tileProgress is now a ChallengeProgress:
+it still reads and writes like {challenge_id: {task_id: progress}}, but it
+records what changed and save_team_data persists only that:
+- Increments/decrements become `progress = progress + n` upserts, so concurrent
+  ticks on the same task add up instead of overwriting each other
+- reset() (a completed challenge, or a new tile) writes absolute values
+- Progress still found in a team's JSONB is copied into the table (without
+  overwriting rows that already exist) the first time the team is saved
+"""
+
+import uuid
+import logging
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from models.stability_party_3 import SP3ChallengeProgress
+
+class TaskProgress(dict):
+    """{task_id: progress} for one challenge; assignments are reported back to the owning ChallengeProgress"""
+
+    def __init__(self, owner: "ChallengeProgress", challenge_id: str, progress: dict | None = None) -> None:
+        super().__init__(progress or {})
+        self._owner = owner
+        self._challenge_id = challenge_id
+
+    def __setitem__(self, task_id, value) -> None:
+        task_id = str(task_id)
+        old = self.get(task_id, 0)
+        super().__setitem__(task_id, value)
+        self._owner._record(self._challenge_id, task_id, old, value)
+
+class ChallengeProgress(dict):
+    """{challenge_id: {task_id: progress}} that tracks pending changes for sp3_challenge_progress"""
+
+    def __init__(self, progress: dict | None = None) -> None:
+        super().__init__()
+        self._deltas: dict[tuple[str, str], int] = {}
+        self._resets: dict[tuple[str, str], int] = {}
+        self._seeds: dict[tuple[str, str], int] = {}
+        for challenge_id, tasks in (progress or {}).items():
+            super().__setitem__(str(challenge_id), TaskProgress(self, str(challenge_id), {str(task_id): value for task_id, value in tasks.items()}))
+
+    def __setitem__(self, challenge_id, tasks) -> None:
+        challenge_id = str(challenge_id)
+        existing = self.get(challenge_id)
+        super().__setitem__(challenge_id, TaskProgress(self, challenge_id, existing))
+        # Replacing a challenge's dict assigns each of its tasks
+        for task_id, value in (tasks or {}).items():
+            self[challenge_id][task_id] = value
+
+    def _record(self, challenge_id: str, task_id: str, old: int, new: int) -> None:
+        key = (challenge_id, task_id)
+        if key in self._resets:
+            # Already pinned to an absolute value in this save; keep it absolute
+            self._resets[key] = new
+        elif new != old:
+            self._deltas[key] = self._deltas.get(key, 0) + (new - old)
+
+    def increment(self, challenge_id, task_id, amount: int) -> int:
+        """Add to a task's progress and return the new value"""
+        tasks = self.setdefault_tasks(challenge_id)
+        tasks[str(task_id)] = tasks.get(str(task_id), 0) + amount
+        return tasks[str(task_id)]
+
+    def reset(self, challenge_id, task_ids, value: int = 0) -> None:
+        """Set the given tasks of a challenge back to a fixed value (0 by default)"""
+        tasks = self.setdefault_tasks(challenge_id)
+        for task_id in task_ids:
+            key = (str(challenge_id), str(task_id))
+            self._deltas.pop(key, None)
+            self._resets[key] = value
+            dict.__setitem__(tasks, str(task_id), value)
+
+    def setdefault_tasks(self, challenge_id) -> TaskProgress:
+        challenge_id = str(challenge_id)
+        if challenge_id not in self:
+            super().__setitem__(challenge_id, TaskProgress(self, challenge_id))
+        return self[challenge_id]
+
+    def has_changes(self) -> bool:
+        return bool(self._deltas or self._resets or self._seeds)
+
+    def pending_changes(self) -> dict[str, dict[str, dict[str, int]]]:
+        """Unsaved changes as {"seed"|"add"|"set": {challenge_id: {task_id: value}}}, in the order they're applied"""
+        changes = {}
+        for kind, pending in (("seed", self._seeds), ("add", self._deltas), ("set", self._resets)):
+            nested: dict[str, dict[str, int]] = {}
+            for (challenge_id, task_id), value in pending.items():
+                nested.setdefault(challenge_id, {})[task_id] = value
+            if nested:
+                changes[kind] = nested
+        return changes
+
+    def to_dict(self) -> dict[str, dict[str, int]]:
+        return {challenge_id: dict(tasks) for challenge_id, tasks in self.items()}
+
+    @staticmethod
+    def load(team_id, legacy: dict | None = None) -> "ChallengeProgress":
+        """
+        Load a team's progress from sp3_challenge_progress
+
+        Entries from a legacy JSONB tileProgress that have no row yet are
+        included and queued to be copied into the table on the next save.
+        """
+        progress = ChallengeProgress()
+        if team_id is not None:
+            rows = db.session.query(
+                SP3ChallengeProgress.challenge_id,
+                SP3ChallengeProgress.task_id,
+                SP3ChallengeProgress.progress
+            ).filter(SP3ChallengeProgress.team_id == team_id).all()
+            for row in rows:
+                dict.__setitem__(progress.setdefault_tasks(row.challenge_id), str(row.task_id), row.progress)
+        progress.seed(legacy)
+        return progress
+
+    def seed(self, legacy: dict | None) -> None:
+        """Queue legacy {challenge_id: {task_id: progress}} entries that aren't loaded yet"""
+        for challenge_id, tasks in (legacy or {}).items():
+            loaded = self.setdefault_tasks(challenge_id)
+            for task_id, value in (tasks or {}).items():
+                if str(task_id) in loaded:
+                    continue
+                dict.__setitem__(loaded, str(task_id), value)
+                self._seeds[(str(challenge_id), str(task_id))] = value
+
+def _to_rows(team_id, changes: dict[tuple[str, str], int]) -> list[dict]:
+    rows = []
+    for (challenge_id, task_id), value in changes.items():
+        try:
+            rows.append({"team_id": team_id, "challenge_id": uuid.UUID(challenge_id), "task_id": uuid.UUID(task_id), "progress": value})
+        except ValueError:
+            logging.warning(f"Skipping progress for invalid challenge/task ID {challenge_id}/{task_id} on team {team_id}")
+    return rows
+
+def save_team_progress(team_id, progress: ChallengeProgress) -> None:
+    """Write a ChallengeProgress's pending changes for a team (the caller commits)"""
+    if not progress.has_changes():
+        return
+
+    table = SP3ChallengeProgress.__table__
+    keys = [table.c.team_id, table.c.challenge_id, table.c.task_id]
+
+    seeds = _to_rows(team_id, progress._seeds)
+    if seeds:
+        db.session.execute(insert(table).values(seeds).on_conflict_do_nothing(index_elements=keys))
+
+    deltas = _to_rows(team_id, progress._deltas)
+    if deltas:
+        statement = insert(table).values(deltas)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={"progress": table.c.progress + statement.excluded.progress}
+        ))
+
+    resets = _to_rows(team_id, progress._resets)
+    if resets:
+        statement = insert(table).values(resets)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={"progress": statement.excluded.progress}
+        ))
+
+    progress._seeds.clear()
+    progress._deltas.clear()
+    progress._resets.clear()
+
+def replace_team_progress(team_id, progress: dict[str, dict[str, int]]) -> None:
+    """Overwrite all of a team's progress rows (the caller commits)"""
+    db.session.query(SP3ChallengeProgress).filter(SP3ChallengeProgress.team_id == team_id).delete(synchronize_session=False)
+    rows = _to_rows(team_id, {
+        (str(challenge_id), str(task_id)): value
+        for challenge_id, tasks in progress.items()
+        for task_id, value in tasks.items()
+    })
+    if rows:
+        db.session.execute(insert(SP3ChallengeProgress.__table__).values(rows))
@@ -0,0 +1,193 @@
+"""
+Ordered link tables behind the challenge definition arrays
+
+EventChallenges.tasks, EventTasks.triggers and SP3Regions.challenges store
+other rows' IDs as arrays of strings, which can't be joined, indexed or
+checked by foreign keys. Each array now has a link table holding the same
+references in the same order (position = index in the array):
+- event_challenge_tasks  (challenge_id, position, task_id)
+- event_task_triggers    (task_id, position, trigger_id)
+- sp3_region_challenges  (region_id, position, challenge_id)
+
+The arrays stay what callers write; the links are rewritten from them
+whenever a row is inserted or its array changes through the ORM, and a row
+inserted after the rows referring to it is linked to them then.
+import_board() inserts the links along with its bulk inserts. References to
+rows that don't exist are left out, since the links have foreign keys. Run
+scripts/backfill_definition_links.py once the tables are created, and after
+editing definitions outside the ORM.
+
+load_challenge_tree() loads challenges with their tasks and triggers in one
+JOIN query. The arrays remain the source of truth there too: references the
+links are missing are loaded with a follow-up query rather than dropped.
+"""
+
+import uuid
+import logging
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event as sa_event, insert, inspect, text
+
+from app import db
+from models.models import EventChallenges, EventChallengeTasks, EventTasks, EventTaskTriggers, EventTriggers
+from models.stability_party_3 import SP3Regions, SP3RegionChallenges
+
+# (model, array attribute, link model, parent column, child column, child model)
+_LINKS = (
+    (EventChallenges, "tasks", EventChallengeTasks, "challenge_id", "task_id", EventTasks),
+    (EventTasks, "triggers", EventTaskTriggers, "task_id", "trigger_id", EventTriggers),
+    (SP3Regions, "challenges", SP3RegionChallenges, "region_id", "challenge_id", EventChallenges),
+)
+
+def canonical_ids(values) -> List[str]:
+    """Convert a list of UUID strings into canonical string form, skipping bad entries"""
+    ids = []
+    for value in values or []:
+        try:
+            ids.append(str(uuid.UUID(str(value))))
+        except ValueError:
+            logging.warning(f"Ignoring invalid UUID reference '{value}' in board definitions")
+    return ids
+
+def link_rows(parent_id, child_ids, parent_column: str, child_column: str) -> List[dict]:
+    """Link rows for one parent's array (bad IDs are skipped but keep their position)"""
+    rows = []
+    for position, value in enumerate(child_ids or []):
+        try:
+            child_id = uuid.UUID(str(value))
+        except ValueError:
+            continue
+        rows.append({parent_column: parent_id, "position": position, child_column: child_id})
+    return rows
+
+def _replace_links(connection, link_model, parent_column: str, child_column: str, child_model, parent_id, child_ids) -> None:
+    table = link_model.__tablename__
+    connection.execute(text(f"DELETE FROM {table} WHERE {parent_column} = :parent_id"), {"parent_id": parent_id})
+    rows = link_rows(parent_id, child_ids, parent_column, child_column)
+    if not rows:
+        return
+    # Only link rows that exist; the foreign key would reject the rest
+    connection.execute(
+        text(f"""
+            INSERT INTO {table} ({parent_column}, position, {child_column})
+            SELECT CAST(:parent_id AS uuid), link.position, child.id
+            FROM unnest(CAST(:positions AS int[]), CAST(:child_ids AS uuid[])) AS link(position, child_id)
+            JOIN {child_model.__tablename__} AS child ON child.id = link.child_id
+        """),
+        {
+            "parent_id": str(parent_id),
+            "positions": [row["position"] for row in rows],
+            "child_ids": [str(row[child_column]) for row in rows]
+        }
+    )
+
+def _link_new_child(connection, model, attribute: str, link_model, parent_column: str, child_column: str, child_id) -> None:
+    # A parent flushed before the row it references couldn't link it yet
+    connection.execute(
+        text(f"""
+            INSERT INTO {link_model.__tablename__} ({parent_column}, position, {child_column})
+            SELECT parent.id, link.position - 1, CAST(:child_id AS uuid)
+            FROM {model.__tablename__} AS parent
+            CROSS JOIN LATERAL unnest(parent.{attribute}) WITH ORDINALITY AS link(child_id, position)
+            WHERE lower(link.child_id) = :child_id
+            ON CONFLICT DO NOTHING
+        """),
+        {"child_id": str(child_id)}
+    )
+
+def _listen(model, attribute: str, link_model, parent_column: str, child_column: str, child_model) -> None:
+    def on_insert(mapper, connection, target) -> None:
+        _replace_links(connection, link_model, parent_column, child_column, child_model, target.id, getattr(target, attribute))
+
+    def on_update(mapper, connection, target) -> None:
+        if getattr(inspect(target).attrs, attribute).history.has_changes():
+            on_insert(mapper, connection, target)
+
+    def on_child_insert(mapper, connection, target) -> None:
+        _link_new_child(connection, model, attribute, link_model, parent_column, child_column, target.id)
+
+    sa_event.listen(model, "after_insert", on_insert)
+    sa_event.listen(model, "after_update", on_update)
+    sa_event.listen(child_model, "after_insert", on_child_insert)
+
+for _link in _LINKS:
+    _listen(*_link)
+
+def backfill_definition_links(session=None) -> Dict[str, int]:
+    """Rebuild every link table from its arrays (the caller commits); returns links written per table"""
+    session = session if session is not None else db.session
+    counts = {}
+    for model, attribute, link_model, parent_column, child_column, child_model in _LINKS:
+        existing = {child_id for (child_id,) in session.query(child_model.id)}
+        rows = [
+            row
+            for parent_id, child_ids in session.query(model.id, getattr(model, attribute))
+            for row in link_rows(parent_id, child_ids, parent_column, child_column)
+            if row[child_column] in existing
+        ]
+        session.query(link_model).delete(synchronize_session=False)
+        if rows:
+            session.execute(insert(link_model), rows)
+        counts[link_model.__tablename__] = len(rows)
+    return counts
+
+def load_challenge_tree(challenge_ids) -> Tuple[list, list, list]:
+    """
+    Load challenges with their tasks and triggers in one query
+
+    The arrays stay authoritative: a reference the link tables don't have
+    (they haven't been backfilled, or an array was edited outside the ORM) is
+    loaded with a follow-up IN query instead of being dropped.
+
+    Returns:
+        (challenges, tasks, triggers) as read-only rows; a challenge's tasks
+        and a task's triggers are ordered ID lists, as in the arrays
+    """
+    ids = [uuid.UUID(challenge_id) for challenge_id in canonical_ids(challenge_ids)]
+    if not ids:
+        return [], [], []
+
+    rows = db.session.query(
+        EventChallenges.id, EventChallenges.type, EventChallenges.value, EventChallenges.tasks,
+        EventTasks.id, EventTasks.quantity, EventTasks.value, EventTasks.triggers,
+        EventTriggers.id, EventTriggers.trigger, EventTriggers.source, EventTriggers.type
+    ).outerjoin(
+        EventChallengeTasks, EventChallengeTasks.challenge_id == EventChallenges.id
+    ).outerjoin(
+        EventTasks, EventTasks.id == EventChallengeTasks.task_id
+    ).outerjoin(
+        EventTaskTriggers, EventTaskTriggers.task_id == EventTasks.id
+    ).outerjoin(
+        EventTriggers, EventTriggers.id == EventTaskTriggers.trigger_id
+    ).filter(
+        EventChallenges.id.in_(ids)
+    ).all()
+
+    # One row per (challenge, task, trigger); tasks and triggers are shared between challenges
+    challenges: Dict[str, SimpleNamespace] = {}
+    tasks: Dict[str, SimpleNamespace] = {}
+    triggers: Dict[str, SimpleNamespace] = {}
+    for (challenge_id, challenge_type, challenge_value, task_ids, task_id, quantity, task_value, trigger_ids,
+         trigger_id, trigger, source, trigger_type) in rows:
+        challenges.setdefault(str(challenge_id), SimpleNamespace(id=challenge_id, type=challenge_type, value=challenge_value, tasks=canonical_ids(task_ids)))
+        if task_id is not None:
+            tasks.setdefault(str(task_id), SimpleNamespace(id=task_id, quantity=quantity, value=task_value, triggers=canonical_ids(trigger_ids)))
+        if trigger_id is not None:
+            triggers.setdefault(str(trigger_id), SimpleNamespace(id=trigger_id, trigger=trigger, source=source, type=trigger_type))
+
+    # Whatever the links missed; nothing to load when they are in step with the arrays
+    recovered = 0
+    missing_tasks = {task_id for challenge in challenges.values() for task_id in challenge.tasks if task_id not in tasks}
+    if missing_tasks:
+        for row in EventTasks.query.filter(EventTasks.id.in_([uuid.UUID(task_id) for task_id in missing_tasks])).all():
+            tasks[str(row.id)] = SimpleNamespace(id=row.id, quantity=row.quantity, value=row.value, triggers=canonical_ids(row.triggers))
+            recovered += 1
+    missing_triggers = {trigger_id for task in tasks.values() for trigger_id in task.triggers if trigger_id not in triggers}
+    if missing_triggers:
+        for row in EventTriggers.query.filter(EventTriggers.id.in_([uuid.UUID(trigger_id) for trigger_id in missing_triggers])).all():
+            triggers[str(row.id)] = SimpleNamespace(id=row.id, trigger=row.trigger, source=row.source, type=row.type)
+            recovered += 1
+    if recovered:
+        logging.warning(f"Loaded {recovered} definitions the link tables are missing; run scripts/backfill_definition_links.py")
+    return list(challenges.values()), list(tasks.values()), list(triggers.values())
@@ -9,7 +9,7 @@ keeping the definition and functionality together for better maintenance.
 import uuid
 import logging
 from typing import Dict, List, Any, Optional, Callable, Tuple
-from event_handlers.stability_party.save_data import SaveData, save_team_data
+from event_handlers.stability_party.save_data import SaveData, save_team_data, lock_team, commit_team_changes
 import random
 
 # Dictionary to store all registered items
@@ -586,53 +586,24 @@ def genie_lamp_selection_handler(event_id: uuid.UUID, team_id: uuid.UUID, save_d
         save_data.coins -= 100
         save_data.stars += 1
 
-        # Move the star to another tile
         # Move the star to a new tile
-        new_star_tile_id = None
-        all_regions = SP3Regions.query.all()
-        applicable_regions = []
-
         from event_handlers.stability_party.send_event_notification import send_event_notification
-        from event_handlers.stability_party.stability_party_handler import is_region_populated, is_shop_tile, is_dock_tile, is_star_tile
-        from sqlalchemy.orm.attributes import flag_modified
-        from app import db
-
-        for region in all_regions:
-            if not is_region_populated(region.id):
-                applicable_regions.append(region.id)
-                
-        applicable_region_tiles = SP3EventTiles.query.filter(
-            SP3EventTiles.event_id == event_id,
-            SP3EventTiles.region_id.in_(applicable_regions),
-        ).all()
-
-        # Filter out tiles that are shops, docks, or already have stars
-        applicable_region_tiles = [tile for tile in applicable_region_tiles if not is_shop_tile(tile.id) and not is_dock_tile(tile.id) and not is_star_tile(tile.id)]
-        logging.info(f"Applicable region tiles for star placement: {[tile.name for tile in applicable_region_tiles]}")
-        if applicable_region_tiles:
-            new_star_tile = random.choice(applicable_region_tiles)
-            new_star_tile_id = new_star_tile.id
-            logging.info(f"Star moved to tile {new_star_tile.name} (ID: {new_star_tile_id})")
-        else:
-            logging.error("No valid tiles available for star placement.")
-            return {"error": "No valid tiles available for star placement"}, 400
-        
+        from event_handlers.stability_party.star_placement import move_star
+        from event_handlers.stability_party.board_graph import get_board_graph
+
         old_star_tile_id = save_data.currentTile
-        event = Events.query.filter_by(id=event_id).first()
-        star_tiles = event.data.get("star_tiles")
-        star_tiles.remove(str(old_star_tile_id))
-        star_tiles.append(str(new_star_tile_id))
-        event.data["star_tiles"] = star_tiles
-        flag_modified(event, "data")
-        db.session.commit()
+        moved = move_star(event_id, old_star_tile_id)
+        if moved is None:
+            return {"error": "No valid tiles available for star placement"}, 400
+        old_star_tile, new_star_tile = moved
+        commit_team_changes()
 
+        graph = get_board_graph(event_id)
         team_name = EventTeams.query.filter_by(id=team_id).first().name
-        old_star_tile = SP3EventTiles.query.filter_by(id=old_star_tile_id).first()
-        old_star_tile_name = old_star_tile.name
-        old_star_tile_region = SP3Regions.query.filter_by(id=old_star_tile.region_id).first().name
-        new_star_tile = SP3EventTiles.query.filter_by(id=new_star_tile_id).first()
+        old_star_tile_name = old_star_tile.name if old_star_tile else str(old_star_tile_id)
+        old_star_tile_region = graph.region(old_star_tile.region_id).name if old_star_tile and graph.region(old_star_tile.region_id) else "Unknown"
         new_star_tile_name = new_star_tile.name
-        new_star_tile_region = SP3Regions.query.filter_by(id=new_star_tile.region_id).first().name
+        new_star_tile_region = graph.region(new_star_tile.region_id).name if graph.region(new_star_tile.region_id) else "Unknown"
         send_event_notification(event_id, team_id, f"{team_name} has purchased a star!", f"{team_name} has purchased the star on {old_star_tile_name} on {old_star_tile_region}!\n\nThe star has been moved to {new_star_tile_name} on {new_star_tile_region}!")
 
         return {
@@ -674,10 +645,11 @@ def complete_current_tile_handler(event_id: uuid.UUID, team_id: uuid.UUID, save_
     save_data.currentChallenges = []
     save_data.dice = [4]
 
-    from models.stability_party_3 import SP3EventTiles, SP3Regions
-    
-    tile_name = SP3EventTiles.query.filter_by(id=save_data.currentTile).first().name
-    region_name = SP3Regions.query.filter_by(id=save_data.islandId).first().name
+    from event_handlers.stability_party.board_graph import get_board_graph
+
+    graph = get_board_graph(event_id)
+    tile_name = graph.tile(save_data.currentTile).name
+    region_name = graph.region(save_data.islandId).name
 
     return {
         "message": f"used a Complete Current Tile! They have completed the tile {tile_name} on {region_name}.",
@@ -733,7 +705,9 @@ def moonlight_moth_mix_selection_handler(event_id: uuid.UUID, team_id: uuid.UUID
     
     from models.models import EventTeams
     team = EventTeams.query.filter_by(id=team_id).first()
-    selected_team = EventTeams.query.filter_by(id=selected_value).first()
+    selected_team = lock_team(selected_value, event_id)
+    if selected_team is None:
+        return { "error": "Selected team not found." }
     selected_team_save_data = SaveData.from_dict(selected_team.data)
     save_data.coins += 20
     selected_team_save_data.coins += 20
@@ -8,13 +8,16 @@ This module handles all item-related functionality including:
 - Team inventory management
 """
 
+import bisect
 import random
 import logging
+import itertools
+import threading
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 
 from models.models import EventTeams
-from event_handlers.stability_party.save_data import SaveData, save_team_data
+from event_handlers.stability_party.save_data import SaveData, save_team_data, atomic_team_update, lock_team, is_retryable_conflict
 from event_handlers.stability_party.item_definitions import (
     ITEM_HANDLERS, get_item, get_all_items
 )
@@ -85,7 +88,118 @@ def get_team_items(team_id: str, event_id: str) -> List[Dict[str, Any]]:
         logging.error(f"Error getting team items: {str(e)}")
         return []
 
-def generate_shop_inventory(event_id: str, shop_tier: int = 1, item_count: int = 3) -> List[Dict[str, Any]]:
+# Lowest to highest; a rarity without items gives its weight to the highest rarity that has some
+RARITY_ORDER = ("common", "uncommon", "rare", "epic", "legendary")
+
+def shop_tier_weights(shop_tier: int) -> Dict[str, int]:
+    """Rarity weights for a shop tier (higher tiers favour rarer items)"""
+    tier_weights = RARITY_WEIGHTS.copy()
+    if shop_tier > 1:
+        # Decrease common chance, increase rare+ chances for higher tier shops
+        tier_weights["common"] = max(10, 50 - (shop_tier * 10))
+        tier_weights["uncommon"] = 30 + (shop_tier * 2)
+        tier_weights["rare"] = 15 + (shop_tier * 5)
+        tier_weights["epic"] = 4 + (shop_tier * 2)
+        tier_weights["legendary"] = 1 + shop_tier
+    return tier_weights
+
+class ShopSampler:
+    """
+    Draws distinct shop items for one set of items and rarity weights
+
+    Built once per shop tier: items are grouped into rarity buckets with
+    their shop entries prepared, and the bucket weights are kept as a
+    cumulative table. A draw picks a bucket by weight among the buckets that
+    still have items, then an unpicked item from it, so k items cost O(k) -
+    the same distribution as picking a rarity and retrying until an unpicked
+    item turns up.
+    """
+
+    def __init__(self, items: List[Any], tier_weights: Dict[str, int]) -> None:
+        self.items = tuple(items)
+        by_rarity: Dict[str, List[Dict[str, Any]]] = {}
+        for item in self.items:
+            entry = item.to_dict()
+            by_rarity.setdefault(entry["rarity"].lower(), []).append({
+                "id": str(entry["id"]),
+                "name": entry["name"],
+                "description": entry["description"],
+                "image": entry["image"],
+                "item_type": entry["item_type"],
+                "rarity": entry["rarity"],
+                "base_price": entry["base_price"]
+            })
+
+        weights = {rarity: tier_weights.get(rarity, 0) for rarity in RARITY_ORDER if by_rarity.get(rarity)}
+        if weights:
+            highest = next(rarity for rarity in reversed(RARITY_ORDER) if rarity in weights)
+            weights[highest] += sum(weight for rarity, weight in tier_weights.items() if rarity in RARITY_ORDER and rarity not in weights)
+
+        buckets = [(rarity, weight) for rarity, weight in weights.items() if weight > 0]
+        self.rarities = tuple(rarity for rarity, _ in buckets)
+        self.buckets = tuple(tuple(by_rarity[rarity]) for rarity in self.rarities)
+        self.weights = tuple(weight for _, weight in buckets)
+        self.cumulative = tuple(itertools.accumulate(self.weights))
+
+    def sample(self, item_count: int, rng=random) -> List[Dict[str, Any]]:
+        """Draw up to item_count distinct items as shop entries, priced with rng"""
+        taken = [0] * len(self.buckets)
+        # Per bucket, the positions swapped out by earlier picks (a lazy Fisher-Yates shuffle)
+        swaps: List[Dict[int, int]] = [{} for _ in self.buckets]
+        cumulative, total = self.cumulative, self.cumulative[-1] if self.cumulative else 0
+
+        shop_items = []
+        while len(shop_items) < item_count and total > 0:
+            bucket = bisect.bisect_right(cumulative, rng.randrange(total))
+            items, moved = self.buckets[bucket], swaps[bucket]
+            position = taken[bucket] + rng.randrange(len(items) - taken[bucket])
+            entry = items[moved.get(position, position)]
+            moved[position] = moved.get(taken[bucket], taken[bucket])
+            taken[bucket] += 1
+
+            if taken[bucket] == len(items):
+                # Bucket used up; its weight goes to the rest
+                cumulative = tuple(itertools.accumulate(
+                    weight if taken[index] < len(self.buckets[index]) else 0 for index, weight in enumerate(self.weights)
+                ))
+                total = cumulative[-1]
+
+            base_price = entry["base_price"]
+            if base_price >= 10: # Only apply variance if base price is above a threshold
+                final_price = int(base_price * rng.uniform(0.8, 1.2))  # 20% variance
+            else:
+                final_price = base_price
+            shop_items.append({
+                "id": entry["id"],
+                "name": entry["name"],
+                "description": entry["description"],
+                "image": entry["image"],
+                "item_type": entry["item_type"],
+                "rarity": entry["rarity"],
+                "price": final_price
+            })
+        return shop_items
+
+_samplers: Dict[tuple, ShopSampler] = {}
+_samplers_lock = threading.Lock()
+
+def get_shop_sampler(items: List[Any], shop_tier: int) -> ShopSampler:
+    """The sampler for these items at a shop tier, built on first use and whenever the items or weights change"""
+    tier_weights = shop_tier_weights(shop_tier)
+    key = (shop_tier, tuple(sorted(tier_weights.items())))
+    sampler = _samplers.get(key)
+    if sampler is not None and sampler.items == tuple(items):
+        return sampler
+
+    with _samplers_lock:
+        sampler = _samplers.get(key)
+        if sampler is None or sampler.items != tuple(items):
+            logging.debug(f"Shop tier {shop_tier} rarity weights: {tier_weights}")
+            sampler = ShopSampler(items, tier_weights)
+            _samplers[key] = sampler
+    return sampler
+
+def generate_shop_inventory(event_id: str, shop_tier: int = 1, item_count: int = 3, seed: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Generate a random selection of items for a shop based on shop tier.
     
@@ -93,102 +207,21 @@ def generate_shop_inventory(event_id: str, shop_tier: int = 1, item_count: int =
     - event_id: The event these items belong to
     - shop_tier: The tier/level of the shop (higher tiers have better items)
     - item_count: Number of items to generate
+    - seed: Draw from a random.Random(seed) instead of the global generator, so the result is repeatable
     
     Returns:
     - List of item dictionaries for the shop
     """
     try:
         # Get all available items from registry
-        all_items = [item.to_dict() for item in get_all_items()]
+        all_items = get_all_items()
         
         if not all_items:
             logging.warning(f"No items found for shop generation")
             return []
-        
-        # Prepare empty result list
-        shop_items = []
-        
-        # Keep track of selected items to avoid duplicates
-        selected_item_ids = set()
-        
-        # Adjust weights based on shop tier
-        tier_weights = RARITY_WEIGHTS.copy()
-        if shop_tier > 1:
-            # Decrease common chance, increase rare+ chances for higher tier shops
-            tier_weights["common"] = max(10, 50 - (shop_tier * 10))
-            tier_weights["uncommon"] = 30 + (shop_tier * 2)
-            tier_weights["rare"] = 15 + (shop_tier * 5)
-            tier_weights["epic"] = 4 + (shop_tier * 2)
-            tier_weights["legendary"] = 1 + shop_tier
-            
-        logging.debug(f"Shop tier {shop_tier} rarity weights: {tier_weights}")
-        
-        # Group items by rarity
-        items_by_rarity = {}
-        for item in all_items:
-            rarity = item["rarity"].lower()
-            if rarity not in items_by_rarity:
-                items_by_rarity[rarity] = []
-            items_by_rarity[rarity].append(item)
-        
-        # Count attempt to avoid infinite loops if there aren't enough unique items
-        attempt_count = 0
-        max_attempts = item_count * 3
-        
-        # Select random items based on rarity weights
-        while len(shop_items) < item_count and attempt_count < max_attempts:
-            attempt_count += 1
-            
-            # Determine rarity based on weights
-            rarities = list(tier_weights.keys())
-            weights = list(tier_weights.values())
-            selected_rarity = random.choices(rarities, weights=weights, k=1)[0]
-            
-            # If no items of this rarity, try another
-            if selected_rarity not in items_by_rarity or not items_by_rarity[selected_rarity]:
-                # Try all rarities from highest to lowest
-                for rarity in sorted(items_by_rarity.keys(), 
-                                     key=lambda r: ["common", "uncommon", "rare", "epic", "legendary"].index(r), 
-                                     reverse=True):
-                    if items_by_rarity[rarity]:
-                        selected_rarity = rarity
-                        break
-                else:
-                    # Skip if still no items found
-                    continue
-            
-            # Get available items of this rarity (items not already selected)
-            available_items = [item for item in items_by_rarity[selected_rarity] 
-                               if str(item["id"]) not in selected_item_ids]
-            
-            # If no available items of this rarity, try another rarity
-            if not available_items:
-                continue
-                
-            # Select random item of chosen rarity
-            item = random.choice(available_items)
-            
-            # Mark as selected to avoid duplicates
-            selected_item_ids.add(str(item["id"]))
-            
-            # Calculate price with some randomness
-            base_price = item["base_price"]
-            if base_price >= 10: # Only apply variance if base price is above a threshold
-                price_variance = random.uniform(0.8, 1.2)  # 20% variance
-                final_price = int(base_price * price_variance)
-            else:
-                final_price = base_price
-            
-            # Add item to shop inventory
-            shop_items.append({
-                "id": str(item["id"]),
-                "name": item["name"],
-                "description": item["description"],
-                "image": item["image"],
-                "item_type": item["item_type"],
-                "rarity": item["rarity"],
-                "price": final_price
-            })
+
+        rng = random.Random(seed) if seed is not None else random
+        shop_items = get_shop_sampler(all_items, shop_tier).sample(item_count, rng)
         
         # If we couldn't find enough unique items, log a warning
         if len(shop_items) < item_count:
@@ -199,6 +232,22 @@ def generate_shop_inventory(event_id: str, shop_tier: int = 1, item_count: int =
         logging.error(f"Error generating shop inventory: {str(e)}")
         return []
 
+def new_inventory_entry(item_id: str) -> Optional[Dict[str, Any]]:
+    """Build the itemList entry for a newly acquired item, or None if the item doesn't exist"""
+    item = get_item_by_id(item_id)
+    if not item:
+        return None
+    return {
+        "id": item_id,
+        "name": item["name"],
+        "description": item["description"],
+        "item_type": item["item_type"],
+        "rarity": item["rarity"],
+        "uses_remaining": item["uses"],
+        "purchased_at": datetime.now().isoformat()
+    }
+
+@atomic_team_update
 def add_item_to_inventory(event_id: str, team_id: str, item_id: str) -> bool:
     """
     Add an item to a team's inventory
@@ -213,42 +262,33 @@ def add_item_to_inventory(event_id: str, team_id: str, item_id: str) -> bool:
     """
     try:
         # Get team and save data
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             logging.error(f"Team not found: {team_id}")
             return False
         
         save = SaveData.from_dict(team.data)
         
-        # Get item details from registry or database
-        item = get_item_by_id(item_id)
-        if not item:
+        item_entry = new_inventory_entry(item_id)
+        if not item_entry:
             logging.error(f"Item not found: {item_id}")
             return False
-            
-        # Create inventory item entry
-        item_entry = {
-            "id": item_id,
-            "name": item["name"],
-            "description": item["description"],
-            "item_type": item["item_type"],
-            "rarity": item["rarity"],
-            "uses_remaining": item["uses"],
-            "purchased_at": datetime.now().isoformat()
-        }
         
         # Add to inventory
         save.itemList.append(item_entry)
-        logging.info(f"Added item {item['name']} (ID: {item_id}) to team {team_id} inventory")
+        logging.info(f"Added item {item_entry['name']} (ID: {item_id}) to team {team_id} inventory")
         
         # Save changes
         save_team_data(team, save)
         return True
     
     except Exception as e:
+        if is_retryable_conflict(e):
+            raise # atomic_team_update retries the whole update
         logging.error(f"Error adding item to inventory: {str(e)}")
         return False
 
+@atomic_team_update
 def use_item(event_id: str, team_id: str, item_index: int) -> Dict[str, Any]:
     """
     Use/activate an item from a team's inventory
@@ -263,7 +303,7 @@ def use_item(event_id: str, team_id: str, item_index: int) -> Dict[str, Any]:
     """
     try:
         # Get team and save data
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             logging.error(f"Team not found: {team_id}")
             return {"success": False, "message": "Team not found"}
@@ -352,9 +392,12 @@ def use_item(event_id: str, team_id: str, item_index: int) -> Dict[str, Any]:
         }
         
     except Exception as e:
+        if is_retryable_conflict(e):
+            raise # atomic_team_update retries the whole update
         logging.error(f"Error using item: {str(e)}")
         return {"success": False, "message": f"Error using item: {str(e)}"}
     
+@atomic_team_update
 def complete_item_activation(event_id: str, team_id: str, selection_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Complete a two-stage item activation by processing the user's selection
@@ -369,7 +412,7 @@ def complete_item_activation(event_id: str, team_id: str, selection_data: Dict[s
     """
     try:
         # Get team and save data
-        team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
+        team = lock_team(team_id, event_id)
         if not team:
             logging.error(f"Team not found: {team_id}")
             return {"success": False, "message": "Team not found"}
@@ -444,5 +487,7 @@ def complete_item_activation(event_id: str, team_id: str, selection_data: Dict[s
         }
         
     except Exception as e:
+        if is_retryable_conflict(e):
+            raise # atomic_team_update retries the whole update
         logging.error(f"Error completing item activation: {str(e)}")
         return {"success": False, "message": f"Error completing item activation: {str(e)}"}
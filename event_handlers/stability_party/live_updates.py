@@ -0,0 +1,389 @@
+"""
+Live Stability Party updates, pushed instead of polled
+
+The site and the Discord bot used to poll /progress, /stats and
+/available-actions every few seconds per viewer. Clients can now follow an
+event through /events/<id>/stream (server-sent events) or /events/<id>/updates
+(long-poll) and get an update whenever a change to the event commits.
+
+Publishing: any write to a team (save_team_data journals every write, other ORM
+edits fire the EventTeams mapper events) or a rename on the board queues the
+event and team IDs on the session. Just before the transaction commits they are
+sent with pg_notify, which Postgres only delivers once the commit succeeded, so
+a rolled back write is never announced and every process hears about writes
+made by every other process. Standings are refreshed after the write commits,
+so each refresh sends one more notification (with no teams) for the standings
+rows it changed.
+
+Fan-out: each process runs one LiveUpdateHub. Its listener thread LISTENs on
+LIVE_UPDATES_CHANNEL and, for events somebody is following, builds an update
+once per notification batch: the standings rows that changed since the previous
+update (plus teams that left) and the current state of the teams that were
+written. The encoded update goes into a per-event buffer and all waiting
+clients are woken; no per-client queries or copies are made.
+
+Resuming: every update carries a cursor ("<hub epoch>.<sequence>"). A client
+that reconnects with its last cursor (the Last-Event-ID header, or ?since=)
+gets the buffered updates it missed. If the cursor is from another process or
+hub run, or older than the last LIVE_UPDATES_BUFFER_SIZE updates, it gets a
+snapshot of the whole event instead, followed by updates as usual.
+
+Each open stream, and each long-poll while it waits, holds one of the server's
+worker threads. So that they can never take every thread, at most
+LIVE_UPDATES_MAX_WAITING of them are held per process, by default half of
+LIVE_UPDATES_SERVER_THREADS (set it to waitress' --threads). Past that, streams
+are refused with a 503 and long-polls answer straight away, like a plain poll.
+Serving thousands of followers means raising --threads (and
+LIVE_UPDATES_SERVER_THREADS) to match.
+"""
+
+import os
+import time
+import uuid
+import select
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from sqlalchemy import event as sa_event, inspect, text
+
+from app import app, db
+from models.models import EventTeams
+from models.stability_party_3 import SP3EventTiles, SP3Regions, SP3TeamJournal
+from event_handlers.stability_party.save_data import SaveData
+from event_handlers.stability_party.board_graph import get_board_graph
+from event_handlers.stability_party.board_distances import get_board_distances
+from event_handlers.stability_party.standings import get_event_standings, serialize_standing, on_standings_refreshed
+
+LIVE_UPDATES_CHANNEL = os.getenv("LIVE_UPDATES_CHANNEL", "sp3_live_updates")
+LIVE_UPDATES_BUFFER_SIZE = int(os.getenv("LIVE_UPDATES_BUFFER_SIZE", "256"))
+LIVE_UPDATES_SERVER_THREADS = int(os.getenv("LIVE_UPDATES_SERVER_THREADS", "4"))
+LIVE_UPDATES_MAX_WAITING = int(os.getenv("LIVE_UPDATES_MAX_WAITING", str(max(1, LIVE_UPDATES_SERVER_THREADS // 2))))
+LIVE_UPDATES_KEEPALIVE_SECONDS = float(os.getenv("LIVE_UPDATES_KEEPALIVE_SECONDS", "15"))
+LIVE_UPDATES_LONG_POLL_SECONDS = float(os.getenv("LIVE_UPDATES_LONG_POLL_SECONDS", "25"))
+LIVE_UPDATES_IDLE_SECONDS = float(os.getenv("LIVE_UPDATES_IDLE_SECONDS", "120"))
+
+# pg_notify payloads are limited to 8000 bytes; past this many teams the update covers every team
+MAX_NOTIFIED_TEAMS = 100
+
+# Publishing
+
+def queue_live_update(event_id, team_id=None, session=None) -> None:
+    """Announce a change to an event (and one of its teams) when the current transaction commits"""
+    if event_id is None:
+        return
+    session = session if session is not None else db.session
+    teams = session.info.setdefault("live_updates", {}).setdefault(str(event_id), set())
+    if team_id is not None:
+        teams.add(str(team_id))
+
+def _on_journal_entry(mapper, connection, target) -> None:
+    # Covers save_team_data's partial writes, which bypass the EventTeams mapper
+    queue_live_update(target.event_id, target.team_id, inspect(target).session)
+
+def _on_team_changed(mapper, connection, target) -> None:
+    session = inspect(target).session
+    queue_live_update(target.event_id, target.id, session)
+    for event_id in inspect(target).attrs.event_id.history.deleted:
+        # Moved to another event; it's gone from this one's standings
+        queue_live_update(event_id, None, session)
+
+def _on_board_renamed(mapper, connection, target) -> None:
+    if inspect(target).attrs.name.history.has_changes():
+        queue_live_update(target.event_id, None, inspect(target).session)
+
+def _before_commit(session) -> None:
+    # Flush first so changes still pending fire their mapper events
+    session.flush()
+    updates = session.info.pop("live_updates", None)
+    if not updates:
+        return
+    for event_id, team_ids in updates.items():
+        teams = sorted(team_ids) if len(team_ids) <= MAX_NOTIFIED_TEAMS else None
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": LIVE_UPDATES_CHANNEL, "payload": app.json.dumps({"event_id": event_id, "teams": teams})}
+        )
+
+def _on_standings_refreshed(connection, event_id) -> None:
+    connection.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": LIVE_UPDATES_CHANNEL, "payload": app.json.dumps({"event_id": str(event_id), "teams": []})}
+    )
+
+def _on_rollback(session) -> None:
+    session.info.pop("live_updates", None)
+
+# Building updates
+
+def serialize_team_state(team: EventTeams, graph, distances) -> dict:
+    """The parts of a team's state viewers follow (what /stats and /available-actions are polled for)"""
+    save = SaveData.from_dict(team.data or {})
+    tile = graph.tile(save.currentTile)
+    region = graph.region(save.islandId)
+    return {
+        "team_id": str(team.id),
+        "team_name": team.name,
+        "version": team.version,
+        "stars": save.stars,
+        "coins": save.coins,
+        "current_tile": save.currentTile,
+        "current_tile_name": tile.name if tile else None,
+        "current_region": region.name if region else None,
+        "tile_completed": save.isTileCompleted,
+        "is_rolling": save.isRolling,
+        "equipment": save.equipment.to_dict(),
+        "buffs": save.buffs,
+        "debuffs": save.debuffs,
+        "items": save.itemList,
+        "nearest_star_distance": distances.nearest(save.currentTile, graph.star_tiles)[1]
+    }
+
+def _load_event_state(event_id, team_ids: Optional[List[str]]) -> tuple[Dict[str, dict], List[dict]]:
+    """(standings by team ID, team states) of an event; team_ids None loads every team"""
+    graph = get_board_graph(event_id)
+    distances = get_board_distances(event_id, graph)
+    standings = {str(row.team_id): serialize_standing(row, graph, distances) for row in get_event_standings(event_id)}
+
+    query = EventTeams.query.filter(EventTeams.event_id == event_id)
+    if team_ids is not None:
+        if not team_ids:
+            return standings, []
+        query = query.filter(EventTeams.id.in_([uuid.UUID(team_id) for team_id in team_ids]))
+    teams = [serialize_team_state(team, graph, distances) for team in query.order_by(EventTeams.name).all()]
+    return standings, teams
+
+def build_event_snapshot(event_id) -> dict:
+    """Everything a client following an event needs, with the cursor to follow it from"""
+    # Take the cursor before reading, so no change committed after the read is missed
+    cursor = live_hub.cursor()
+    standings, teams = _load_event_state(event_id, None)
+    return {
+        "cursor": cursor,
+        "event_id": str(event_id),
+        "snapshot": True,
+        "standings": list(standings.values()),
+        "removed_teams": [],
+        "teams": teams
+    }
+
+# Fan-out
+
+class LiveUpdate:
+    def __init__(self, seq: int, cursor: str, message: dict) -> None:
+        self.seq = seq
+        self.cursor = cursor
+        self.message = message
+        self.sse = format_sse(message, "update", cursor)
+
+class LiveEvent:
+    """Buffered updates of one followed event"""
+
+    def __init__(self, floor: int) -> None:
+        self.updates: deque[LiveUpdate] = deque()
+        self.floor = floor  # Updates up to this sequence number are no longer buffered
+        self.standings: Optional[Dict[str, dict]] = None  # As of the last update, for deltas
+        self.subscribers = 0
+        self.last_seen = time.monotonic()
+
+def format_sse(message: dict, event: str, cursor: Optional[str] = None) -> str:
+    lines = []
+    if cursor:
+        lines.append(f"id: {cursor}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {app.json.dumps(message)}")
+    return "\n".join(lines) + "\n\n"
+
+class LiveUpdateHub:
+    def __init__(self) -> None:
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.waiting = 0
+        self._events: Dict[str, LiveEvent] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.listening = threading.Event()
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="live-update-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def cursor(self) -> str:
+        with self._cond:
+            return f"{self.epoch}.{self.seq}"
+
+    def subscribe(self, event_id, hold: bool = False) -> bool:
+        """Start following an event; with hold, the caller waits on it in a server thread (False if too many do)"""
+        self.start()
+        with self._cond:
+            if hold:
+                if self.waiting >= LIVE_UPDATES_MAX_WAITING:
+                    return False
+                self.waiting += 1
+            live = self._events.get(str(event_id))
+            if live is None:
+                live = self._events[str(event_id)] = LiveEvent(self.seq)
+            live.subscribers += 1
+            live.last_seen = time.monotonic()
+            return True
+
+    def unsubscribe(self, event_id, hold: bool = False) -> None:
+        with self._cond:
+            if hold:
+                self.waiting -= 1
+            live = self._events.get(str(event_id))
+            if live is not None:
+                live.subscribers -= 1
+                live.last_seen = time.monotonic()
+
+    def wait(self, event_id, cursor: Optional[str], timeout: float) -> Optional[List[LiveUpdate]]:
+        """
+        Updates of a followed event after a cursor, waiting up to timeout for one
+
+        Returns:
+            The updates (empty on timeout), or None if the cursor can't be
+            resumed from and the client needs a snapshot
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                seq = self._parse_cursor(cursor)
+                live = self._events.get(str(event_id))
+                if seq is None or live is None or seq < live.floor or seq > self.seq:
+                    return None
+                missed = [update for update in live.updates if update.seq > seq]
+                remaining = deadline - time.monotonic()
+                if missed or remaining <= 0:
+                    return missed
+                self._cond.wait(remaining)
+
+    def _parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        epoch, _, seq = (cursor or "").partition(".")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, event_id: str, team_ids: Optional[List[str]]) -> None:
+        """Build and fan out an update for an event (no-op if nobody follows it)"""
+        with self._cond:
+            live = self._events.get(event_id)
+            if live is None:
+                return
+            previous = live.standings
+
+        standings, teams = _load_event_state(uuid.UUID(event_id), team_ids)
+        changed = [row for team_id, row in standings.items() if previous is None or previous.get(team_id) != row]
+        removed = sorted(set(previous or {}) - set(standings))
+        if not changed and not removed and not teams:
+            return
+
+        with self._cond:
+            if self._events.get(event_id) is not live:
+                return
+            self.seq += 1
+            update = LiveUpdate(self.seq, f"{self.epoch}.{self.seq}", {
+                "cursor": f"{self.epoch}.{self.seq}",
+                "event_id": event_id,
+                "snapshot": False,
+                "standings": changed,
+                "removed_teams": removed,
+                "teams": teams
+            })
+            live.standings = standings
+            live.updates.append(update)
+            if len(live.updates) > LIVE_UPDATES_BUFFER_SIZE:
+                live.floor = live.updates.popleft().seq
+            self._cond.notify_all()
+
+    def _resync(self) -> None:
+        # Notifications sent while the listener wasn't connected are lost: start over with a new
+        # epoch so every client falls back to a snapshot
+        with self._cond:
+            self.epoch = uuid.uuid4().hex[:8]
+            self.seq = 0
+            for live in self._events.values():
+                live.updates.clear()
+                live.floor = 0
+                live.standings = None
+            self._cond.notify_all()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        with self._cond:
+            for event_id in [event_id for event_id, live in self._events.items()
+                             if live.subscribers <= 0 and now - live.last_seen > LIVE_UPDATES_IDLE_SECONDS]:
+                del self._events[event_id]
+
+    def _run(self) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            connection = None
+            try:
+                with app.app_context():
+                    # A connection of its own for as long as the hub listens, outside the pool
+                    connection = db.engine.raw_connection()
+                    connection.detach()
+                # driver_connection goes through the pool record, which detach() dropped
+                listener = connection.dbapi_connection
+                listener.autocommit = True
+                with listener.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{LIVE_UPDATES_CHANNEL}"')
+                self._resync()
+                self.listening.set()
+                logging.info(f"Listening for live updates on {LIVE_UPDATES_CHANNEL}")
+                backoff = 1
+
+                while not self._stop.is_set():
+                    self._prune()
+                    if select.select([listener], [], [], LIVE_UPDATES_KEEPALIVE_SECONDS) == ([], [], []):
+                        continue
+                    listener.poll()
+                    # Coalesce everything that arrived together into one update per event
+                    pending: Dict[str, Optional[set]] = {}
+                    while listener.notifies:
+                        payload = app.json.loads(listener.notifies.pop(0).payload)
+                        teams = pending.setdefault(payload["event_id"], set())
+                        if teams is None or payload.get("teams") is None:
+                            pending[payload["event_id"]] = None
+                        else:
+                            teams.update(payload["teams"])
+                    if pending:
+                        with app.app_context():
+                            for event_id, team_ids in pending.items():
+                                try:
+                                    self.publish(event_id, sorted(team_ids) if team_ids is not None else None)
+                                except Exception as e:
+                                    db.session.rollback()
+                                    logging.error(f"Error publishing live update for event {event_id}: {e}", exc_info=True)
+            except Exception as e:
+                logging.error(f"Live update listener error, reconnecting in {backoff}s: {e}", exc_info=True)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                self.listening.clear()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+live_hub = LiveUpdateHub()
+
+sa_event.listen(SP3TeamJournal, "after_insert", _on_journal_entry)
+sa_event.listen(EventTeams, "after_insert", _on_team_changed)
+sa_event.listen(EventTeams, "after_update", _on_team_changed)
+sa_event.listen(EventTeams, "after_delete", _on_team_changed)
+sa_event.listen(SP3EventTiles, "after_update", _on_board_renamed)
+sa_event.listen(SP3Regions, "after_update", _on_board_renamed)
+sa_event.listen(db.session, "before_commit", _before_commit)
+sa_event.listen(db.session, "after_rollback", _on_rollback)
+on_standings_refreshed(_on_standings_refreshed)
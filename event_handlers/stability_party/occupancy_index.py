@@ -0,0 +1,117 @@
+"""
+Per-event region occupancy: which teams are on which island
+
+Star placement asks "is anyone on this region?" for every region, and each
+check used to load every team of every event. The occupancy of an event is now
+built from one indexed query over event_teams (see ix_event_teams_event_id_island_id)
+and kept in memory as {region_id: frozenset(team_ids)}, so a lookup is a dict access.
+
+An event's occupancy is dropped whenever one of its teams is inserted, deleted
+or has its data updated through the ORM, or save_team_data writes a team's islandId
+(partial writes bypass the mapper), and again once that change commits or
+rolls back. It is
+also rebuilt once older than REGION_OCCUPANCY_MAX_AGE_SECONDS as a safety net.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import object_session
+
+from app import db
+from models.models import EventTeams
+
+REGION_OCCUPANCY_MAX_AGE_SECONDS = int(os.getenv("REGION_OCCUPANCY_MAX_AGE_SECONDS", "30"))
+
+class RegionOccupancy:
+    def __init__(self, event_id: uuid.UUID, regions: Dict[str, frozenset[str]]) -> None:
+        self.event_id = event_id
+        self.regions: Mapping[str, frozenset[str]] = MappingProxyType(regions)
+        self.built_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.built_at > REGION_OCCUPANCY_MAX_AGE_SECONDS
+
+    def teams_on(self, region_id) -> frozenset[str]:
+        if region_id is None:
+            return frozenset()
+        return self.regions.get(str(region_id), frozenset())
+
+    def is_populated(self, region_id, exclude_team_id=None) -> bool:
+        teams = self.teams_on(region_id)
+        if exclude_team_id is not None:
+            return bool(teams - {str(exclude_team_id)})
+        return bool(teams)
+
+def build_region_occupancy(event_id: uuid.UUID) -> RegionOccupancy:
+    island_id = EventTeams.data["islandId"].astext
+    rows = db.session.query(EventTeams.id, island_id).filter(
+        EventTeams.event_id == event_id,
+        island_id.isnot(None)
+    ).all()
+
+    regions: Dict[str, set[str]] = {}
+    for team_id, region_id in rows:
+        regions.setdefault(region_id, set()).add(str(team_id))
+
+    logging.debug(f"Built region occupancy for event {event_id}: {len(rows)} teams on {len(regions)} regions")
+    return RegionOccupancy(event_id, {region_id: frozenset(teams) for region_id, teams in regions.items()})
+
+_occupancy: Dict[str, RegionOccupancy] = {}
+_lock = threading.Lock()
+
+def get_region_occupancy(event_id: uuid.UUID) -> RegionOccupancy:
+    """Get an event's region occupancy, building it on first use"""
+    key = str(event_id)
+    occupancy = _occupancy.get(key)
+    if occupancy is not None and not occupancy.is_stale():
+        return occupancy
+
+    with _lock:
+        occupancy = _occupancy.get(key)
+        if occupancy is None or occupancy.is_stale():
+            occupancy = build_region_occupancy(event_id)
+            _occupancy[key] = occupancy
+    return occupancy
+
+def invalidate_region_occupancy(event_id: Optional[uuid.UUID] = None) -> None:
+    """Drop the occupancy of an event (or every event) after a team moves"""
+    with _lock:
+        if event_id is None:
+            _occupancy.clear()
+        else:
+            _occupancy.pop(str(event_id), None)
+
+def mark_region_occupancy_dirty(event_id: Optional[uuid.UUID], session=None) -> None:
+    """Invalidate an event's occupancy now and again when the current transaction commits"""
+    if event_id is None:
+        return
+    invalidate_region_occupancy(event_id)
+    session = session if session is not None else db.session
+    session.info.setdefault("region_occupancy_dirty", set()).add(event_id)
+
+def _on_team_changed(mapper, connection, target) -> None:
+    mark_region_occupancy_dirty(target.event_id, object_session(target))
+
+def _on_team_updated(mapper, connection, target) -> None:
+    # Name/captain/image edits don't move anyone
+    if inspect(target).attrs.data.history.has_changes() or inspect(target).attrs.event_id.history.has_changes():
+        _on_team_changed(mapper, connection, target)
+
+def _on_commit(session) -> None:
+    # Invalidate again once the move is visible to other sessions, so a rebuild
+    # that raced the flush doesn't keep the old occupancy around
+    for event_id in session.info.pop("region_occupancy_dirty", set()):
+        invalidate_region_occupancy(event_id)
+
+sa_event.listen(EventTeams, "after_insert", _on_team_changed)
+sa_event.listen(EventTeams, "after_update", _on_team_updated)
+sa_event.listen(EventTeams, "after_delete", _on_team_changed)
+sa_event.listen(db.session, "after_commit", _on_commit)
+sa_event.listen(db.session, "after_rollback", _on_commit)
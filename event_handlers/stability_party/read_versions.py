@@ -0,0 +1,89 @@
+"""
+Versions of what the team read endpoints are built from
+
+/stats, /tile-progress, /total-progress, /available-actions and
+/items/inventory are polled constantly while a team's state only changes a
+few times an hour. Their ETags (see helper/http_cache.py) are made of:
+- the team's state version: EventTeams.version, bumped by every write to the
+  team row, and the team's last journal entry, which also moves when only its
+  challenge progress changes (progress rows don't touch the team row)
+- the board's fingerprint (tiles, regions and stars) from the compiled board graph
+- the challenge definitions' fingerprint from the trigger index, where the
+  response shows challenge progress
+
+The team's versions are read in one indexed query, so a 304 costs no more
+than that. The board and definitions fingerprints follow the compiled caches,
+so a definition edited directly in the database shows up once they are rebuilt.
+
+/stats also lists the team's members, which aren't part of the team row; a
+digest of them is read in the same query.
+"""
+
+import json
+import hashlib
+import functools
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from app import db
+from helper.http_cache import make_etag
+from models.models import Events, EventTeams, EventTeamMemberMappings
+from models.stability_party_3 import SP3TeamJournal
+from event_handlers.stability_party.board_graph import get_board_graph
+from event_handlers.stability_party.trigger_index import get_trigger_index
+from event_handlers.stability_party.item_definitions import get_all_items
+
+def team_state_version(event_id, team_id, members: bool = False) -> Optional[str]:
+    """The team's state version, or None if the team isn't in that Stability Party event"""
+    columns = [
+        EventTeams.version,
+        db.session.query(func.max(SP3TeamJournal.id)).filter(SP3TeamJournal.team_id == EventTeams.id).scalar_subquery()
+    ]
+    if members:
+        columns.append(
+            db.session.query(
+                func.md5(func.string_agg(func.coalesce(EventTeamMemberMappings.username, ""), aggregate_order_by(",", EventTeamMemberMappings.username)))
+            ).filter(EventTeamMemberMappings.team_id == EventTeams.id).scalar_subquery()
+        )
+    row = db.session.query(*columns).join(
+        Events, Events.id == EventTeams.event_id
+    ).filter(
+        EventTeams.id == team_id,
+        EventTeams.event_id == event_id,
+        Events.type == "STABILITY_PARTY"
+    ).first()
+    if row is None:
+        return None
+    return ".".join(str(value or 0) for value in row)
+
+def board_version(event_id) -> str:
+    return get_board_graph(event_id).fingerprint
+
+def definitions_version(event_id) -> str:
+    return get_trigger_index(event_id).fingerprint
+
+@functools.lru_cache(maxsize=1)
+def item_catalog_version() -> str:
+    """Item definitions are part of the code, so they only change with a deploy"""
+    return hashlib.sha1(json.dumps([item.to_dict() for item in get_all_items()], sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def team_etag(name: str, event_id, team_id, board: bool = False, definitions: bool = False, items: bool = False, members: bool = False) -> Optional[str]:
+    """
+    ETag of a team read endpoint's response, from the versions it's built from
+
+    Returns None if the team isn't in that Stability Party event (the
+    endpoint answers with its usual error).
+    """
+    version = team_state_version(event_id, team_id, members)
+    if version is None:
+        return None
+    parts = [name, event_id, team_id, version]
+    if board:
+        parts.append(board_version(event_id))
+    if definitions:
+        parts.append(definitions_version(event_id))
+    if items:
+        parts.append(item_catalog_version())
+    return make_etag(*parts)
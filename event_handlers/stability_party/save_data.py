@@ -1,9 +1,26 @@
 from app import db
 from models.models import EventTeams
-from sqlalchemy.orm.attributes import flag_modified  # Add this import
+from event_handlers.stability_party.challenge_progress import ChallengeProgress, save_team_progress
+from event_handlers.stability_party.team_journal import begin_team_change, record_team_change
+from event_handlers.stability_party.occupancy_index import mark_region_occupancy_dirty
+from event_handlers.stability_party.standings import mark_standings_dirty
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import event as sa_event, bindparam, update
+from sqlalchemy.exc import OperationalError
+import functools
+import copy
+import random
+import time
 import uuid
 import logging
 
+TEAM_UPDATE_MAX_ATTEMPTS = 5
+# team.data fields shown in the event standings
+STANDINGS_FIELDS = frozenset({"stars", "coins", "currentTile", "islandId", "isTileCompleted"})
+
 # Roll Progression System
 class RollState:
     ACTION_TYPES = {
@@ -140,7 +157,8 @@ class SaveData:
     # This is called tileProgress but it is essentially a challenge progress tracker
     # Maps challenge IDs to task progress
     # e.g., {challenge_id: {task_id: progress}}
-    tileProgress: dict[str, dict[str, int]]
+    # Stored in sp3_challenge_progress rather than in team.data (see challenge_progress.py)
+    tileProgress: ChallengeProgress
 
     roll_state: RollState | None = None  # Optional roll state for tracking current roll
 
@@ -168,15 +186,17 @@ class SaveData:
             "debuffs": self.debuffs,
             "textChannelId": self.textChannelId,
             "voiceChannelId": self.voiceChannelId,
-            "tileProgress": {
-                challenge_id: {task_id: progress for task_id, progress in tasks.items()}
-                for challenge_id, tasks in self.tileProgress.items()
-            },
             "roll_state": self.roll_state.to_dict() if self.roll_state else None,
         }
     
     @staticmethod
-    def from_dict(data: dict) -> "SaveData":
+    def from_dict(data: dict, team_id: uuid.UUID | None = None) -> "SaveData":
+        """
+        Build a SaveData from a team's data
+
+        Pass team_id to load the team's challenge progress as well; without it
+        tileProgress only holds whatever legacy progress is still in `data`.
+        """
         save_data = SaveData()
         save_data.previousTile = uuid.UUID(data["previousTile"]) if data.get("previousTile") else None
         save_data.currentTile = uuid.UUID(data["currentTile"]) if data.get("currentTile") else None
@@ -196,28 +216,227 @@ class SaveData:
         save_data.debuffs = data.get("debuffs", [])
         save_data.textChannelId = data.get("textChannelId", "")
         save_data.voiceChannelId = data.get("voiceChannelId", "")
-        save_data.tileProgress = {
-            challenge_id: {task_id: progress for task_id, progress in tasks.items()}
-            for challenge_id, tasks in data.get("tileProgress", {}).items()
-        }
+        save_data.tileProgress = ChallengeProgress.load(team_id, legacy=data.get("tileProgress"))
         
         save_data.roll_state = RollState.from_save_data(
             event_id=data.get("event_id"),
             team_id=data.get("team_id"),
             save_data=data.get("roll_state", {})
         ) if "roll_state" in data else None
+
+        # Snapshot of what was loaded, so save_team_data can write only the fields that changed.
+        # Lists and dicts above are shared with `data` and get mutated in place, so they're copied.
+        # A leftover tileProgress key isn't part of to_dict(), so it forces one full write that drops it.
+        save_data._loaded = {
+            key: None if key == "tileProgress" else copy.deepcopy(value)
+            for key, value in data.items()
+        }
         
         return save_data
 
+    def dirty_fields(self) -> dict | None:
+        """
+        Top-level fields whose serialized value differs from what was loaded
+
+        Returns None when a partial write isn't possible: the save wasn't loaded
+        with from_dict, or the set of top-level keys changed.
+        """
+        loaded = getattr(self, "_loaded", None)
+        if loaded is None:
+            return None
+        current = self.to_dict()
+        if current.keys() != loaded.keys():
+            return None
+        return {key: value for key, value in current.items() if value != loaded[key]}
+
+# Team state concurrency
+#
+# Team state lives in a single JSONB column, so two requests that each read
+# team.data, mutate a SaveData and write it back would silently drop one of the
+# updates. Functions that read-modify-write team state are wrapped in
+# @atomic_team_update, which runs them as one transaction:
+# - lock_team() takes a row lock (SELECT ... FOR NO KEY UPDATE) on the team until the transaction ends.
+#   It doesn't block inserts of rows that reference the team (progress, journal), so
+#   submissions that only add progress can skip it (stability_party_handler.save_progress_without_lock)
+# - save_team_data()/commit_team_changes() only flush inside the transaction; the outermost
+#   wrapper commits once at the end, so a nested call never releases the lock half-way
+# - run_after_commit() defers side effects (webhooks) until the commit succeeded
+# - EventTeams.version guards every write, so a write based on a stale read (e.g. from a
+#   path that didn't lock) raises StaleDataError, and the wrapper retries the whole function
+#   on that or on a deadlock/serialization failure
+
+def is_team_transaction_active() -> bool:
+    return db.session.info.get("team_transaction_depth", 0) > 0
+
+def is_retryable_conflict(e: Exception) -> bool:
+    """Whether an error means the team update lost a race and can simply be retried"""
+    if isinstance(e, StaleDataError):
+        return True
+    if isinstance(e, OperationalError):
+        # 40P01 deadlock_detected, 40001 serialization_failure
+        return getattr(e.orig, "pgcode", None) in ("40P01", "40001")
+    return False
+
+def lock_team(team_id, event_id=None, defer_data: bool = False) -> EventTeams:
+    """
+    Load a team and lock its row until the current transaction ends
+
+    With defer_data the data column isn't loaded (it loads on first access),
+    for callers that already hold the team's state for its current version.
+    """
+    locked = db.session.info.setdefault("locked_teams", set())
+    if str(team_id) in locked:
+        # Already locked in this transaction; reuse the loaded object so callers
+        # holding a SaveData built from it keep seeing the same state
+        team = db.session.get(EventTeams, team_id)
+        if team is not None and (event_id is None or str(team.event_id) == str(event_id)):
+            return team
+
+    query = EventTeams.query.filter_by(id=team_id)
+    if defer_data:
+        query = query.options(defer(EventTeams.data))
+    if event_id is not None:
+        query = query.filter_by(event_id=event_id)
+    team = query.with_for_update(key_share=True).populate_existing().first()
+    if team is not None:
+        locked.add(str(team_id))
+    return team
+
+def commit_team_changes() -> None:
+    """Commit, or just flush if an atomic team update will commit later"""
+    if is_team_transaction_active():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+def run_after_commit(func, *args, **kwargs) -> None:
+    """Run a side effect once the current team update has committed (or right away outside one)"""
+    if is_team_transaction_active():
+        db.session.info.setdefault("after_team_commit", []).append((func, args, kwargs))
+    else:
+        func(*args, **kwargs)
+
+def _forget_locked_teams(session, *args) -> None:
+    # Row locks only last until the transaction ends
+    session.info.pop("locked_teams", None)
+
+sa_event.listen(db.session, "after_commit", _forget_locked_teams)
+sa_event.listen(db.session, "after_soft_rollback", _forget_locked_teams)
+
+def _end_team_transaction(committed: bool) -> None:
+    db.session.info.pop("locked_teams", None)
+    db.session.info.pop("team_action", None)
+    callbacks = db.session.info.pop("after_team_commit", [])
+    if not committed:
+        return
+    for func, args, kwargs in callbacks:
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logging.error(f"Error running post-commit callback {getattr(func, '__name__', func)}: {e}", exc_info=True)
+
+def atomic_team_update(func):
+    """Run a function that reads and writes team state as one locked, retried transaction"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if is_team_transaction_active():
+            # Nested call: the outermost wrapper owns the transaction
+            return func(*args, **kwargs)
+
+        for attempt in range(1, TEAM_UPDATE_MAX_ATTEMPTS + 1):
+            db.session.info["team_transaction_depth"] = 1
+            db.session.info["team_action"] = func.__name__ # Labels the journal entries this update writes
+            committed = False
+            try:
+                result = func(*args, **kwargs)
+                db.session.commit()
+                committed = True
+                return result
+            except Exception as e:
+                db.session.rollback()
+                if not is_retryable_conflict(e) or attempt == TEAM_UPDATE_MAX_ATTEMPTS:
+                    raise
+                logging.warning(f"Team update conflict in {func.__name__} (attempt {attempt}), retrying: {e}")
+            finally:
+                db.session.info["team_transaction_depth"] = 0
+                _end_team_transaction(committed)
+            # Back off a little so the competing writers don't collide again
+            time.sleep(random.uniform(0, 0.05 * attempt))
+    return wrapper
+
+def _write_dirty_fields(team: EventTeams, dirty: dict) -> None:
+    """Merge only the changed top-level fields into event_teams.data (data = data || patch)"""
+    # Write out any other pending changes to the team first, so the version below is current
+    db.session.flush()
+    version = team.version
+    result = db.session.execute(
+        update(EventTeams)
+        .where(EventTeams.id == team.id, EventTeams.version == version)
+        .values(
+            data=EventTeams.data.op("||", return_type=JSONB)(bindparam("patch", dirty, type_=JSONB)),
+            version=version + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise StaleDataError(f"Team {team.id} was updated by someone else (expected version {version})")
+
+    # Keep the loaded object in step with the row without marking it dirty again
+    set_committed_value(team, "data", {**(team.data or {}), **dirty})
+    set_committed_value(team, "version", version + 1)
+
 # Ensure save_team_data is correctly flagging modifications and committing
-def save_team_data(team: EventTeams, save: SaveData):
-    team.data = save.to_dict()
-    logging.debug(f"Preparing to save team data for team {team.id}: {team.data}")
-    flag_modified(team, "data")
+def save_team_data(team: EventTeams, save: SaveData, action: str | None = None):
+    """
+    Persist a team's SaveData and append the change to the team journal
+
+    action labels the journal entry; it defaults to the enclosing
+    atomic_team_update function or the current endpoint.
+    """
     try:
+        if not isinstance(getattr(save, "tileProgress", None), ChallengeProgress):
+            # A plain dict was assigned; keep it without overwriting progress already stored
+            progress = ChallengeProgress()
+            progress.seed(getattr(save, "tileProgress", None))
+            save.tileProgress = progress
+        progress_changes = save.tileProgress.pending_changes()
+        dirty = save.dirty_fields()
+        if dirty is None or dirty or progress_changes:
+            snapshot_journal_id = begin_team_change(team)
+
+        # Progress is written as row-level increments/resets; it doesn't touch team.data
+        save_team_progress(team.id, save.tileProgress)
+
+        if dirty is None:
+            # Structure changed (or the save wasn't loaded from the team): rewrite the whole document
+            team.data = save.to_dict()
+            logging.debug(f"Preparing to save team data for team {team.id}: {team.data}")
+            flag_modified(team, "data")
+            save._loaded = copy.deepcopy(team.data)
+            db.session.flush()
+            record_team_change(team, team.data, True, progress_changes, snapshot_journal_id, action)
+        elif dirty or progress_changes:
+            if dirty:
+                logging.debug(f"Preparing to save team data fields {list(dirty)} for team {team.id}")
+                _write_dirty_fields(team, dirty)
+                if "islandId" in dirty:
+                    # The partial UPDATE bypasses the mapper events that keep occupancy current
+                    mark_region_occupancy_dirty(team.event_id)
+                if not STANDINGS_FIELDS.isdisjoint(dirty):
+                    mark_standings_dirty(team.event_id)
+                # Later saves of this SaveData only write what changes after this
+                save._loaded.update(copy.deepcopy(dirty))
+            record_team_change(team, dirty, False, progress_changes, snapshot_journal_id, action)
+
+        if is_team_transaction_active():
+            # The enclosing atomic_team_update commits (and rolls back on failure)
+            db.session.flush()
+            return
         db.session.commit()
         logging.debug(f"Team data saved successfully for team {team.id}")
     except Exception as e:
+        if is_team_transaction_active():
+            raise
         db.session.rollback()
         logging.error(f"Error saving team data for team {team.id}: {e}", exc_info=True)
         raise
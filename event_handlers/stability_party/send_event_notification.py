@@ -2,8 +2,13 @@ import uuid
 import logging
 import requests
 from models.models import Events, EventTeams
+from event_handlers.stability_party.save_data import run_after_commit
 
 def send_event_notification(event_id: uuid, team_id: uuid, title: str, message: str) -> None:
+    # Inside a team update, wait until the state it describes has actually been committed
+    run_after_commit(_send_event_notification, event_id, team_id, title, message)
+
+def _send_event_notification(event_id: uuid, team_id: uuid, title: str, message: str) -> None:
     event = Events.query.filter_by(id=event_id).first()
     team = EventTeams.query.filter_by(id=team_id).first()
     webhook = event.data.get("webhook")
@@ -25,7 +30,7 @@ def send_event_notification(event_id: uuid, team_id: uuid, title: str, message:
             ]
         }
 
-        requests.post(webhook, json=data)
+        requests.post(webhook, json=data, timeout=10)
     else:
         logging.warning(f"No webhook URL found for event {event.id}. Cannot send notification.")
         return
\ No newline at end of file
@@ -0,0 +1,553 @@
+"""
+Monte Carlo simulator for balancing Stability Party boards
+
+Plays thousands of games on a board document (see board_io) to show how
+stars, coins and laps are distributed for a given layout. Games run the real
+rules: every roll goes through the same stability_party_handler functions the
+/roll endpoint uses, and items through the real item handlers, against
+in-memory SaveData instead of team rows.
+
+Games are spread over a process pool. Each worker compiles the board once,
+pins it into the board graph/trigger index caches under a simulation-only
+event ID, and swaps the handler's side effects (database writes, webhooks,
+star placement, item grants and `random`) for in-memory versions. Nothing is
+ever written to the database, and the web process is never patched.
+
+Dice are drawn in NumPy batches when NumPy is installed (it is optional; the
+standard library is used otherwise). Each game is seeded from the base seed
+and its number, so a run is reproducible regardless of how games are split
+over workers.
+
+Simplifications:
+- A team always completes the tile it landed on before its next roll, earning
+  the region reward with probability region_rate and the tile reward otherwise
+- Items that need a selection (Jewelry Box, Genie Lamp, ...) are bought but
+  never used
+"""
+
+import os
+import sys
+import uuid
+import random
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STAR_PRICE = 100 # Matches _handle_star_action
+MAX_ACTIONS_PER_TURN = 200
+DICE_BATCH_SIZE = 4096
+
+_KEY_NAMESPACE = uuid.UUID("5b0f8d0e-5d2a-4d5e-9d56-0b8f6f3c2a11")
+
+class BatchedDice(random.Random):
+    """
+    Seeded random source whose die rolls (randint(1, sides)) come from
+    pre-generated NumPy batches, one per die size
+    """
+
+    def __init__(self, seed: int, batch_size: int = DICE_BATCH_SIZE) -> None:
+        super().__init__(seed)
+        self.batch_size = batch_size
+        self._generator = np.random.default_rng(seed) if np is not None else None
+        # {sides: [rolls, position]}
+        self._batches: Dict[int, list] = {}
+
+    def randint(self, a: int, b: int) -> int:
+        if self._generator is None or a != 1 or b < 1:
+            return super().randint(a, b)
+        batch = self._batches.get(b)
+        if batch is None or batch[1] >= len(batch[0]):
+            batch = [self._generator.integers(1, b + 1, size=self.batch_size).tolist(), 0]
+            self._batches[b] = batch
+        roll = batch[0][batch[1]]
+        batch[1] += 1
+        return roll
+
+# ----------------------------------------------------------
+# Board
+# ----------------------------------------------------------
+
+def _key_id(kind: str, key) -> uuid.UUID:
+    """Exported documents use real IDs as keys; anything else gets a stable UUID"""
+    try:
+        return uuid.UUID(str(key))
+    except ValueError:
+        return uuid.uuid5(_KEY_NAMESPACE, f"{kind}:{key}")
+
+def _key_ids(kind: str, keys) -> List[str]:
+    return [str(_key_id(kind, key)) for key in keys or []]
+
+def compile_board_document(document: Dict[str, Any], event_id: uuid.UUID):
+    """Compile a board document straight into a (BoardGraph, TriggerIndex) pair for event_id"""
+    from event_handlers.stability_party.board_graph import compile_board_graph
+    from event_handlers.stability_party.trigger_index import compile_trigger_index
+
+    regions = []
+    for row in document.get("regions", []):
+        data = dict(row.get("data") or {})
+        if "charter" in data:
+            data["charter"] = {str(_key_id("region", key)): cost for key, cost in (data["charter"] or {}).items()}
+        regions.append(SimpleNamespace(
+            id=_key_id("region", row["key"]),
+            name=row["name"],
+            description=row.get("description"),
+            challenges=_key_ids("challenge", row.get("challenges")),
+            data=data
+        ))
+
+    tiles = []
+    mappings = []
+    for row in document.get("tiles", []):
+        tile_id = _key_id("tile", row["key"])
+        data = dict(row.get("data") or {})
+        data["nextTiles"] = _key_ids("tile", data.get("nextTiles"))
+        tiles.append(SimpleNamespace(
+            id=tile_id,
+            event_id=event_id,
+            region_id=_key_id("region", row["region"]) if row.get("region") is not None else None,
+            name=row["name"],
+            description=row.get("description"),
+            data=data
+        ))
+        for mapping in row.get("challenges", []):
+            mappings.append(SimpleNamespace(
+                tile_id=tile_id,
+                challenge_id=_key_id("challenge", mapping["challenge"]),
+                type=mapping.get("type", "TILE"),
+                data=mapping.get("data")
+            ))
+
+    challenges = [
+        SimpleNamespace(id=_key_id("challenge", row["key"]), type=row.get("type", "OR"), value=row.get("value", 1), tasks=_key_ids("task", row.get("tasks")))
+        for row in document.get("challenges", [])
+    ]
+    tasks = [
+        SimpleNamespace(id=_key_id("task", row["key"]), quantity=row.get("quantity", 1), value=row.get("value", 1), triggers=_key_ids("trigger", row.get("triggers")))
+        for row in document.get("tasks", [])
+    ]
+    triggers = [
+        SimpleNamespace(id=_key_id("trigger", row["key"]), trigger=row["trigger"], source=row.get("source"), type=row.get("type", "DROP"))
+        for row in document.get("triggers", [])
+    ]
+
+    graph = compile_board_graph(event_id, tiles, regions, _key_ids("tile", document.get("star_tiles")))
+    index = compile_trigger_index(event_id, regions, mappings, challenges, tasks, triggers)
+    return graph, index
+
+# ----------------------------------------------------------
+# Strategies
+# ----------------------------------------------------------
+
+class Strategy:
+    """How a simulated team makes its choices; the base class picks uniformly at random"""
+
+    name = "random"
+
+    def choose_island(self, game: "_SimGame", team: "_SimTeam", islands: List[dict]) -> Optional[str]:
+        return game.rng.choice(islands)["id"] if islands else None
+
+    def choose_direction(self, game: "_SimGame", team: "_SimTeam", options: List[dict]) -> Optional[str]:
+        return game.rng.choice(options)["id"] if options else None
+
+    def choose_shop_item(self, game: "_SimGame", team: "_SimTeam", items: List[dict]) -> Optional[dict]:
+        affordable = [item for item in _buyable(team, items) if item["price"] <= team.save.coins]
+        if affordable and game.rng.random() < 0.5:
+            return game.rng.choice(affordable)
+        return None
+
+    def buy_star(self, game: "_SimGame", team: "_SimTeam") -> bool:
+        return team.save.coins >= STAR_PRICE and game.rng.random() < 0.5
+
+    def choose_charter(self, game: "_SimGame", team: "_SimTeam", destinations: List[dict]) -> Optional[dict]:
+        affordable = [destination for destination in destinations if destination["cost"] <= team.save.coins]
+        if affordable and game.rng.random() < 0.5:
+            return game.rng.choice(affordable)
+        return None
+
+    def item_to_use(self, game: "_SimGame", team: "_SimTeam") -> Optional[int]:
+        usable = [i for i, entry in enumerate(team.save.itemList) if _is_usable(entry)]
+        if usable and game.rng.random() < 0.5:
+            return game.rng.choice(usable)
+        return None
+
+class GreedyStrategy(Strategy):
+    """Heads for the nearest star and spends coins on stars first"""
+
+    name = "greedy"
+    # Leaves out the Shrink-Me Potion and Turael Skip, which never help when every tile gets completed
+    ITEM_PRIORITY = ("coin_pouch", "mystery_box", "npc_contact", "double_dice", "weighted_die", "boots_of_lightness", "sailing_ticket")
+
+    def choose_island(self, game, team, islands):
+        with_star = [island for island in islands if game.graph.region_has_star(island["id"])]
+        return super().choose_island(game, team, with_star or islands)
+
+    def choose_direction(self, game, team, options):
+        stars = game.graph.star_tiles
+        best, best_distance = None, None
+        for option in options:
+            _, distance = game.distances.nearest(option["id"], stars)
+            if distance is not None and (best_distance is None or distance < best_distance):
+                best, best_distance = option["id"], distance
+        return best or super().choose_direction(game, team, options)
+
+    def choose_shop_item(self, game, team, items):
+        # Only spend what isn't needed for the next star
+        affordable = [item for item in _buyable(team, items) if team.save.coins - item["price"] >= STAR_PRICE]
+        return max(affordable, key=lambda item: item["price"]) if affordable else None
+
+    def buy_star(self, game, team):
+        return team.save.coins >= STAR_PRICE
+
+    def choose_charter(self, game, team, destinations):
+        if game.graph.region_has_star(team.save.islandId):
+            return None
+        candidates = [
+            destination for destination in destinations
+            if destination["cost"] <= team.save.coins and game.graph.region_has_star(destination["id"])
+        ]
+        return min(candidates, key=lambda destination: destination["cost"]) if candidates else None
+
+    def item_to_use(self, game, team):
+        held = {entry.get("id"): i for i, entry in enumerate(team.save.itemList) if _is_usable(entry)}
+        for item_id in self.ITEM_PRIORITY:
+            if item_id in held:
+                return held[item_id]
+        return None
+
+STRATEGIES: Dict[str, Strategy] = {strategy.name: strategy for strategy in (Strategy(), GreedyStrategy())}
+
+def _buyable(team: "_SimTeam", items: List[dict]) -> List[dict]:
+    from event_handlers.stability_party.item_system import get_item_by_id
+
+    if len(team.save.itemList) >= 3:
+        return []
+    return [item for item in items if not (get_item_by_id(item["id"]) or {}).get("requires_selection", False)]
+
+def _is_usable(entry: dict) -> bool:
+    from event_handlers.stability_party.item_system import get_item_by_id
+
+    item = get_item_by_id(entry.get("id"))
+    return bool(item and item["activation_handler"] and not item["requires_selection"] and entry.get("uses_remaining", item["uses"]) > 0)
+
+# ----------------------------------------------------------
+# Games (worker processes only)
+# ----------------------------------------------------------
+
+class _SimTeam:
+    def __init__(self, strategy: Strategy) -> None:
+        from event_handlers.stability_party.save_data import SaveData
+
+        self.id = uuid.uuid4()
+        self.strategy = strategy
+        self.save = SaveData.from_dict({})
+        self.laps = 0
+        self.items_bought = 0
+        self.items_used = 0
+        self.errors = 0
+        self.first_star_turn: Optional[int] = None
+
+    def result(self) -> dict:
+        return {
+            "strategy": self.strategy.name,
+            "stars": self.save.stars,
+            "coins": self.save.coins,
+            "laps": self.laps,
+            "items_bought": self.items_bought,
+            "items_used": self.items_used,
+            "first_star_turn": self.first_star_turn,
+            "errors": self.errors
+        }
+
+class _SimGame:
+    def __init__(self, board: "_SimBoard", rng: BatchedDice, strategies: Sequence[Strategy], team_count: int, region_rate: float) -> None:
+        from event_handlers.stability_party.board_distances import get_board_distances
+
+        self.event_id = board.event_id
+        self.rng = rng
+        self.region_rate = region_rate
+        self.teams = [_SimTeam(strategies[i % len(strategies)]) for i in range(team_count)]
+        self.active: Optional[_SimTeam] = None
+        self.graph = board.graph
+        self.distances = get_board_distances(self.event_id, self.graph)
+
+class _SimBoard:
+    def __init__(self, document: Dict[str, Any]) -> None:
+        self.event_id = uuid.uuid4()
+        self.graph, self.index = compile_board_document(document, self.event_id)
+
+_board: Optional[_SimBoard] = None
+_game: Optional[_SimGame] = None
+
+def _sim_move_star(event_id, old_star_tile_id):
+    """move_star against the simulated star set and team positions"""
+    from event_handlers.stability_party.board_graph import pin_board_graph
+
+    graph = _game.graph
+    occupied = {str(team.save.islandId) for team in _game.teams if team.save.islandId}
+    new_star_tile = graph.random_star_candidate(blocked_regions=occupied, blocked_tiles=graph.star_tiles, rng=_game.rng)
+    if new_star_tile is None:
+        return None
+    _game.graph = graph.with_star_tiles((graph.star_tiles - {str(old_star_tile_id)}) | {str(new_star_tile.id)})
+    pin_board_graph(_game.graph)
+    return graph.tile(old_star_tile_id), new_star_tile
+
+def _sim_add_item(event_id, team_id, item_id) -> bool:
+    from event_handlers.stability_party.item_system import new_inventory_entry
+
+    entry = new_inventory_entry(item_id)
+    if not entry:
+        return False
+    _game.active.save.itemList.append(entry)
+    return True
+
+def _sim_team_name(team_id) -> str:
+    return str(team_id)
+
+def _ignore(*args, **kwargs) -> None:
+    return None
+
+def _init_worker(document: Dict[str, Any]) -> None:
+    """Compile the board and swap the rules' side effects for in-memory versions"""
+    global _board
+    # Spawned workers start empty: load the app first, as the server does, because the
+    # handler modules import it and it imports endpoints that import them back
+    import app
+    from event_handlers.stability_party import stability_party_handler as handler, item_system
+    from event_handlers.stability_party.board_graph import pin_board_graph
+    from event_handlers.stability_party.trigger_index import pin_trigger_index
+
+    # The rules log every step and print a few debug lines; keep workers quiet
+    logging.disable(logging.INFO)
+    sys.stdout = open(os.devnull, "w")
+
+    _board = _SimBoard(document)
+    pin_board_graph(_board.graph)
+    pin_trigger_index(_board.index)
+
+    handler.send_event_notification = _ignore
+    handler.commit_team_changes = _ignore
+    handler.move_star = _sim_move_star
+    handler.get_team_name = _sim_team_name
+    handler.add_item_to_inventory = _sim_add_item
+    item_system.add_item_to_inventory = _sim_add_item
+
+def _set_random(rng: random.Random) -> None:
+    from event_handlers.stability_party import stability_party_handler as handler, item_system, item_definitions
+
+    handler.random = rng
+    item_system.random = rng
+    item_definitions.random = rng
+
+def _use_item(game: _SimGame, team: _SimTeam, item_index: int) -> None:
+    """use_item without the team row: run the item's handler on the in-memory save"""
+    from event_handlers.stability_party.item_definitions import ITEM_HANDLERS
+    from event_handlers.stability_party.item_system import get_item_by_id
+
+    entry = team.save.itemList[item_index]
+    item = get_item_by_id(entry.get("id"))
+    result = ITEM_HANDLERS[item["activation_handler"]](game.event_id, str(team.id), team.save, entry)
+    if "error" in result:
+        return
+    team.items_used += 1
+
+    entry["uses_remaining"] = entry.get("uses_remaining", item["uses"]) - 1
+    if entry["uses_remaining"] <= 0 and item["uses"] > 0 and result.get("remove_on_use", True):
+        # The handler may have added items; remove this entry, not whatever is at item_index now
+        team.save.itemList[:] = [other for other in team.save.itemList if other is not entry]
+
+def _complete_tile(game: _SimGame, team: _SimTeam) -> None:
+    from event_handlers.stability_party.stability_party_handler import apply_region_reward, apply_tile_reward
+
+    save = team.save
+    tile = game.graph.tile(save.currentTile)
+    region = game.graph.region(tile.region_id) if tile else None
+    if region is None or game.rng.random() < game.region_rate:
+        apply_region_reward(save)
+    else:
+        apply_tile_reward(save, region)
+
+def _continue(event_id, team: _SimTeam) -> dict:
+    from event_handlers.stability_party.stability_party_handler import _complete_roll, _process_next_move
+
+    if team.save.roll_state.roll_remaining <= 0:
+        team.save.roll_state.roll_remaining = 0
+        return _complete_roll(event_id, team.id, team.save)
+    return _process_next_move(event_id, team.id, team.save)
+
+def _resolve_action(game: _SimGame, team: _SimTeam, action: str, action_data: dict) -> dict:
+    """Answer the action a roll stopped at, the way the client would through /roll"""
+    from event_handlers.stability_party import stability_party_handler as handler
+    from event_handlers.stability_party.save_data import RollState
+
+    event_id, save, strategy = game.event_id, team.save, team.strategy
+    actions = RollState.ACTION_TYPES
+
+    if action == actions["FIRST_ROLL"]:
+        island_id = strategy.choose_island(game, team, action_data.get("available_islands", []))
+        return handler._handle_island_selection(event_id, team.id, save, {"chosen_island_id": island_id})
+    if action == actions["CROSSROAD"]:
+        direction_id = strategy.choose_direction(game, team, action_data.get("options", []))
+        return handler._handle_crossroad_action(event_id, team.id, save, {"directionId": direction_id})
+    if action == actions["SHOP"]:
+        item = strategy.choose_shop_item(game, team, action_data.get("items", []))
+        if item is None:
+            return _continue(event_id, team)
+        team.items_bought += 1
+        return handler._handle_shop_action(event_id, team.id, save, {"action": "buy", "itemId": item["id"], "price": item["price"]})
+    if action == actions["STAR"]:
+        choice = "buy" if strategy.buy_star(game, team) else "skip"
+        return handler._handle_star_action(event_id, team.id, save, {"action": choice})
+    if action == actions["DOCK"]:
+        team.laps += 1
+        destination = strategy.choose_charter(game, team, action_data.get("destinations", []))
+        if destination is None:
+            return handler._handle_dock_action(event_id, team.id, save, {"action": "continue", "roll_remaining": save.roll_state.roll_remaining})
+        return handler._handle_dock_action(event_id, team.id, save, {"action": "charter", "destinationId": destination["id"], "cost": destination["cost"]})
+    return _continue(event_id, team)
+
+def _play_turn(game: _SimGame, team: _SimTeam) -> None:
+    from event_handlers.stability_party import stability_party_handler as handler
+    from event_handlers.stability_party.save_data import RollState
+
+    event_id, save = game.event_id, team.save
+    game.active = team
+
+    if save.currentTile is None:
+        response = handler._handle_first_roll_initiation(event_id, team.id, save, {}).to_dict()
+    else:
+        if not save.isTileCompleted:
+            _complete_tile(game, team)
+        item_index = team.strategy.item_to_use(game, team)
+        if item_index is not None:
+            _use_item(game, team, item_index)
+        handler._initiate_new_roll(event_id, team.id, save, {})
+        response = handler._process_next_move(event_id, team.id, save)
+
+    for _ in range(MAX_ACTIONS_PER_TURN):
+        if isinstance(response, tuple) or "error" in response or not save.isRolling:
+            break
+        if response.get("action_required") == RollState.ACTION_TYPES["COMPLETE"]:
+            break
+        response = _resolve_action(game, team, response.get("action_required"), response.get("action_data") or {})
+
+    if isinstance(response, tuple) or "error" in response or save.isRolling:
+        # A real team would be stuck here; count it and let them roll again
+        team.errors += 1
+        save.isRolling = False
+        save.isTileCompleted = True
+
+def _play_game(strategies: Sequence[Strategy], seed: int, team_count: int, turns: int, region_rate: float) -> List[dict]:
+    global _game
+    from event_handlers.stability_party.board_graph import pin_board_graph
+
+    rng = BatchedDice(seed)
+    _set_random(rng)
+    # Every game starts with the document's stars
+    pin_board_graph(_board.graph)
+    _game = _SimGame(_board, rng, strategies, team_count, region_rate)
+
+    for turn in range(1, turns + 1):
+        for team in _game.teams:
+            _play_turn(_game, team)
+            if team.first_star_turn is None and team.save.stars > 0:
+                team.first_star_turn = turn
+
+    return [team.result() for team in _game.teams]
+
+def _run_games(strategy_names: Sequence[str], seeds: Sequence[int], team_count: int, turns: int, region_rate: float) -> List[List[dict]]:
+    strategies = [STRATEGIES[name] for name in strategy_names]
+    return [_play_game(strategies, seed, team_count, turns, region_rate) for seed in seeds]
+
+# ----------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------
+
+def _distribution(values: List[float]) -> Dict[str, float] | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "min": ordered[0],
+        "p10": percentile(0.1),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "max": ordered[-1]
+    }
+
+def summarize_results(games: List[List[dict]]) -> Dict[str, dict]:
+    """Per strategy distributions of a simulation's team results"""
+    by_strategy: Dict[str, List[dict]] = {}
+    for teams in games:
+        for team in teams:
+            by_strategy.setdefault(team["strategy"], []).append(team)
+
+    summary = {}
+    for name, teams in by_strategy.items():
+        first_stars = [team["first_star_turn"] for team in teams if team["first_star_turn"] is not None]
+        summary[name] = {
+            "teams": len(teams),
+            "stars": _distribution([team["stars"] for team in teams]),
+            "coins": _distribution([team["coins"] for team in teams]),
+            "laps": _distribution([team["laps"] for team in teams]),
+            "items_bought": _distribution([team["items_bought"] for team in teams]),
+            "items_used": _distribution([team["items_used"] for team in teams]),
+            "share_with_star": round(len(first_stars) / len(teams), 3),
+            "turns_to_first_star": _distribution(first_stars),
+            "errors": sum(team["errors"] for team in teams)
+        }
+    return summary
+
+def simulate_board(
+    document: Dict[str, Any],
+    games: int = 1000,
+    teams: int = 4,
+    turns: int = 30,
+    strategies: Sequence[str] = ("greedy",),
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    region_rate: float = 0.1
+) -> Dict[str, Any]:
+    """
+    Play `games` games of `turns` rounds on a board document
+
+    Teams are assigned strategies round-robin, so strategies can be compared on
+    the same boards. Raises ValueError for an unknown strategy.
+    """
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown or not strategies:
+        raise ValueError(f"Unknown strategies {unknown}; choose from {sorted(STRATEGIES)}")
+    seed = seed if seed is not None else random.randrange(2**32)
+    workers = max(1, workers or os.cpu_count() or 1)
+
+    # A few chunks per worker keeps them busy without paying per-game IPC
+    seeds = [seed + game for game in range(games)]
+    chunk_size = max(1, games // (workers * 4))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, games, chunk_size)]
+
+    # Workers import the app fresh rather than forking a process with open connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(document,)) as pool:
+        futures = [pool.submit(_run_games, list(strategies), chunk, teams, turns, region_rate) for chunk in chunks]
+        results = [game for future in futures for game in future.result()]
+
+    logging.info(f"Simulated {len(results)} games of {turns} turns with {teams} teams on {workers} workers (seed {seed})")
+    return {
+        "games": len(results),
+        "teams": teams,
+        "turns": turns,
+        "seed": seed,
+        "numpy": np is not None,
+        "strategies": summarize_results(results)
+    }
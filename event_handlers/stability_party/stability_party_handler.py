@@ -1,11 +1,20 @@
 from app import db
 from event_handlers.event_handler import EventSubmission, NotificationResponse, NotificationAuthor, NotificationField
+from event_handlers.active_event_registry import active_events
+from event_handlers.team_member_index import get_team_member_index
 from models.models import Events, EventTeams, EventTeamMemberMappings, EventChallenges, EventTasks, EventTriggers
 from models.stability_party_3 import SP3Regions, SP3EventTiles, SP3EventTileChallengeMapping
 from event_handlers.stability_party.item_system import generate_shop_inventory, get_item_by_id, add_item_to_inventory
 from event_handlers.stability_party.item_definitions import get_items_by_rarity
-from event_handlers.stability_party.save_data import RollState, SaveData, save_team_data
+from event_handlers.stability_party.save_data import RollState, SaveData, save_team_data, atomic_team_update, lock_team, commit_team_changes, is_retryable_conflict
 from event_handlers.stability_party.send_event_notification import send_event_notification
+from event_handlers.stability_party.team_journal import take_team_snapshot
+from event_handlers.stability_party.challenge_progress import ChallengeProgress
+from event_handlers.stability_party.board_graph import BoardGraph, RegionNode, TileNode, get_board_graph, get_board_graph_for_tile
+from event_handlers.stability_party.trigger_index import TriggerIndex, TileChallenge, ChallengeDefinition, TaskDefinition, get_trigger_index
+from event_handlers.stability_party.occupancy_index import get_region_occupancy
+from event_handlers.stability_party.star_placement import move_star
+from event_handlers.stability_party.turn_session import resume_turn_session, store_turn_session
 import uuid
 import logging
 import random
@@ -13,21 +22,19 @@ import requests
 from datetime import datetime, timezone
 from sqlalchemy.orm.attributes import flag_modified  # Add this import
 
-def get_team_challenges(save: SaveData) -> list[SP3EventTileChallengeMapping]:
-    challenges: list[SP3EventTileChallengeMapping] = []
-    # Ensure save.currentTile is not None before querying
+def get_team_challenges(save: SaveData, index: TriggerIndex) -> list[TileChallenge]:
+    challenges: list[TileChallenge] = []
+    # Ensure save.currentTile is not None before looking up
     if save.currentChallenges:
         for challenge_id in save.currentChallenges:
-            challenge = SP3EventTileChallengeMapping.query.filter(SP3EventTileChallengeMapping.challenge_id == challenge_id).first()
+            challenge = index.challenge_mappings.get(str(challenge_id))
             if challenge:
                 challenges.append(challenge)
     elif save.currentTile:
-        teamChallenges = SP3EventTileChallengeMapping.query.filter(SP3EventTileChallengeMapping.tile_id == save.currentTile).all()
-        for challenge in teamChallenges:
-            challenges.append(challenge)
+        challenges.extend(index.get_tile_challenges(save.currentTile))
     return challenges
 
-def is_challenge_completed(challenge: EventChallenges, task: EventTasks, save: SaveData) -> bool:
+def is_challenge_completed(challenge: ChallengeDefinition, task: TaskDefinition, save: SaveData, tasks: dict[str, TaskDefinition] | None = None) -> bool:
     challengeId = str(challenge.id)
     taskId = str(task.id)
     
@@ -49,7 +56,10 @@ def is_challenge_completed(challenge: EventChallenges, task: EventTasks, save: S
             # Check all tasks for an AND challenge
             all_tasks_completed = True
             for t_id_str in challenge.tasks:
-                current_task_obj = EventTasks.query.filter_by(id=t_id_str).first()
+                if tasks is not None:
+                    current_task_obj = tasks.get(str(t_id_str))
+                else:
+                    current_task_obj = EventTasks.query.filter_by(id=t_id_str).first()
                 if not current_task_obj:
                     logging.warning(f"Task {t_id_str} not found for AND challenge {challengeId}")
                     return False # Cannot complete if a task definition is missing
@@ -77,23 +87,13 @@ def is_challenge_completed(challenge: EventChallenges, task: EventTasks, save: S
             return False 
     return False
 
-def create_region_challenge_notification(challenge: EventChallenges, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
+def create_region_challenge_notification(challenge: ChallengeDefinition, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
     region = SP3Regions.query.filter(SP3Regions.id == save.islandId).first()
     if not region:
         logging.error(f"Region not found for region ID {save.islandId} during notification creation.")
         return None
 
-    # Example rewards - customize as needed
-    coins_earned = 50
-    # Base dice - a D6 if no dice, otherwise use existing dice
-    dice_earned = [6] if not save.dice else save.dice
-
-    save.coins += coins_earned
-    # Logic for adding dice: append, replace, or based on rules
-    # For now, let's assume it replaces or is the only dice they get from this
-    save.dice = dice_earned
-    save.isTileCompleted = True
-    save.currentChallenges = []
+    coins_earned, dice_earned = apply_region_reward(save)
 
     fields = [
         NotificationField(name="Stars", value=save.stars, inline=True),
@@ -118,18 +118,25 @@ def create_region_challenge_notification(challenge: EventChallenges, event: Even
         fields=fields,
     )
 
-def create_tile_challenge_notification(challenge_mapping: SP3EventTileChallengeMapping, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
-    tile = SP3EventTiles.query.filter(SP3EventTiles.id == save.currentTile).first()
-    if not tile:
-        logging.error(f"Tile not found for currentTile ID {save.currentTile} during notification creation.")
-        return None
-    region = SP3Regions.query.filter(SP3Regions.id == tile.region_id).first()
-    if not region:
-        logging.error(f"Region not found for region_id {tile.region_id} during notification creation.")
-        return None
+def apply_region_reward(save: SaveData) -> tuple[int, list]:
+    """Reward a team for completing its region challenge; returns (coins earned, dice earned)"""
+    # Example rewards - customize as needed
+    coins_earned = 50
+    # Base dice - a D6 if no dice, otherwise use existing dice
+    dice_earned = [6] if not save.dice else save.dice
 
+    save.coins += coins_earned
+    # Logic for adding dice: append, replace, or based on rules
+    # For now, let's assume it replaces or is the only dice they get from this
+    save.dice = dice_earned
+    save.isTileCompleted = True
+    save.currentChallenges = []
+    return coins_earned, dice_earned
+
+def apply_tile_reward(save: SaveData, region: RegionNode) -> tuple[int, list]:
+    """Reward a team for completing its tile challenge; returns (coins earned, dice earned)"""
     # Example rewards - customize as needed
-    if region.data.get("isHotspot", False):
+    if region.is_hotspot:
         coins_earned = 10
     else:
         coins_earned = max(10 - save.islandLaps * 2, 0)
@@ -142,6 +149,20 @@ def create_tile_challenge_notification(challenge_mapping: SP3EventTileChallengeM
     save.dice = dice_earned 
     save.isTileCompleted = True # This specific TILE challenge type completes the tile
     save.currentChallenges = []
+    return coins_earned, dice_earned
+
+def create_tile_challenge_notification(challenge_mapping: TileChallenge, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
+    graph = get_board_graph(event.id)
+    tile = graph.tile(save.currentTile)
+    if not tile:
+        logging.error(f"Tile not found for currentTile ID {save.currentTile} during notification creation.")
+        return None
+    region = graph.region(tile.region_id)
+    if not region:
+        logging.error(f"Region not found for region_id {tile.region_id} during notification creation.")
+        return None
+
+    coins_earned, dice_earned = apply_tile_reward(save, region)
 
     fields = [
         NotificationField(name="Stars", value=save.stars, inline=True),
@@ -166,7 +187,7 @@ def create_tile_challenge_notification(challenge_mapping: SP3EventTileChallengeM
         fields=fields,
     )
 
-def create_coin_challenge_notification(challenge_mapping: SP3EventTileChallengeMapping, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
+def create_coin_challenge_notification(challenge_mapping: TileChallenge, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
     # Placeholder - similar to tile challenge but might have different rewards or logic
     tile = SP3EventTiles.query.filter(SP3EventTiles.id == save.currentTile).first()
     if not tile: return None
@@ -191,10 +212,11 @@ def create_coin_challenge_notification(challenge_mapping: SP3EventTileChallengeM
         fields=fields,
     )
 
-def progress_region_challenge(challenge: uuid.UUID, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
-    challenge = EventChallenges.query.filter(EventChallenges.id == challenge).first()
+def progress_region_challenge(challenge: uuid.UUID, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission, index: TriggerIndex, matches: dict[str, frozenset]) -> NotificationResponse:
+    challenge_id = challenge
+    challenge = index.challenges.get(str(challenge_id))
     if challenge is None:
-        logging.warning(f"Challenge definition not found for ID {challenge}")
+        logging.warning(f"Challenge definition not found for ID {challenge_id}")
         return None
     
     # Ensure tileProgress structure exists for the current challenge
@@ -202,9 +224,9 @@ def progress_region_challenge(challenge: uuid.UUID, event: Events, team: EventTe
     if challenge_id_str not in save.tileProgress:
         save.tileProgress[challenge_id_str] = {}
 
-    made_progress_on_a_task = False
+    matched_task_ids = matches.get(challenge_id_str, frozenset())
     for task_id_str in challenge.tasks:
-        task = EventTasks.query.filter(EventTasks.id == task_id_str).first()
+        task = index.tasks.get(task_id_str)
         if not task:
             logging.warning(f"Task definition {task_id_str} not found for challenge {challenge_id_str}")
             continue
@@ -213,52 +235,28 @@ def progress_region_challenge(challenge: uuid.UUID, event: Events, team: EventTe
         if str(task.id) not in save.tileProgress[challenge_id_str]:
             save.tileProgress[challenge_id_str][str(task.id)] = 0
         
-        task_matched_submission = False
-        for trigger_id_str in task.triggers:
-            trigger = EventTriggers.query.filter(EventTriggers.id == trigger_id_str).first()
-            if not trigger:
-                logging.warning(f"Trigger definition {trigger_id_str} not found for task {task_id_str}")
-                continue
-
-            # Normalize source for comparison
-            trigger_source_norm = trigger.source.lower() if trigger.source else ""
-            submission_source_norm = submission.source.lower() if submission.source else ""
-            
-            # If trigger source is empty, it can match any submission source (wildcard)
-            # OR if trigger source is specified, it must match submission source
-            source_matches = (not trigger_source_norm) or (trigger_source_norm == submission_source_norm)
-
-            if trigger.trigger.lower() == submission.trigger.lower() and source_matches:
-                task_matched_submission = True
-                break
-
-        if task_matched_submission:
-            made_progress_on_a_task = True
-            current_progress = save.tileProgress[challenge_id_str].get(str(task.id), 0)
-            new_progress = current_progress + submission.quantity
-            save.tileProgress[challenge_id_str][str(task.id)] = new_progress
+        # The index already resolved which tasks this submission's (trigger, source) feeds
+        if task_id_str in matched_task_ids:
+            new_progress = save.tileProgress.increment(challenge_id_str, task.id, submission.quantity)
             logging.info(f"Team {team.id} progressed task {task.id} for challenge {challenge.id} to {new_progress}/{task.quantity}")
 
             # Check if this specific task completion completes the challenge (for OR type)
             # For AND type, is_challenge_completed will check all tasks.
-            if is_challenge_completed(challenge, task, save):
+            if is_challenge_completed(challenge, task, save, index.tasks):
                 logging.info(f"Challenge {challenge.id} (type: {challenge.type}) completed by team {team.id} due to task {task.id} progress.")
 
-                challenges = get_region_challenges(save)
+                challenges = get_region_challenges(save, index)
                 for challenge_id in challenges:
-                    tasks = EventChallenges.query.filter_by(id=challenge_id).first().tasks
-                    if challenge_id not in save.tileProgress:
-                        save.tileProgress[str(challenge_id)] = {}
-
-                    for task_id in tasks:
-                        save.tileProgress[str(challenge_id)][str(task_id)] = 0 # Reset task progress for the challenge
+                    region_challenge = index.challenges.get(str(challenge_id))
+                    tasks = region_challenge.tasks if region_challenge else []
+                    save.tileProgress.reset(challenge_id, tasks) # Reset task progress for the challenge
 
                 return create_region_challenge_notification(challenge, event, team, save, submission)
             
     return None
 
-def progress_tile_challenge(challengeMapping: SP3EventTileChallengeMapping, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> NotificationResponse:
-    challenge = EventChallenges.query.filter(EventChallenges.id == challengeMapping.challenge_id).first()
+def progress_tile_challenge(challengeMapping: TileChallenge, event: Events, team: EventTeams, save: SaveData, submission: EventSubmission, index: TriggerIndex, matches: dict[str, frozenset]) -> NotificationResponse:
+    challenge = index.challenges.get(str(challengeMapping.challenge_id))
     if challenge is None:
         logging.warning(f"Challenge definition not found for ID {challengeMapping.challenge_id}")
         return None
@@ -268,9 +266,9 @@ def progress_tile_challenge(challengeMapping: SP3EventTileChallengeMapping, even
     if challenge_id_str not in save.tileProgress:
         save.tileProgress[challenge_id_str] = {}
 
-    made_progress_on_a_task = False
+    matched_task_ids = matches.get(challenge_id_str, frozenset())
     for task_id_str in challenge.tasks:
-        task = EventTasks.query.filter(EventTasks.id == task_id_str).first()
+        task = index.tasks.get(task_id_str)
         if not task:
             logging.warning(f"Task definition {task_id_str} not found for challenge {challenge_id_str}")
             continue
@@ -279,35 +277,14 @@ def progress_tile_challenge(challengeMapping: SP3EventTileChallengeMapping, even
         if str(task.id) not in save.tileProgress[challenge_id_str]:
             save.tileProgress[challenge_id_str][str(task.id)] = 0
         
-        task_matched_submission = False
-        for trigger_id_str in task.triggers:
-            trigger = EventTriggers.query.filter(EventTriggers.id == trigger_id_str).first()
-            if not trigger:
-                logging.warning(f"Trigger definition {trigger_id_str} not found for task {task_id_str}")
-                continue
-
-            # Normalize source for comparison
-            trigger_source_norm = trigger.source.lower() if trigger.source else ""
-            submission_source_norm = submission.source.lower() if submission.source else ""
-            
-            # If trigger source is empty, it can match any submission source (wildcard)
-            # OR if trigger source is specified, it must match submission source
-            source_matches = (not trigger_source_norm) or (trigger_source_norm == submission_source_norm)
-
-            if trigger.trigger.lower() == submission.trigger.lower() and source_matches:
-                task_matched_submission = True
-                break # Found a matching trigger for this task
-
-        if task_matched_submission:
-            made_progress_on_a_task = True
-            current_progress = save.tileProgress[challenge_id_str].get(str(task.id), 0)
-            new_progress = current_progress + submission.quantity
-            save.tileProgress[challenge_id_str][str(task.id)] = new_progress
+        # The index already resolved which tasks this submission's (trigger, source) feeds
+        if task_id_str in matched_task_ids:
+            new_progress = save.tileProgress.increment(challenge_id_str, task.id, submission.quantity)
             logging.info(f"Team {team.id} progressed task {task.id} for challenge {challenge.id} to {new_progress}/{task.quantity}")
 
             # Check if this specific task completion completes the challenge (for OR type)
             # For AND type, is_challenge_completed will check all tasks.
-            if is_challenge_completed(challenge, task, save): # Pass the specific task that got progress
+            if is_challenge_completed(challenge, task, save, index.tasks): # Pass the specific task that got progress
                 logging.info(f"Challenge {challenge.id} (type: {challenge.type}) completed by team {team.id} due to task {task.id} progress.")
                 match challengeMapping.type: # This is the type from SP3EventTileChallengeMapping
                     case "REGION":
@@ -319,39 +296,35 @@ def progress_tile_challenge(challengeMapping: SP3EventTileChallengeMapping, even
                         return create_coin_challenge_notification(challengeMapping, event, team, save, submission)
                     # Add other mapping types if necessary
                 break # Challenge completed, no need to check other tasks for this submission for this challenge
-    
-    if made_progress_on_a_task:
-        # If progress was made, but challenge not yet completed (e.g. AND type needing more tasks)
-        # we might still want to notify or just save progress.
-        # For now, notification only on full challenge completion.
-        pass
 
     return None # No notification if challenge not completed by this submission
 
-def get_region_challenges(save: SaveData):
-    region = SP3Regions.query.filter(SP3Regions.id == save.islandId).first()
-    if not region:
+def get_region_challenges(save: SaveData, index: TriggerIndex) -> list[str]:
+    challenges = index.get_region_challenges(save.islandId)
+    if save.islandId and str(save.islandId) not in index.region_challenges:
         logging.error(f"Region not found for islandId {save.islandId} during challenge retrieval.")
-        return []
-    
-    return region.challenges if region.challenges else []
+    return challenges
 
-def progress_team(event: Events, team: EventTeams, save: SaveData, submission: EventSubmission) -> list[NotificationResponse]:
+def progress_team(event: Events, team: EventTeams, save: SaveData, submission: EventSubmission, index: TriggerIndex, matches: dict[str, frozenset]) -> list[NotificationResponse]:
     notifications: list[NotificationResponse] = []
     if save.currentTile is None:
         logging.warning(f"Team {team.id} has no currentTile, cannot progress challenges.")
         return notifications
     
-    for challenge in get_region_challenges(save):
-        notif = progress_region_challenge(challenge, event, team, save, submission)
+    for challenge in get_region_challenges(save, index):
+        if challenge not in matches:
+            continue
+        notif = progress_region_challenge(challenge, event, team, save, submission, index, matches)
         if notif is not None:
             notifications.append(notif)
             # If a REGION type challenge completed, we might want to stop processing other challenges
             # on this tile for this submission.
             return notifications # We are stopping processing for other challenges here. In the future we can add a flag to progress other tiles with the submission but not complete anything
 
-    for challenge_mapping in get_team_challenges(save): # This gets challenges for the current tile
-        notif = progress_tile_challenge(challenge_mapping, event, team, save, submission)
+    for challenge_mapping in get_team_challenges(save, index): # This gets challenges for the current tile
+        if str(challenge_mapping.challenge_id) not in matches:
+            continue
+        notif = progress_tile_challenge(challenge_mapping, event, team, save, submission, index, matches)
         if notif is not None:
             notifications.append(notif)
             # If a TILE type challenge mapping completed the tile, subsequent challenges on this tile for THIS submission
@@ -374,53 +347,69 @@ def is_game_accepting_submissions(event: Events) -> bool:
     # Placeholder for global game state checks (e.g., event paused)
     return True # For now, assume game always accepts if event is active
 
-def get_team_from_rsn(eventId: uuid.UUID, rsn: str) -> EventTeams:
-    # Case-insensitive search for RSN in EventTeamMemberMappings
-    team_mapping = EventTeamMemberMappings.query.filter(
-        EventTeamMemberMappings.event_id == eventId,
-        EventTeamMemberMappings.username.ilike(rsn) # Use ilike for case-insensitive
-    ).first()
-    if team_mapping is None:
-        return None
-    return EventTeams.query.filter(EventTeams.id == team_mapping.team_id).first()
+def get_team_id_from_rsn(eventId: uuid.UUID, rsn: str) -> uuid.UUID | None:
+    # Case/separator-insensitive lookup through the cached member index
+    return get_team_member_index(eventId).team_for_rsn(rsn)
 
-def get_team_from_discord_id(eventId: uuid.UUID, discord_id: str) -> EventTeams:
+def get_team_id_from_discord_id(eventId: uuid.UUID, discord_id: str) -> uuid.UUID | None:
     if discord_id is None or discord_id == "":
         logging.warning(f"Discord ID is None or empty for event {eventId}. Cannot find team.")
         return None
-    # Case-insensitive search for Discord ID in EventTeamMemberMappings
-    team_mapping = EventTeamMemberMappings.query.filter(
-        EventTeamMemberMappings.event_id == eventId,
-        EventTeamMemberMappings.discord_id.ilike(discord_id) # Use ilike for case-insensitive
-    ).first()
-    if team_mapping is None:
+    return get_team_member_index(eventId).team_for_discord_id(discord_id)
+
+def get_team_name(team_id: uuid.UUID) -> str:
+    team = db.session.get(EventTeams, team_id)
+    return team.name if team else str(team_id)
+
+def get_team_from_rsn(eventId: uuid.UUID, rsn: str) -> EventTeams:
+    team_id = get_team_id_from_rsn(eventId, rsn)
+    if team_id is None:
         return None
-    return EventTeams.query.filter(EventTeams.id == team_mapping.team_id).first()
+    return db.session.get(EventTeams, team_id)
 
-def stability_party_handler(submission: EventSubmission) -> list[NotificationResponse]:
-    now = datetime.now(timezone.utc)
-    event = Events.query.filter(
-        Events.start_time <= now, 
-        Events.end_time >= now, 
-        Events.type == "STABILITY_PARTY"
-    ).first()
-
-    if event is None:
-        logging.info(f"No active STABILITY_PARTY event found for submission by {submission.rsn}.")
-        return None # Or an empty list
+def get_team_from_discord_id(eventId: uuid.UUID, discord_id: str) -> EventTeams:
+    team_id = get_team_id_from_discord_id(eventId, discord_id)
+    if team_id is None:
+        return None
+    return db.session.get(EventTeams, team_id)
 
-    team = get_team_from_rsn(event.id, submission.rsn)
-    if team is None:
-        team = get_team_from_discord_id(event.id, submission.id)
-    
-    if team is None:
-        logging.info(f"Team not found for RSN '{submission.rsn}' or ID '{submission.id}' in event '{event.name}' (ID: {event.id}).")
+def resolve_submission_team(submission: EventSubmission) -> tuple[Events, uuid.UUID, TriggerIndex, dict[str, frozenset]] | None:
+    """
+    Find the live event and team a submission progresses
+
+    Returns:
+        (event, team_id, index, matches), or None if the submission doesn't progress any team
+    """
+    live_events = active_events.get_active_events("STABILITY_PARTY")
+    if not live_events:
+        logging.info(f"No active STABILITY_PARTY event found for submission by {submission.rsn}.")
         return None
 
-    # Ensure team.data is not None before passing to SaveData.from_dict
-    team_data_dict = team.data if team.data is not None else {}
-    save = SaveData.from_dict(team_data_dict)
+    for active_event in live_events:
+        # Resolve which challenges this drop feeds before touching any team state
+        index = get_trigger_index(active_event.id)
+        matches = index.match(submission.trigger, submission.source)
+        if not matches:
+            continue
+
+        team_id = get_team_id_from_rsn(active_event.id, submission.rsn)
+        if team_id is None:
+            team_id = get_team_id_from_discord_id(active_event.id, submission.id)
+        if team_id is not None:
+            event = db.session.get(Events, active_event.id)
+            if event is not None:
+                return event, team_id, index, matches
+
+    logging.debug(f"Submission '{submission.trigger}' from '{submission.source}' by '{submission.rsn}' does not progress any team in the active STABILITY_PARTY events.")
+    return None
 
+def apply_submission(event: Events, team: EventTeams, save: SaveData, submission: EventSubmission, index: TriggerIndex, matches: dict[str, frozenset]) -> list[NotificationResponse] | None:
+    """
+    Apply a submission to a team's in-memory save without persisting it
+
+    Returns:
+        The notifications it produced, or None if the team couldn't accept it
+    """
     if save.currentTile is None:
         logging.warning(f"Team {team.name} (ID: {team.id}) has no currentTile. Submissions cannot be processed for challenges yet.")
         # Potentially, they might be submitting something that *gives* them their first tile,
@@ -435,15 +424,151 @@ def stability_party_handler(submission: EventSubmission) -> list[NotificationRes
         logging.info(f"Team {team.name} (ID: {team.id}) is not accepting submissions (tile {save.currentTile} likely completed or action pending).")
         return None
 
-    notifications = progress_team(event, team, save, submission)
+    notifications = progress_team(event, team, save, submission, index, matches)
     
     # progress_event might be for global, non-team specific objectives
     # progress_event(event, submission) 
-    
-    save_team_data(team, save) # Save any changes to save.data (like tileProgress, coins, isTileCompleted)
 
     return notifications
 
+def load_team_save(team_id: uuid.UUID, lock: bool = False) -> tuple[EventTeams, SaveData] | None:
+    """Read a team and its SaveData, under the team's row lock if lock is set"""
+    if lock:
+        team = lock_team(team_id)
+    else:
+        team = EventTeams.query.filter_by(id=team_id).populate_existing().first()
+    if team is None:
+        return None
+    # Ensure team.data is not None before passing to SaveData.from_dict
+    team_data_dict = team.data if team.data is not None else {}
+    return team, SaveData.from_dict(team_data_dict, team.id)
+
+def save_progress_without_lock(team: EventTeams, save: SaveData, index: TriggerIndex) -> bool:
+    """
+    Save a team whose submissions only added progress, without locking the team row
+
+    The increments are `progress = progress + n` upserts, so ticks from different
+    members add up without queueing on the team. They're written in a savepoint
+    that's rolled back when the save has to go through lock_team() instead:
+    - it changes team.data or resets progress (e.g. the team's first save fills in defaults)
+    - a task it incremented reached its quantity, so a completion may be due; the
+      upsert holds the progress row, so exactly one of two racing ticks sees that
+    - the team was written since it was read, so the tile it was credited to may be stale
+
+    Returns:
+        Whether the save was written; if not, the caller redoes it under the lock
+    """
+    changes = save.tileProgress.pending_changes()
+    if save.dirty_fields() != {} or not set(changes) <= {"add"}:
+        return False
+    if not changes:
+        return True
+
+    savepoint = db.session.begin_nested()
+    save_team_data(team, save)
+    totals = ChallengeProgress.load(team.id)
+    reached = any(
+        totals.get(challenge_id, {}).get(task_id, 0) >= index.tasks[task_id].quantity
+        for challenge_id, tasks in changes["add"].items()
+        for task_id in tasks
+        if task_id in index.tasks
+    )
+    version = db.session.query(EventTeams.version).filter(EventTeams.id == team.id).scalar()
+    if reached or version != team.version:
+        savepoint.rollback()
+        return False
+    savepoint.commit()
+    return True
+
+def apply_team_submissions(team: EventTeams, save: SaveData, submissions: list[EventSubmission], resolved_submissions: list[tuple], positions: list[int]) -> dict[int, list[NotificationResponse]]:
+    """Apply a team's submissions in order; returns the notifications of each one it accepted, by position"""
+    accepted: dict[int, list[NotificationResponse]] = {}
+    for position in positions:
+        event, _, index, matches = resolved_submissions[position]
+        notifications = apply_submission(event, team, save, submissions[position], index, matches)
+        if notifications is not None:
+            accepted[position] = notifications
+    return accepted
+
+@atomic_team_update
+def stability_party_handler(submission: EventSubmission) -> list[NotificationResponse]:
+    resolved = resolve_submission_team(submission)
+    if resolved is None:
+        return None
+    event, team_id, index, matches = resolved
+
+    # Most submissions only add progress, which doesn't need the team's row lock
+    loaded = load_team_save(team_id)
+    if loaded is None:
+        return None
+    team, save = loaded
+    notifications = apply_submission(event, team, save, submission, index, matches)
+    if notifications is None:
+        return None
+    if not notifications and save_progress_without_lock(team, save, index):
+        return notifications
+
+    # A completion changes team.data: redo it under a row lock so concurrent writers can't overwrite each other
+    loaded = load_team_save(team_id, lock=True)
+    if loaded is None:
+        return None
+    team, save = loaded
+    notifications = apply_submission(event, team, save, submission, index, matches)
+    if notifications is None:
+        return None
+
+    save_team_data(team, save) # Save any changes (progress rows, and team.data fields like coins, isTileCompleted)
+
+    return notifications
+
+@atomic_team_update
+def stability_party_batch_handler(submissions: list[EventSubmission]) -> list[list[NotificationResponse]]:
+    """
+    Apply an ordered burst of submissions, keeping one in-memory save per team
+
+    Submissions are applied in input order against their team's save, and each
+    touched team is saved once at the end instead of once per submission. Teams
+    whose submissions only add progress are saved without the team's row lock;
+    the others are redone under it.
+    """
+    results: list[list[NotificationResponse]] = [[] for _ in submissions]
+    resolved_submissions = [resolve_submission_team(submission) for submission in submissions]
+
+    team_positions: dict[uuid.UUID, list[int]] = {}
+    for position, resolved in enumerate(resolved_submissions):
+        if resolved is not None:
+            team_positions.setdefault(resolved[1], []).append(position)
+
+    locked_team_ids: list[uuid.UUID] = []
+    for team_id, positions in team_positions.items():
+        loaded = load_team_save(team_id)
+        if loaded is None:
+            continue
+        team, save = loaded
+        accepted = apply_team_submissions(team, save, submissions, resolved_submissions, positions)
+        index = resolved_submissions[positions[0]][2]
+        if any(accepted.values()) or not save_progress_without_lock(team, save, index):
+            locked_team_ids.append(team_id)
+            continue
+        for position, notifications in accepted.items():
+            results[position] = notifications
+
+    # Lock the remaining teams in a fixed order so two overlapping batches can't deadlock
+    for team_id in sorted(locked_team_ids, key=str):
+        loaded = load_team_save(team_id, lock=True)
+        if loaded is None:
+            continue
+        team, save = loaded
+        accepted = apply_team_submissions(team, save, submissions, resolved_submissions, team_positions[team_id])
+        # Only teams that accepted at least one submission are written
+        if accepted:
+            save_team_data(team, save)
+        for position, notifications in accepted.items():
+            results[position] = notifications
+
+    return results
+
+@atomic_team_update
 def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None, action_type: str = None, action_choice: str = None):
     """
     Master function for handling dice roll progression.
@@ -459,18 +584,23 @@ def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None
     logging.info(f"Roll progression request: event_id={event_id}, team_id={team_id}, action_type={action_type}")
     if data: logging.debug(f"Roll progression input data: {data}")
 
-    event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
-    if not event:
-        logging.error(f"Event not found or not a SP3 event: {event_id}")
-        return {"error": "Event not found or not a Stability Party event"}, 404
-    
-    team = EventTeams.query.filter_by(id=team_id, event_id=event_id).first()
-    if not team:
-        logging.error(f"Team not found for event: team_id={team_id}, event_id={event_id}")
-        return {"error": "Team not found or does not belong to this event"}, 404
-    
-    team_data_dict = team.data if team.data is not None else {}
-    save = SaveData.from_dict(team_data_dict)
+    resumed = resume_turn_session(event_id, team_id)
+    if resumed is not None:
+        # Mid-turn and nobody else has written the team since the last step
+        team, save = resumed
+    else:
+        event = Events.query.filter_by(id=event_id, type="STABILITY_PARTY").first()
+        if not event:
+            logging.error(f"Event not found or not a SP3 event: {event_id}")
+            return {"error": "Event not found or not a Stability Party event"}, 404
+        
+        team = lock_team(team_id, event_id)
+        if not team:
+            logging.error(f"Team not found for event: team_id={team_id}, event_id={event_id}")
+            return {"error": "Team not found or does not belong to this event"}, 404
+        
+        team_data_dict = team.data if team.data is not None else {}
+        save = SaveData.from_dict(team_data_dict, team.id)
     
     logging.debug(f"Initial team state: currentTile={save.currentTile}, isRolling={save.isRolling}, isTileCompleted={save.isTileCompleted}")
     
@@ -480,9 +610,11 @@ def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None
         if action_type is None: 
             if save.currentTile is None: 
                 logging.info(f"Team {team_id} has no currentTile. Initiating FIRST_ROLL sequence.")
+                take_team_snapshot(team, "pre_roll") # What undo-roll restores
                 roll_state_obj = _handle_first_roll_initiation(event_id, team_id, save, data if data else {})
                 response_payload = roll_state_obj.to_dict()
                 save_team_data(team, save) 
+                store_turn_session(team, save)
                 return response_payload, 200
             else: 
                 logging.info(f"Initiating new standard roll for team {team_id}")
@@ -493,9 +625,11 @@ def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None
                     logging.error(f"Cannot roll - team is already in a rolling sequence: team={team_id}")
                     return {"error": "Team is already in a rolling sequence. Complete current action."}, 400
                 
+                take_team_snapshot(team, "pre_roll") # What undo-roll restores
                 _initiate_new_roll(event_id, team_id, save, data if data else {})
                 response_payload = _process_next_move(event_id, team_id, save)
                 save_team_data(team, save)
+                store_turn_session(team, save)
                 return response_payload, 200
 
         elif action_type == RollState.ACTION_TYPES["ISLAND_SELECTION"]:
@@ -511,6 +645,7 @@ def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None
             if "error" in response_payload: 
                 return response_payload, response_payload.get("status_code", 400) 
             save_team_data(team, save)
+            store_turn_session(team, save)
             return response_payload, 200
             
         # --- Existing Action Handlers ---
@@ -556,6 +691,7 @@ def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None
         if "error" not in response_payload:
             logging.info(f"Action '{action_type}' processed successfully for team {team_id}. Saving state.")
             save_team_data(team, save)
+            store_turn_session(team, save)
         else:
             logging.error(f"Error processing action '{action_type}' for team {team_id}: {response_payload['error']}")
         
@@ -563,6 +699,8 @@ def roll_dice_progression(event_id_str: str, team_id_str: str, data: dict = None
         return response_payload, status_code
             
     except Exception as e:
+        if is_retryable_conflict(e):
+            raise # atomic_team_update retries the whole roll
         db.session.rollback() 
         logging.error(f"Critical error in roll_dice_progression: {str(e)}", exc_info=True)
         return {"error": "An internal server error occurred during roll progression."}, 500
@@ -588,16 +726,15 @@ def _initiate_new_roll(event_id, team_id, save: SaveData, data: dict) -> None:
         modifier_val = 0
         logging.warning(f"Invalid modifier, defaulting to sum of dice: {roll_total}")
 
-    region = SP3Regions.query.filter(SP3Regions.id == save.islandId).first()
-    if region.data.get("isHotspot", False):
+    region = get_board_graph(event_id).region(save.islandId)
+    if region and region.is_hotspot:
         # Check to see if the island is "Mountain Mayhem"
         if region.name == "Mountain Mayhem" and save.islandLaps == 0:
             # We are in "Mountain Mode". Every roll will be a 1.
             roll_total = 1
             dice_results = [1]
             modifier_val = 0
-            team = EventTeams.query.filter_by(id=team_id).first()
-            logging.info(f"Mountain Mayhem active. Roll total set to 1 for team {team.name} ({team_id}).")
+            logging.info(f"Mountain Mayhem active. Roll total set to 1 for team {team_id}.")
     
     save.roll_state = RollState(event_id, team_id, roll_total, save.currentTile)
     save.roll_state.dice_results_for_roll = dice_results
@@ -609,195 +746,182 @@ def _initiate_new_roll(event_id, team_id, save: SaveData, data: dict) -> None:
     
     logging.info(f"Team {team_id} initiated roll. Results: {dice_results}, Mod: {modifier_val}, Total: {roll_total}. Current Tile: {save.currentTile}")
 
-def _process_next_move(event_id, team_id, save: SaveData) -> dict:
-    logging.info(f"Processing next move for team {team_id}. Roll remaining: {save.roll_state.roll_remaining}, Current Tile: {save.currentTile}")
+def _process_next_move(event_id, team_id, save: SaveData, path_segment: list | None = None) -> dict:
+    """
+    Move the team along the board until it reaches a decision point or runs out of moves
 
-    if save.roll_state.roll_remaining <= 0:
-        logging.debug(f"No moves remaining for team {team_id}. Completing roll.")
-        return _complete_roll(event_id, team_id, save)
+    Straight paths and regular tiles are walked in one go against the board graph;
+    the loop only stops at a crossroad, a shop/star/dock tile or the end of the roll.
+    The response carries the tiles entered along the way in "path_segment".
+    """
+    graph = get_board_graph(event_id)
+    path_segment = path_segment if path_segment is not None else []
 
-    current_tile_obj = SP3EventTiles.query.filter_by(id=save.currentTile).first()
-    if not current_tile_obj:
-        logging.error(f"Current tile {save.currentTile} not found for team {team_id}.")
-        save.isRolling = False 
-        return {"error": "Current tile not found, cannot process move."}
+    while True:
+        logging.info(f"Processing next move for team {team_id}. Roll remaining: {save.roll_state.roll_remaining}, Current Tile: {save.currentTile}")
 
-    if not save.roll_state.path_taken_this_turn or save.roll_state.path_taken_this_turn[-1] != save.currentTile:
-        save.roll_state.path_taken_this_turn.append(save.currentTile)
+        if save.roll_state.roll_remaining <= 0:
+            logging.debug(f"No moves remaining for team {team_id}. Completing roll.")
+            response = _complete_roll(event_id, team_id, save)
+            break
+
+        current_tile_obj = graph.tile(save.currentTile)
+        if not current_tile_obj:
+            logging.error(f"Current tile {save.currentTile} not found for team {team_id}.")
+            save.isRolling = False 
+            return {"error": "Current tile not found, cannot process move."}
+
+        if not save.roll_state.path_taken_this_turn or save.roll_state.path_taken_this_turn[-1] != save.currentTile:
+            save.roll_state.path_taken_this_turn.append(save.currentTile)
 
-    next_tile_ids_str = current_tile_obj.data.get("nextTiles", []) if current_tile_obj.data else []
+        next_tile_ids = current_tile_obj.next_tiles
 
-    if len(next_tile_ids_str) > 1:
-        logging.info(f"Crossroad detected at tile {current_tile_obj.id} for team {team_id}.")
-        return _handle_crossroad(event_id, team_id, save, next_tile_ids_str)
-    elif len(next_tile_ids_str) == 1:
-        next_tile_id_str = next_tile_ids_str[0]
-        logging.info(f"Team {team_id} moving from {current_tile_obj.id} to single next tile {next_tile_id_str}.")
+        if len(next_tile_ids) > 1:
+            logging.info(f"Crossroad detected at tile {current_tile_obj.id} for team {team_id}.")
+            response = _handle_crossroad(event_id, team_id, save, [str(tile_id) for tile_id in next_tile_ids])
+            break
+        elif len(next_tile_ids) == 0:
+            logging.info(f"No next tiles from {current_tile_obj.id} for team {team_id}. Completing roll.")
+            response = _complete_roll(event_id, team_id, save)
+            break
+
+        next_tile_id = next_tile_ids[0]
+        logging.info(f"Team {team_id} moving from {current_tile_obj.id} to single next tile {next_tile_id}.")
         
-        save.currentTile = uuid.UUID(next_tile_id_str)
+        save.currentTile = next_tile_id
         save.roll_state.current_tile_id = save.currentTile
         save.roll_state.roll_remaining -= 1
+        path_segment.append(save.currentTile)
         
         logging.debug(f"Team {team_id} moved to {save.currentTile}. Roll remaining: {save.roll_state.roll_remaining}")
-        return _check_for_special_tile(event_id, team_id, save)
-    else: 
-        logging.info(f"No next tiles from {current_tile_obj.id} for team {team_id}. Completing roll.")
-        return _complete_roll(event_id, team_id, save)
+        response = _land_on_tile(event_id, team_id, save, graph)
+        if response is not None:
+            break
 
-def is_star_tile(tile_id):
+    if "error" not in response:
+        response["path_segment"] = _describe_path(graph, path_segment)
+    return response
+
+def _describe_path(graph: BoardGraph, tile_ids: list) -> list[dict]:
+    path = []
+    for tile_id in tile_ids:
+        tile = graph.tile(tile_id)
+        path.append({"id": str(tile_id), "name": tile.name if tile else "Unknown Tile"})
+    return path
+
+def is_star_tile(tile_id, graph: BoardGraph | None = None):
     """Check if the tile is a star tile"""
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
-    if tile:
-        event = Events.query.filter_by(id=tile.event_id).first()
-        if event:
-            star_list = event.data.get("star_tiles", [])
-            if str(tile_id) in star_list:
-                logging.debug(f"Tile {tile_id} is a star tile")
-                return True
-            else:
-                logging.debug(f"Tile {tile_id} is not a star tile")
-                return False
-            
-    return False
+    graph = graph or get_board_graph_for_tile(tile_id)
+    if graph is None or graph.tile(tile_id) is None:
+        return False
+    is_star = graph.is_star_tile(tile_id)
+    logging.debug(f"Tile {tile_id} is {'' if is_star else 'not '}a star tile")
+    return is_star
 
-def is_dock_tile(tile_id):
+def is_dock_tile(tile_id, graph: BoardGraph | None = None):
     """Check if the tile is a dock tile"""
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
-    if tile:
-        isDock = tile.data.get("isDock", False)
-        if isDock:
-            logging.debug(f"Tile {tile_id} is a dock tile")
-            return True
-        else:
-            logging.debug(f"Tile {tile_id} is not a dock tile")
-            return False
-            
-    return False
+    graph = graph or get_board_graph_for_tile(tile_id)
+    tile = graph.tile(tile_id) if graph else None
+    if tile is None:
+        return False
+    logging.debug(f"Tile {tile_id} is {'' if tile.is_dock else 'not '}a dock tile")
+    return tile.is_dock
 
-def is_shop_tile(tile_id):
+def is_shop_tile(tile_id, graph: BoardGraph | None = None):
     """Check if the tile is a shop tile"""
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
-    if tile:
-        isShop = tile.data.get("isShop", False)
-        if isShop:
-            logging.debug(f"Tile {tile_id} is a shop tile")
-            return True
-        else:
-            logging.debug(f"Tile {tile_id} is not a shop tile")
-            return False
-            
-    return False
+    graph = graph or get_board_graph_for_tile(tile_id)
+    tile = graph.tile(tile_id) if graph else None
+    if tile is None:
+        return False
+    logging.debug(f"Tile {tile_id} is {'' if tile.is_shop else 'not '}a shop tile")
+    return tile.is_shop
 
-def is_island_start_tile(tile_id):
+def is_island_start_tile(tile_id, graph: BoardGraph | None = None):
     """Check if the tile is the first tile of an island"""
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
-    if tile:
-        isIslandStart = tile.data.get("isIslandStart", False)
-        if isIslandStart:
-            logging.debug(f"Tile {tile_id} is the start tile of an island")
-            return True
-        else:
-            logging.debug(f"Tile {tile_id} is not the start tile of an island")
-            return False
-            
-    return False
-
-def is_region_populated(tile_id):
-    """Check if the tile is a populated region"""
-    all_teams: list[EventTeams] = EventTeams.query.all()
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
-    if not tile:
-        logging.error(f"Tile not found for ID {tile_id}")
+    graph = graph or get_board_graph_for_tile(tile_id)
+    tile = graph.tile(tile_id) if graph else None
+    if tile is None:
         return False
-    
-    tile_region_id = tile.region_id
-    for team in all_teams:
-        if team.data.get("islandId") == str(tile_region_id):
-            logging.debug(f"Tile {tile_id} is a populated region")
-            return True
-            
+    logging.debug(f"Tile {tile_id} is {'' if tile.is_island_start else 'not '}the start tile of an island")
+    return tile.is_island_start
+
+def is_region_populated(region_id, event_id, exclude_team_id=None):
+    """Check if any team (other than exclude_team_id) is on a region"""
+    if get_region_occupancy(event_id).is_populated(region_id, exclude_team_id):
+        logging.debug(f"Region {region_id} is populated")
+        return True
     return False
 
 def does_region_have_star(tile_id):
     """Check if the tile is a region with a star"""
-    tile = SP3EventTiles.query.filter_by(id=tile_id).first()
-    tile_region = tile.region_id if tile else None
-    if tile and tile_region:
-        event = Events.query.filter_by(id=tile.event_id).first()
-        if event:
-            star_list = event.data.get("star_tiles", [])
-            for star_tile_id in star_list:
-                star_tile = SP3EventTiles.query.filter_by(id=star_tile_id).first()
-                star_tile_region = star_tile.region_id if star_tile else None
-                if str(tile_region) == str(star_tile_region):
-                    logging.debug(f"Tile {tile_id} is a region with a star")
-                    return True
-            
+    graph = get_board_graph_for_tile(tile_id)
+    tile = graph.tile(tile_id) if graph else None
+    if tile and tile.region_id and graph.region_has_star(tile.region_id):
+        logging.debug(f"Tile {tile_id} is a region with a star")
+        return True
     return False
 
-def _check_for_special_tile(event_id, team_id, save):
-    """Check if the current tile is a special tile that needs interaction"""
+def _land_on_tile(event_id, team_id, save, graph: BoardGraph) -> dict | None:
+    """
+    Apply landing on save.currentTile
+
+    Returns:
+        The response for the action the tile requires (or the completed roll),
+        or None if it's a regular tile and the team keeps moving
+    """
     logging.info(f"Checking for special tile interaction for team {team_id} at tile {save.currentTile}")
     
-    current_tile = SP3EventTiles.query.filter_by(id=save.currentTile).first()
+    current_tile = graph.tile(save.currentTile)
     if not current_tile:
         logging.error(f"Current tile not found: {save.currentTile}")
         return {"error": "Current tile not found"}
     
     logging.debug(f"Current tile details: name={current_tile.name}, id={current_tile.id}")
     
-    # Get info about the tile
-    tile_info = {
-        "id": str(current_tile.id),
-        "name": current_tile.name,
-        "description": current_tile.description
-    }
-    
     # Check if we need to set island ID based on the tile
     if current_tile.region_id and current_tile.region_id != save.islandId:
         logging.info(f"Updating team island ID from {save.islandId} to {current_tile.region_id}")
         save.islandId = current_tile.region_id
     
     # Check if this is a special tile that requires an action
-    if is_shop_tile(current_tile.id):
+    if is_shop_tile(current_tile.id, graph):
         logging.info(f"Special tile detected: SHOP - Preparing shop interaction")
         return _prepare_shop_interaction(event_id, team_id, save, current_tile)
-    elif is_star_tile(current_tile.id):
+    elif is_star_tile(current_tile.id, graph):
         logging.info(f"Special tile detected: STAR_SPOT - Preparing star interaction")
         return _prepare_star_interaction(event_id, team_id, save, current_tile)
-    elif is_dock_tile(current_tile.id):
+    elif is_dock_tile(current_tile.id, graph):
         logging.info(f"Special tile detected: DOCK - Preparing dock interaction")
         return _prepare_dock_interaction(event_id, team_id, save, current_tile)
-    else:
-        logging.info(f"Regular tile no special interaction required")
-        
-        # Regular tile, continue movement automatically if there are moves left
-        if save.roll_state.roll_remaining > 0:
-            logging.debug(f"Moves remaining: {save.roll_state.roll_remaining}, automatically continuing to next tile")
-            
-            # Add current tile to the response for client information
-            # Handle the case where path_taken_this_turn might not exist
-            if not hasattr(save.roll_state, 'path_taken_this_turn'):
-                logging.warning(f"Creating missing path_taken_this_turn attribute on roll_state for team {team_id}")
-                save.roll_state.path_taken_this_turn = []
-            
-            save.roll_state.path_taken_this_turn.append(save.currentTile)
-            
-            # Automatically continue to the next tile
-            return _process_next_move(event_id, team_id, save)
-        else:
-            logging.debug("No moves remaining, completing roll")
-            # No more moves left, finalize the roll
-            return _complete_roll(event_id, team_id, save)
-    
-    return save.roll_state.to_dict()
+
+    logging.info(f"Regular tile no special interaction required")
+    if save.roll_state.roll_remaining > 0:
+        # Regular tile, the caller keeps moving
+        logging.debug(f"Moves remaining: {save.roll_state.roll_remaining}, continuing to next tile")
+        save.roll_state.path_taken_this_turn.append(save.currentTile)
+        return None
+
+    logging.debug("No moves remaining, completing roll")
+    # No more moves left, finalize the roll
+    return _complete_roll(event_id, team_id, save)
+
+def _check_for_special_tile(event_id, team_id, save):
+    """Check if the current tile is a special tile that needs interaction, and keep moving if it isn't"""
+    graph = get_board_graph(event_id)
+    response = _land_on_tile(event_id, team_id, save, graph)
+    if response is None:
+        return _process_next_move(event_id, team_id, save, [save.currentTile])
+    if "error" not in response:
+        response["path_segment"] = _describe_path(graph, [save.currentTile])
+    return response
 
 def _handle_crossroad(event_id, team_id, save: SaveData, next_tile_ids_str: list) -> dict:
     logging.info(f"Handling crossroad for team {team_id} with {len(next_tile_ids_str)} options")
-    current_tile_obj = SP3EventTiles.query.filter_by(id=save.currentTile).first()
+    graph = get_board_graph(event_id)
+    current_tile_obj = graph.tile(save.currentTile)
     path_options = []
     for tile_id_str in next_tile_ids_str:
-        next_tile = SP3EventTiles.query.filter_by(id=uuid.UUID(tile_id_str)).first()
+        next_tile = graph.tile(tile_id_str)
         if next_tile:
             path_options.append({"id": str(next_tile.id), "name": next_tile.name, "description": next_tile.description or ""})
     
@@ -836,7 +960,7 @@ def _prepare_shop_interaction(event_id, team_id, save, current_tile):
     items = generate_shop_inventory(event_id, shop_tier=1, item_count=3)
 
     # get region name
-    region = SP3Regions.query.filter(SP3Regions.id == current_tile.region_id).first()
+    region = get_board_graph(event_id).region(current_tile.region_id)
     if region:
         region_name = region.name
     else:
@@ -937,54 +1061,19 @@ def _handle_star_action(event_id, team_id, save, data):
         save.stars += 1
 
         # Move the star to a new tile
-        new_star_tile_id = None
-        all_regions = SP3Regions.query.all()
-        applicable_regions = []
-
-        for region in all_regions:
-            if not is_region_populated(region.id):
-                applicable_regions.append(region.id)
-                
-        applicable_region_tiles = SP3EventTiles.query.filter(
-            SP3EventTiles.event_id == event_id,
-            SP3EventTiles.region_id.in_(applicable_regions),
-        ).all()
-        for region in all_regions:
-            if not is_region_populated(region.id):
-                applicable_regions.append(region.id)
-                
-        applicable_region_tiles = SP3EventTiles.query.filter(
-            SP3EventTiles.event_id == event_id,
-            SP3EventTiles.region_id.in_(applicable_regions),
-        ).all()
-
-        # Filter out tiles that are shops, docks, or already have stars
-        applicable_region_tiles = [tile for tile in applicable_region_tiles if not is_shop_tile(tile.id) and not is_dock_tile(tile.id) and not is_star_tile(tile.id)]
-        logging.info(f"Applicable region tiles for star placement: {[tile.name for tile in applicable_region_tiles]}")
-        if applicable_region_tiles:
-            new_star_tile = random.choice(applicable_region_tiles)
-            new_star_tile_id = new_star_tile.id
-            logging.info(f"Star moved to tile {new_star_tile.name} (ID: {new_star_tile_id})")
-        else:
-            logging.error("No valid tiles available for star placement.")
-            return {"error": "No valid tiles available for star placement"}, 400
-        
         old_star_tile_id = save.currentTile
-        event = Events.query.filter_by(id=event_id).first()
-        star_tiles = event.data.get("star_tiles")
-        star_tiles.remove(str(old_star_tile_id))
-        star_tiles.append(str(new_star_tile_id))
-        event.data["star_tiles"] = star_tiles
-        flag_modified(event, "data")
-        db.session.commit()
-
-        team_name = EventTeams.query.filter_by(id=team_id).first().name
-        old_star_tile = SP3EventTiles.query.filter_by(id=old_star_tile_id).first()
-        old_star_tile_name = old_star_tile.name
-        old_star_tile_region = SP3Regions.query.filter_by(id=old_star_tile.region_id).first().name
-        new_star_tile = SP3EventTiles.query.filter_by(id=new_star_tile_id).first()
+        moved = move_star(event_id, old_star_tile_id)
+        if moved is None:
+            return {"error": "No valid tiles available for star placement"}, 400
+        old_star_tile, new_star_tile = moved
+        commit_team_changes()
+
+        graph = get_board_graph(event_id)
+        team_name = get_team_name(team_id)
+        old_star_tile_name = old_star_tile.name if old_star_tile else str(old_star_tile_id)
+        old_star_tile_region = graph.region(old_star_tile.region_id).name if old_star_tile and graph.region(old_star_tile.region_id) else "Unknown"
         new_star_tile_name = new_star_tile.name
-        new_star_tile_region = SP3Regions.query.filter_by(id=new_star_tile.region_id).first().name
+        new_star_tile_region = graph.region(new_star_tile.region_id).name if graph.region(new_star_tile.region_id) else "Unknown"
         send_event_notification(event_id, team_id, f"{team_name} has purchased a star!", f"purchased the star on {old_star_tile_name} on {old_star_tile_region}!\n\nThe star has been moved to {new_star_tile_name} on {new_star_tile_region}!")
 
     # Update roll state
@@ -1010,8 +1099,8 @@ def _island_lap_completed(event_id, team_id, save: SaveData):
     logging.info(f"Team {team_id} completed an island lap. Total laps: {save.islandLaps}")
 
     # Check for island hotspot
-    region = SP3Regions.query.filter(SP3Regions.id == save.islandId).first()
-    is_hotspot = region.data.get("isHotspot", False) if region else False
+    region = get_board_graph(event_id).region(save.islandId)
+    is_hotspot = region.is_hotspot if region else False
     if is_hotspot:
         # Each island has its own hotspot logic...
         logging.info(f"Looking for region name: {region.name}")
@@ -1035,8 +1124,7 @@ def _island_lap_completed(event_id, team_id, save: SaveData):
                 
                 # If the team has completed the mountain challenge, they get a star
                 save.stars += 1
-                team = EventTeams.query.filter_by(id=team_id).first()
-                logging.info(f"Team {team.name} ({team_id}) completed the Mountain Challenge. Added one star to give total stars: {save.stars}")
+                logging.info(f"Team {team_id} completed the Mountain Challenge. Added one star to give total stars: {save.stars}")
                 send_event_notification(event_id, team_id, "The Mountain Has Been Conquered", f"completed the Mountain Challenge and received a star!\n\nTotal stars: {save.stars}")
             case "Raid-ical Island":
                 if save.islandLaps >= 3:
@@ -1045,19 +1133,19 @@ def _island_lap_completed(event_id, team_id, save: SaveData):
                 
                 # If the team has completed the raid-ical challenge, they get 50 coins
                 save.coins += 50
-                team = EventTeams.query.filter_by(id=team_id).first()
-                logging.info(f"Team {team.name} ({team_id}) completed the Raid-ical Challenge. Added 50 coins to give total coins: {save.coins}")
+                logging.info(f"Team {team_id} completed the Raid-ical Challenge. Added 50 coins to give total coins: {save.coins}")
                 send_event_notification(event_id, team_id, "Raid-ical Island Challenge Completed", f"completed the Raid-ical Challenge and received 50 coins!\n\nTotal coins: {save.coins}")
 
 
-def _prepare_dock_interaction(event_id, team_id, save, current_tile: SP3EventTiles):
+def _prepare_dock_interaction(event_id, team_id, save, current_tile: TileNode):
     logging.info(f"Preparing DOCK for team {team_id} at {current_tile.name}")
     save.roll_state.action_required = RollState.ACTION_TYPES["DOCK"]
 
     _island_lap_completed(event_id, team_id, save)
 
-    region = SP3Regions.query.filter(SP3Regions.id == current_tile.region_id).first()
-    charter_data = region.data.get("charter", [])
+    graph = get_board_graph(event_id)
+    region = graph.region(current_tile.region_id)
+    charter_data = region.charter if region else {}
     sailing_ticket = False
     for buff in save.buffs:
         if buff.get("type", "") == "sailing_ticket":
@@ -1066,7 +1154,10 @@ def _prepare_dock_interaction(event_id, team_id, save, current_tile: SP3EventTil
     
     destinations = []
     for destination_id, cost in charter_data.items():
-        region = SP3Regions.query.filter(SP3Regions.id == destination_id).first()
+        region = graph.region(destination_id)
+        if region is None:
+            logging.warning(f"Charter destination {destination_id} not found on the board")
+            continue
         destination = {
             "id": destination_id,
             "name": region.name,
@@ -1092,10 +1183,11 @@ def _handle_dock_action(event_id, team_id, save, data):
     if data.get("action", "") == "charter":
         destination_id = data.get("destinationId")
         cost = data.get("cost", 0)
-        destination_region = SP3Regions.query.filter(SP3Regions.id == uuid.UUID(destination_id)).first()
-        starting_region = SP3Regions.query.filter(SP3Regions.id == save.islandId).first()
+        graph = get_board_graph(event_id)
+        destination_region = graph.region(destination_id)
+        starting_region = graph.region(save.islandId)
 
-        if starting_region.data.get("charter", {}).get(destination_id, 0) != cost:
+        if starting_region.charter.get(destination_id, 0) != cost:
             sailing_ticket = False
             print(save.buffs)
             for i, buff in enumerate(save.buffs):
@@ -1112,17 +1204,12 @@ def _handle_dock_action(event_id, team_id, save, data):
                     # Remove the buff if no uses left
                     del save.buffs[sailing_ticket_buff_index]
             else: # Otherwise, they are trying to cheat the system
-                logging.error(f"Invalid cost for chartering to {str(destination_id)}. Expected {starting_region.data['charter'][str(destination_id)]}, got {data['cost']}")
+                logging.error(f"Invalid cost for chartering to {str(destination_id)}. Expected {starting_region.charter.get(str(destination_id))}, got {data['cost']}")
                 return {"error": "Invalid cost for chartering to new island."}, 400
 
         # Get the region's start tile
         if destination_region:
-            start_tile = db.session.query(SP3EventTiles).filter(
-                SP3EventTiles.event_id == event_id,
-                SP3EventTiles.region_id == destination_region.id,
-                SP3EventTiles.data.has_key('isIslandStart'), 
-                SP3EventTiles.data['isIslandStart'].astext.cast(db.Boolean) == True 
-            ).first()
+            start_tile = graph.island_start_tile(destination_region.id)
             
             if start_tile:
                 save.coins -= cost
@@ -1130,13 +1217,12 @@ def _handle_dock_action(event_id, team_id, save, data):
                 save.islandId = destination_region.id
                 save.islandLaps = 0
 
-                region = SP3Regions.query.filter(SP3Regions.id == save.islandId).first()
-                if region.data.get("isHotspot", False):
+                region = destination_region
+                if region.is_hotspot:
                     # Check to see if the island is "Mountain Mayhem"
                     if region.name == "Mountain Mayhem":
                         # We are in "Mountain Mode". Every roll will be a 1.
-                        team = EventTeams.query.filter_by(id=team_id).first()
-                        logging.info(f"Mountain Mayhem active. Rest of the roll totaling {save.roll_state.roll_remaining} has been reduced to 1, ensuring that we land on tile 1 for team {team.name} ({team_id}).")
+                        logging.info(f"Mountain Mayhem active. Rest of the roll totaling {save.roll_state.roll_remaining} has been reduced to 1, ensuring that we land on tile 1 for team {team_id}.")
                         save.roll_state.roll_remaining = 1
             else:
                 logging.error(f"No start tile found for region {destination_region.name} (ID: {destination_region.id})")
@@ -1195,15 +1281,11 @@ def _handle_first_roll_initiation(event_id: uuid.UUID, team_id: uuid.UUID, save:
     logging.info(f"Team {team_id} first roll results: {dice_results}, modifier: {modifier_val}, total: {roll_total_value}")
 
     available_islands = []
-    regions = SP3Regions.query.filter_by(event_id=event_id).order_by(SP3Regions.name).all()
+    graph = get_board_graph(event_id)
+    regions = sorted(graph.regions.values(), key=lambda region: region.name)
     
     for region in regions:
-        start_tile_exists = db.session.query(SP3EventTiles).filter(
-            SP3EventTiles.event_id == event_id,
-            SP3EventTiles.region_id == region.id,
-            SP3EventTiles.data.has_key('isIslandStart'), 
-            SP3EventTiles.data['isIslandStart'].astext.cast(db.Boolean) == True 
-        ).first()
+        start_tile_exists = graph.island_start_tile(region.id)
         
         if start_tile_exists:
             available_islands.append({
@@ -1261,17 +1343,13 @@ def _handle_island_selection(event_id: uuid.UUID, team_id: uuid.UUID, save: Save
         logging.error(f"Invalid UUID format for chosen_island_id: {chosen_island_id_str}")
         return {"error": "Invalid island ID format."}
 
-    chosen_region = SP3Regions.query.filter_by(id=chosen_island_id, event_id=event_id).first()
+    graph = get_board_graph(event_id)
+    chosen_region = graph.region(chosen_island_id)
     if not chosen_region:
         logging.error(f"Chosen island ID {chosen_island_id} not found or not part of event {event_id}.")
         return {"error": "Invalid island choice."}
 
-    starting_tile = db.session.query(SP3EventTiles).filter(
-        SP3EventTiles.event_id == event_id,
-        SP3EventTiles.region_id == chosen_island_id,
-        SP3EventTiles.data.has_key('isIslandStart'),
-        SP3EventTiles.data['isIslandStart'].astext.cast(db.Boolean) == True
-    ).first()
+    starting_tile = graph.island_start_tile(chosen_island_id)
 
     if not starting_tile:
         logging.error(f"No starting tile found for chosen island {chosen_island_id} (Region: {chosen_region.name}).")
@@ -1322,7 +1400,9 @@ def _handle_island_selection(event_id: uuid.UUID, team_id: uuid.UUID, save: Save
 def _complete_roll(event_id, team_id, save: SaveData) -> dict:
     logging.info(f"Completing roll for team {team_id} on tile {save.currentTile}")
     
-    current_tile_obj = SP3EventTiles.query.filter_by(id=save.currentTile).first()
+    graph = get_board_graph(event_id)
+    index = get_trigger_index(event_id)
+    current_tile_obj = graph.tile(save.currentTile)
     tile_info = {}
 
     if current_tile_obj:
@@ -1331,7 +1411,7 @@ def _complete_roll(event_id, team_id, save: SaveData) -> dict:
             "id": str(current_tile_obj.id), "name": current_tile_obj.name,
             "description": current_tile_obj.description or ""
         }
-        challenge_mappings: list[SP3EventTileChallengeMapping] = SP3EventTileChallengeMapping.query.filter_by(tile_id=current_tile_obj.id).all()
+        challenge_mappings: list[TileChallenge] = index.get_tile_challenges(current_tile_obj.id)
         challenge_mappings_count = len(challenge_mappings)
         if challenge_mappings_count == 0:
             logging.info(f"Tile {current_tile_obj.name} has no challenges. Auto-marking as completed.")
@@ -1339,40 +1419,26 @@ def _complete_roll(event_id, team_id, save: SaveData) -> dict:
         else:
             logging.info(f"Tile {current_tile_obj.name} has {challenge_mappings_count} challenges. Completion depends on progress.")
 
-            if current_tile_obj.data.get("category", "ANY") == "RANDOM":
+            if (current_tile_obj.category or "ANY") == "RANDOM":
                 # Pick a random challenge to be the tile challenge
                 save.currentChallenges = [random.choice(challenge_mappings).challenge_id]
                 task_strings = []
 
                 for challenge_id in save.currentChallenges:
-                    challenge = EventChallenges.query.filter_by(id=challenge_id).first()
-                    tasks = challenge.tasks
-                    for task_id in tasks:
-                        task = EventTasks.query.filter_by(id=task_id).first()
+                    challenge = index.challenges.get(str(challenge_id))
+                    for task_id in (challenge.tasks if challenge else []):
+                        task = index.tasks.get(task_id)
                         if task:
-                            triggers = task.triggers
-                            trigger_list = []
-                            for trigger_id in triggers:
-                                trigger = EventTriggers.query.filter_by(id=trigger_id).first()
-                                if trigger.type == "DROP":
-                                    trigger_list.append(f"{trigger.trigger}{" from " + trigger.source if trigger.source else ""}")
-                                elif trigger.type == "KC":
-                                    trigger_list.append(f"{trigger.trigger} KC")
-                            triggers_message = " OR ".join(trigger_list)
-                            
-                            task_strings.append(f"{task.quantity}x {triggers_message}")
+                            task_strings.append(f"{task.quantity}x {index.task_label(task)}")
 
                 tile_info["description"] = f"Random challenge selected:\n{'\n'.join(task_strings)}"
                 logging.info(f"Random challenge selected for tile {current_tile_obj.name}: {save.currentChallenges}")        
     
             for challenge_map in challenge_mappings:
                 challenge_id = challenge_map.challenge_id
-                tasks = EventChallenges.query.filter_by(id=challenge_id).first().tasks
-                if challenge_id not in save.tileProgress:
-                    save.tileProgress[str(challenge_id)] = {}
-
-                for task_id in tasks:
-                    save.tileProgress[str(challenge_id)][str(task_id)] = 0 # Reset task progress for the challenge
+                challenge = index.challenges.get(str(challenge_id))
+                tasks = challenge.tasks if challenge else []
+                save.tileProgress.reset(challenge_id, tasks) # Reset task progress for the challenge
     else:
         logging.warning(f"Final tile ID {save.currentTile} not found. Cannot determine challenges.")
         tile_info = {"id": str(save.currentTile), "name": "Unknown Tile (Not Found)"}
@@ -1402,7 +1468,7 @@ def _complete_roll(event_id, team_id, save: SaveData) -> dict:
             "dice_results_for_roll": save.roll_state.dice_results_for_roll,
             "modifier_for_roll": save.roll_state.modifier_for_roll,
             "roll_total_for_turn": save.roll_state.roll_total_for_turn,
-            "path_taken_this_turn": [SP3EventTiles.query.filter(SP3EventTiles.id == tid).first().name for tid in save.roll_state.path_taken_this_turn],
+            "path_taken_this_turn": [graph.tile(tid).name if graph.tile(tid) else "Unknown Tile" for tid in save.roll_state.path_taken_this_turn],
             "is_tile_completed_on_land": save.isTileCompleted
         }
         return save.roll_state.to_dict()
@@ -0,0 +1,189 @@
+"""
+Stored Stability Party standings
+
+/events/<id>/progress is polled constantly by the site. It used to load
+every team, rebuild each SaveData and look up tiles and regions per team,
+then rank the teams in Python. Standings are now kept in sp3_event_standings
+and reading them is a single indexed query.
+
+An event's standings are recomputed by one INSERT ... SELECT that pulls
+stars, coins, currentTile, islandId and isTileCompleted out of event_teams.data,
+joins the tile and region names and ranks the teams with rank(). An event is
+queued for a refresh by a transaction that:
+- inserts, deletes or renames a team, or updates its data through the ORM
+- writes a team with save_team_data (partial writes bypass the mapper)
+- renames a tile or region of the event
+
+The refresh runs once that transaction has committed, in a transaction of its
+own, so team writers never wait on it or on each other for it. Refreshes are
+coalesced per process: the thread that finds none running refreshes every
+queued event and keeps going until the queue is empty, while other writers
+just queue their events and return. A burst of writes therefore costs a few
+refreshes rather than one each, and the standings trail the writes by at most
+one refresh. A per-event advisory lock orders refreshes across processes, so a
+refresh always sees the writes of the refreshes that committed before it.
+"""
+
+import uuid
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy import event as sa_event, inspect, text
+from sqlalchemy.orm import object_session
+
+from app import db
+from models.models import EventTeams
+from models.stability_party_3 import SP3EventStandings, SP3EventTiles, SP3Regions
+
+_REFRESH_STANDINGS = text("""
+    INSERT INTO sp3_event_standings (
+        team_id, event_id, team_name, stars, coins, current_tile_id, current_tile_name,
+        region_id, region_name, tile_completed, rank, updated_at
+    )
+    SELECT
+        team.id, team.event_id, team.name, team.stars, team.coins, tile.id, tile.name,
+        region.id, region.name, team.tile_completed,
+        rank() OVER (ORDER BY team.stars DESC, team.coins DESC),
+        now() AT TIME ZONE 'utc'
+    FROM (
+        SELECT
+            id, event_id, name,
+            COALESCE((data ->> 'stars')::int, 0) AS stars,
+            COALESCE((data ->> 'coins')::int, 0) AS coins,
+            NULLIF(data ->> 'currentTile', '')::uuid AS current_tile_id,
+            NULLIF(data ->> 'islandId', '')::uuid AS region_id,
+            COALESCE((data ->> 'isTileCompleted')::boolean, false) AS tile_completed
+        FROM event_teams
+        WHERE event_id = :event_id
+    ) AS team
+    LEFT JOIN sp3_event_tiles AS tile ON tile.id = team.current_tile_id
+    LEFT JOIN sp3_regions AS region ON region.id = team.region_id
+    ON CONFLICT (team_id) DO UPDATE SET
+        event_id = EXCLUDED.event_id,
+        team_name = EXCLUDED.team_name,
+        stars = EXCLUDED.stars,
+        coins = EXCLUDED.coins,
+        current_tile_id = EXCLUDED.current_tile_id,
+        current_tile_name = EXCLUDED.current_tile_name,
+        region_id = EXCLUDED.region_id,
+        region_name = EXCLUDED.region_name,
+        tile_completed = EXCLUDED.tile_completed,
+        rank = EXCLUDED.rank,
+        updated_at = EXCLUDED.updated_at
+""")
+
+_DELETE_DEPARTED_TEAMS = text("""
+    DELETE FROM sp3_event_standings
+    WHERE event_id = :event_id
+      AND team_id NOT IN (SELECT id FROM event_teams WHERE event_id = :event_id)
+""")
+
+_refresh_lock = threading.Lock()
+_refresh_queue: set = set()
+_refreshing = False
+_refresh_listeners: list = []
+
+def refresh_event_standings(event_id: uuid.UUID, session=None) -> None:
+    """Recompute an event's standings (the caller commits); session may also be a Connection"""
+    session = session if session is not None else db.session
+    params = {"event_id": event_id}
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"sp3_event_standings:{event_id}"})
+    session.execute(_DELETE_DEPARTED_TEAMS, params)
+    session.execute(_REFRESH_STANDINGS, params)
+    logging.debug(f"Refreshed standings for event {event_id}")
+
+def on_standings_refreshed(func) -> None:
+    """Call func(connection, event_id) in every queued refresh's transaction, once the rows are written"""
+    _refresh_listeners.append(func)
+
+def _refresh_committed(event_id: uuid.UUID) -> None:
+    try:
+        with db.engine.begin() as connection:
+            refresh_event_standings(event_id, connection)
+            for func in _refresh_listeners:
+                func(connection, event_id)
+    except Exception as e:
+        logging.error(f"Error refreshing standings for event {event_id}: {e}", exc_info=True)
+
+def request_standings_refresh(event_ids) -> None:
+    """Queue events for a refresh, and run the queue unless another thread already is"""
+    global _refreshing
+    with _refresh_lock:
+        _refresh_queue.update(event_ids)
+        if _refreshing:
+            return
+        _refreshing = True
+    try:
+        while True:
+            with _refresh_lock:
+                queued = list(_refresh_queue)
+                _refresh_queue.clear()
+                if not queued:
+                    _refreshing = False
+                    return
+            for event_id in queued:
+                _refresh_committed(event_id)
+    except BaseException:
+        with _refresh_lock:
+            _refreshing = False
+        raise
+
+def get_event_standings(event_id: uuid.UUID) -> list[SP3EventStandings]:
+    """An event's standings, best first"""
+    return SP3EventStandings.query.filter_by(event_id=event_id).order_by(SP3EventStandings.rank, SP3EventStandings.team_name).all()
+
+def serialize_standing(row: SP3EventStandings, graph, distances) -> dict:
+    """A standings row as served by /progress and the live update stream"""
+    return {
+        "team_id": str(row.team_id),
+        "team_name": row.team_name,
+        "stars": row.stars,
+        "coins": row.coins,
+        "current_tile": row.current_tile_id,
+        "current_region": row.region_name or "Unknown",
+        "tile_completed": row.tile_completed,
+        "star_distance": distances.nearest(row.current_tile_id, graph.star_tiles)[1],
+        "rank": row.rank
+    }
+
+def mark_standings_dirty(event_id: Optional[uuid.UUID], session=None) -> None:
+    """Refresh an event's standings once the current transaction has committed"""
+    if event_id is None:
+        return
+    session = session if session is not None else db.session
+    session.info.setdefault("standings_dirty", set()).add(event_id)
+
+def _on_team_changed(mapper, connection, target) -> None:
+    mark_standings_dirty(target.event_id, object_session(target))
+
+def _on_team_updated(mapper, connection, target) -> None:
+    state = inspect(target)
+    if state.attrs.data.history.has_changes() or state.attrs.name.history.has_changes():
+        _on_team_changed(mapper, connection, target)
+    if state.attrs.event_id.history.has_changes():
+        # Also drop the team from the event it left
+        for event_id in state.attrs.event_id.history.deleted:
+            mark_standings_dirty(event_id, object_session(target))
+        _on_team_changed(mapper, connection, target)
+
+def _on_board_renamed(mapper, connection, target) -> None:
+    if inspect(target).attrs.name.history.has_changes():
+        mark_standings_dirty(target.event_id, object_session(target))
+
+def _after_commit(session) -> None:
+    # Only the outermost commit fires this; the flush it made has run the mapper events
+    event_ids = session.info.pop("standings_dirty", None)
+    if event_ids:
+        request_standings_refresh(event_ids)
+
+def _on_rollback(session) -> None:
+    session.info.pop("standings_dirty", None)
+
+sa_event.listen(EventTeams, "after_insert", _on_team_changed)
+sa_event.listen(EventTeams, "after_update", _on_team_updated)
+sa_event.listen(EventTeams, "after_delete", _on_team_changed)
+sa_event.listen(SP3EventTiles, "after_update", _on_board_renamed)
+sa_event.listen(SP3Regions, "after_update", _on_board_renamed)
+sa_event.listen(db.session, "after_commit", _after_commit)
+sa_event.listen(db.session, "after_rollback", _on_rollback)
@@ -0,0 +1,43 @@
+"""
+Moving a star after it's bought
+
+Shared by buying a star on the board and through a Genie Lamp. The new tile is
+drawn from the board graph's precomputed placement pools (no docks or shops) of
+regions no team is on, skipping tiles that already hold a star.
+"""
+
+import uuid
+import logging
+from typing import Optional
+
+from sqlalchemy.orm.attributes import flag_modified
+
+from models.models import Events
+from event_handlers.stability_party.board_graph import TileNode, get_board_graph
+from event_handlers.stability_party.occupancy_index import get_region_occupancy
+
+def move_star(event_id: uuid.UUID, old_star_tile_id) -> Optional[tuple[TileNode, TileNode]]:
+    """
+    Move the star on old_star_tile_id to a new tile (the caller commits)
+
+    Returns:
+        (old star tile, new star tile), or None if there's nowhere to put it
+    """
+    # Lock the event row; two teams buying stars at once would otherwise overwrite star_tiles
+    event = Events.query.filter_by(id=event_id).with_for_update().populate_existing().first()
+    star_tiles = list(event.data.get("star_tiles", []))
+
+    graph = get_board_graph(event_id)
+    occupied = get_region_occupancy(event_id).regions.keys()
+    new_star_tile = graph.random_star_candidate(blocked_regions=occupied, blocked_tiles=frozenset(star_tiles))
+    if new_star_tile is None:
+        logging.error(f"No valid tiles available for star placement in event {event_id}")
+        return None
+
+    if str(old_star_tile_id) in star_tiles:
+        star_tiles.remove(str(old_star_tile_id))
+    star_tiles.append(str(new_star_tile.id))
+    event.data["star_tiles"] = star_tiles
+    flag_modified(event, "data")
+    logging.info(f"Star moved from tile {old_star_tile_id} to {new_star_tile.name} (ID: {new_star_tile.id})")
+    return graph.tile(old_star_tile_id), new_star_tile
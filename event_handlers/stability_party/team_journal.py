@@ -0,0 +1,173 @@
+"""
+Append-only journal of team state changes, with periodic snapshots
+
+Every save_team_data appends one sp3_team_journal row holding just what changed:
+the top-level team.data fields that were written (or the whole document for a
+full write) and the challenge progress seeds/increments/resets. Full snapshots
+of team.data plus progress are stored in sp3_team_snapshots:
+- "baseline" before a team's first journaled change
+- "periodic" every TEAM_SNAPSHOT_EVERY entries, so a rebuild replays at most that many
+- "pre_roll" right before a roll starts, which is what undo-roll restores
+
+rebuild_team_state() loads the nearest snapshot at or before a journal entry and
+replays the entries after it.
+"""
+
+import os
+import copy
+import logging
+from typing import Optional
+
+from flask import has_request_context, request
+from sqlalchemy import func
+from sqlalchemy.orm.attributes import flag_modified
+
+from app import db
+from models.models import EventTeams
+from models.stability_party_3 import SP3TeamJournal, SP3TeamSnapshots
+from event_handlers.stability_party.challenge_progress import ChallengeProgress, replace_team_progress
+
+TEAM_SNAPSHOT_EVERY = int(os.getenv("TEAM_SNAPSHOT_EVERY", "50"))
+
+def _current_action(action: Optional[str]) -> str:
+    if action:
+        return action
+    # Set by atomic_team_update to the name of the outermost wrapped function
+    if db.session.info.get("team_action"):
+        return db.session.info["team_action"]
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return "save_team_data"
+
+def _last_journal_id(team_id) -> int:
+    return db.session.query(func.coalesce(func.max(SP3TeamJournal.id), 0)).filter(SP3TeamJournal.team_id == team_id).scalar()
+
+def latest_snapshot(team_id, up_to_journal_id: Optional[int] = None, reason: Optional[str] = None) -> Optional[SP3TeamSnapshots]:
+    query = SP3TeamSnapshots.query.filter(SP3TeamSnapshots.team_id == team_id)
+    if up_to_journal_id is not None:
+        query = query.filter(SP3TeamSnapshots.journal_id <= up_to_journal_id)
+    if reason is not None:
+        query = query.filter(SP3TeamSnapshots.reason == reason)
+    return query.order_by(SP3TeamSnapshots.journal_id.desc(), SP3TeamSnapshots.created_at.desc()).first()
+
+def take_team_snapshot(team: EventTeams, reason: str, journal_id: Optional[int] = None) -> SP3TeamSnapshots:
+    """Store the team's current state (team.data and progress as seen by this transaction)"""
+    snapshot = SP3TeamSnapshots(
+        team_id=team.id,
+        journal_id=journal_id if journal_id is not None else _last_journal_id(team.id),
+        reason=reason,
+        data=copy.deepcopy(team.data or {}),
+        progress=ChallengeProgress.load(team.id).to_dict()
+    )
+    db.session.add(snapshot)
+    db.session.flush()
+    return snapshot
+
+def begin_team_change(team: EventTeams) -> int:
+    """
+    Call before a team's state is written
+
+    Returns:
+        The journal ID covered by the team's latest snapshot, taking a
+        baseline snapshot of the current state if the team has none yet
+    """
+    snapshot_journal_id = db.session.query(func.max(SP3TeamSnapshots.journal_id)).filter(SP3TeamSnapshots.team_id == team.id).scalar()
+    if snapshot_journal_id is None:
+        snapshot_journal_id = take_team_snapshot(team, "baseline").journal_id
+    return snapshot_journal_id
+
+def record_team_change(team: EventTeams, data: dict, full: bool, progress: dict, snapshot_journal_id: int, action: Optional[str] = None) -> SP3TeamJournal:
+    """Append a journal entry for a write that has just been made, snapshotting every TEAM_SNAPSHOT_EVERY entries"""
+    entry = SP3TeamJournal(
+        team_id=team.id,
+        event_id=team.event_id,
+        action=_current_action(action),
+        data=copy.deepcopy(data),
+        full=full,
+        progress=progress or None
+    )
+    db.session.add(entry)
+    db.session.flush()
+
+    since_snapshot = db.session.query(func.count(SP3TeamJournal.id)).filter(
+        SP3TeamJournal.team_id == team.id,
+        SP3TeamJournal.id > snapshot_journal_id
+    ).scalar()
+    if since_snapshot >= TEAM_SNAPSHOT_EVERY:
+        take_team_snapshot(team, "periodic", entry.id)
+    return entry
+
+def _apply_progress(progress: dict, changes: dict) -> None:
+    if "replace" in changes:
+        progress.clear()
+        progress.update(copy.deepcopy(changes["replace"]))
+    for challenge_id, tasks in changes.get("seed", {}).items():
+        for task_id, value in tasks.items():
+            progress.setdefault(challenge_id, {}).setdefault(task_id, value)
+    for challenge_id, tasks in changes.get("add", {}).items():
+        for task_id, value in tasks.items():
+            challenge = progress.setdefault(challenge_id, {})
+            challenge[task_id] = challenge.get(task_id, 0) + value
+    for challenge_id, tasks in changes.get("set", {}).items():
+        for task_id, value in tasks.items():
+            progress.setdefault(challenge_id, {})[task_id] = value
+
+def rebuild_team_state(team_id, up_to_journal_id: Optional[int] = None) -> tuple[dict, dict] | None:
+    """
+    Rebuild a team's state as of a journal entry (the latest by default)
+
+    Returns:
+        (team.data, progress), or None if the team has no snapshot to start from
+    """
+    snapshot = latest_snapshot(team_id, up_to_journal_id)
+    if snapshot is None:
+        return None
+
+    data = copy.deepcopy(snapshot.data)
+    progress = copy.deepcopy(snapshot.progress)
+    entries = SP3TeamJournal.query.filter(SP3TeamJournal.team_id == team_id, SP3TeamJournal.id > snapshot.journal_id)
+    if up_to_journal_id is not None:
+        entries = entries.filter(SP3TeamJournal.id <= up_to_journal_id)
+    for entry in entries.order_by(SP3TeamJournal.id).all():
+        if entry.full:
+            data = copy.deepcopy(entry.data)
+        else:
+            data.update(copy.deepcopy(entry.data))
+        if entry.progress:
+            _apply_progress(progress, entry.progress)
+    return data, progress
+
+def restore_team_snapshot(team: EventTeams, snapshot: SP3TeamSnapshots, action: str) -> SP3TeamJournal:
+    """Put a team back to a snapshot's state, journaling the restore as a full write"""
+    team.data = copy.deepcopy(snapshot.data)
+    flag_modified(team, "data")
+    replace_team_progress(team.id, snapshot.progress)
+    db.session.flush()
+
+    entry = SP3TeamJournal(
+        team_id=team.id,
+        event_id=team.event_id,
+        action=action,
+        data=copy.deepcopy(snapshot.data),
+        full=True,
+        progress={"replace": copy.deepcopy(snapshot.progress)}
+    )
+    db.session.add(entry)
+    db.session.flush()
+    take_team_snapshot(team, "undo", entry.id)
+    return entry
+
+def undo_last_roll(team: EventTeams) -> Optional[SP3TeamSnapshots]:
+    """
+    Restore a (locked) team to its state right before its last roll started
+
+    The used snapshot is marked "pre_roll_undone", so undoing again steps back
+    one more roll. Returns the snapshot restored, or None if there's no roll to undo.
+    """
+    snapshot = latest_snapshot(team.id, reason="pre_roll")
+    if snapshot is None:
+        return None
+    restore_team_snapshot(team, snapshot, "undo_roll")
+    snapshot.reason = "pre_roll_undone"
+    logging.info(f"Restored team {team.id} to its state before journal entry {snapshot.journal_id + 1}")
+    return snapshot
@@ -0,0 +1,249 @@
+"""
+Compiled trigger index for Stability Party 3
+
+Every Dink drop posted to /events/submit used to walk region challenge ->
+task -> trigger rows one query at a time before it could tell whether the
+drop mattered. This module loads an event's board definitions once (JOINs
+over the link tables in definition_links.py) and compiles them into:
+- A (trigger, source) lookup that maps straight to the challenge/task pairs a
+  submission progresses (an empty trigger source still matches any source)
+- Region -> challenge and tile -> challenge mapping tables
+- Read-only copies of every challenge, task and trigger reachable from the
+  board, keyed by ID, so progress logic and progress rendering (including the
+  task descriptions shown to players) run without queries
+
+Indexes are cached per event and rebuilt when invalidated or once they reach
+TRIGGER_INDEX_MAX_AGE_SECONDS, so board edits made directly in the database
+are still picked up.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app import db
+from models.stability_party_3 import SP3Regions, SP3EventTiles, SP3EventTileChallengeMapping
+from event_handlers.stability_party.definition_links import canonical_ids, load_challenge_tree
+
+TRIGGER_INDEX_MAX_AGE_SECONDS = int(os.getenv("TRIGGER_INDEX_MAX_AGE_SECONDS", "300"))
+
+class ChallengeDefinition:
+    """Read-only copy of an EventChallenges row"""
+
+    def __init__(self, id: uuid.UUID, type: str, value: int, tasks: List[str]) -> None:
+        self.id = id
+        self.type = type
+        self.value = value
+        self.tasks = tasks
+
+class TaskDefinition:
+    """Read-only copy of an EventTasks row"""
+
+    def __init__(self, id: uuid.UUID, quantity: int, value: int, triggers: List[str]) -> None:
+        self.id = id
+        self.quantity = quantity
+        self.value = value
+        self.triggers = triggers
+
+class TileChallenge:
+    """Read-only copy of an SP3EventTileChallengeMapping row"""
+
+    def __init__(self, tile_id: uuid.UUID, challenge_id: uuid.UUID, type: str, data: dict | None) -> None:
+        self.tile_id = tile_id
+        self.challenge_id = challenge_id
+        self.type = type
+        self.data = data
+
+def normalize_trigger_key(trigger: str | None, source: str | None) -> Tuple[str, str]:
+    """Normalize a trigger/source pair the same way the handler compares them"""
+    return (trigger.lower() if trigger else "", source.lower() if source else "")
+
+class TriggerIndex:
+    def __init__(
+        self,
+        event_id: uuid.UUID,
+        challenges: Dict[str, ChallengeDefinition],
+        tasks: Dict[str, TaskDefinition],
+        region_challenges: Dict[str, List[str]],
+        tile_challenges: Dict[str, List[TileChallenge]],
+        matches: Dict[Tuple[str, str], Dict[str, frozenset]],
+        trigger_labels: Dict[str, str] | None = None
+    ) -> None:
+        self.event_id = event_id
+        self.challenges = challenges
+        self.tasks = tasks
+        self.region_challenges = region_challenges
+        self.tile_challenges = tile_challenges
+        self.challenge_mappings: Dict[str, TileChallenge] = {}
+        for mappings in tile_challenges.values():
+            for mapping in mappings:
+                self.challenge_mappings.setdefault(str(mapping.challenge_id), mapping)
+        self._matches = matches
+        # {trigger ID: display label}
+        self.trigger_labels = trigger_labels or {}
+        self.fingerprint = self._fingerprint()
+        self.built_at = time.monotonic()
+
+    def _fingerprint(self) -> str:
+        """Same definitions give the same fingerprint in every process, e.g. for ETags"""
+        content = (
+            [(key, challenge.type, challenge.value, challenge.tasks) for key, challenge in sorted(self.challenges.items())],
+            [(key, task.quantity, task.value, task.triggers) for key, task in sorted(self.tasks.items())],
+            sorted(self.region_challenges.items()),
+            [
+                (key, [(str(mapping.challenge_id), mapping.type, json.dumps(mapping.data, sort_keys=True, default=str)) for mapping in mappings])
+                for key, mappings in sorted(self.tile_challenges.items())
+            ],
+            sorted(self.trigger_labels.items()),
+            sorted((key, sorted((challenge_id, sorted(task_ids)) for challenge_id, task_ids in by_challenge.items())) for key, by_challenge in self._matches.items())
+        )
+        return hashlib.sha1(repr(content).encode()).hexdigest()[:16]
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.built_at > TRIGGER_INDEX_MAX_AGE_SECONDS
+
+    def match(self, trigger: str | None, source: str | None) -> Dict[str, frozenset]:
+        """
+        Find the challenge/task pairs a submission progresses
+
+        Returns:
+            Mapping of challenge ID to the set of matching task IDs (empty if the drop is irrelevant)
+        """
+        trigger_key, source_key = normalize_trigger_key(trigger, source)
+        exact = self._matches.get((trigger_key, source_key))
+        wildcard = self._matches.get((trigger_key, "")) if source_key else None
+        if not wildcard:
+            return exact or {}
+        if not exact:
+            return wildcard
+
+        merged = dict(exact)
+        for challenge_id, task_ids in wildcard.items():
+            merged[challenge_id] = merged.get(challenge_id, frozenset()) | task_ids
+        return merged
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """Every normalized (trigger, source) pair that progresses something on this board"""
+        return list(self._matches.keys())
+
+    def get_region_challenges(self, region_id) -> List[str]:
+        return self.region_challenges.get(str(region_id), []) if region_id else []
+
+    def task_label(self, task: TaskDefinition) -> str:
+        """How a task's triggers are shown to players ("<label> OR <label> ...")"""
+        return " OR ".join(self.trigger_labels[trigger_id] for trigger_id in task.triggers if trigger_id in self.trigger_labels)
+
+    def get_tile_challenges(self, tile_id) -> List[TileChallenge]:
+        return self.tile_challenges.get(str(tile_id), []) if tile_id else []
+
+def trigger_label(trigger: str, source: str | None, type: str) -> str | None:
+    """How a trigger is shown in task descriptions ("<trigger> from <source>" or "<trigger> KC")"""
+    if type == "DROP":
+        return f"{trigger}{" from " + source if source else ""}"
+    if type == "KC":
+        return f"{trigger} KC"
+    return None
+
+def compile_trigger_index(event_id: uuid.UUID, regions: list, mappings: list, challenge_rows: list, task_rows: list, trigger_rows: list) -> TriggerIndex:
+    """Compile board definition rows (models, or anything with the same attributes) into a TriggerIndex"""
+    region_challenges: Dict[str, List[str]] = {}
+    for region in regions:
+        region_challenges[str(region.id)] = canonical_ids(region.challenges)
+
+    tile_challenges: Dict[str, List[TileChallenge]] = {}
+    for mapping in mappings:
+        tile_challenges.setdefault(str(mapping.tile_id), []).append(
+            TileChallenge(mapping.tile_id, mapping.challenge_id, mapping.type, mapping.data)
+        )
+
+    challenges: Dict[str, ChallengeDefinition] = {
+        str(row.id): ChallengeDefinition(row.id, row.type, row.value, canonical_ids(row.tasks)) for row in challenge_rows
+    }
+    tasks: Dict[str, TaskDefinition] = {
+        str(row.id): TaskDefinition(row.id, row.quantity, row.value, canonical_ids(row.triggers)) for row in task_rows
+    }
+    trigger_keys: Dict[str, Tuple[str, str]] = {}
+    trigger_labels: Dict[str, str] = {}
+    for row in trigger_rows:
+        trigger_keys[str(row.id)] = normalize_trigger_key(row.trigger, row.source)
+        label = trigger_label(row.trigger, row.source, row.type)
+        if label is not None:
+            trigger_labels[str(row.id)] = label
+
+    # Compile (trigger, source) -> {challenge_id: {task_id, ...}}
+    compiled: Dict[Tuple[str, str], Dict[str, set]] = {}
+    for challenge_id, challenge in challenges.items():
+        for task_id in challenge.tasks:
+            task = tasks.get(task_id)
+            if task is None:
+                continue
+            for trigger_id in task.triggers:
+                key = trigger_keys.get(trigger_id)
+                if key is None:
+                    continue
+                compiled.setdefault(key, {}).setdefault(challenge_id, set()).add(task_id)
+
+    matches = {
+        key: {challenge_id: frozenset(task_set) for challenge_id, task_set in by_challenge.items()}
+        for key, by_challenge in compiled.items()
+    }
+
+    return TriggerIndex(event_id, challenges, tasks, region_challenges, tile_challenges, matches, trigger_labels)
+
+def build_trigger_index(event_id: uuid.UUID) -> TriggerIndex:
+    """Load an event's board definitions (challenges, tasks and triggers in one JOIN query) and compile them"""
+    started = time.perf_counter()
+
+    # The region arrays are read directly; the links would give the same IDs with a join
+    regions = db.session.query(SP3Regions.id, SP3Regions.challenges).filter(SP3Regions.event_id == event_id).all()
+
+    mappings = db.session.query(SP3EventTileChallengeMapping).join(
+        SP3EventTiles, SP3EventTiles.id == SP3EventTileChallengeMapping.tile_id
+    ).filter(SP3EventTiles.event_id == event_id).all()
+
+    challenge_ids = {challenge_id for region in regions for challenge_id in canonical_ids(region.challenges)}
+    challenge_ids.update(str(mapping.challenge_id) for mapping in mappings)
+    challenge_rows, task_rows, trigger_rows = load_challenge_tree(challenge_ids)
+
+    index = compile_trigger_index(event_id, regions, mappings, challenge_rows, task_rows, trigger_rows)
+    logging.info(
+        f"Built trigger index for event {event_id}: {len(index.challenges)} challenges, {len(index.tasks)} tasks, "
+        f"{len(index._matches)} trigger keys in {(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    return index
+
+_indexes: Dict[str, TriggerIndex] = {}
+_lock = threading.Lock()
+
+def get_trigger_index(event_id: uuid.UUID) -> TriggerIndex:
+    """Get the compiled trigger index for an event, building it on first use"""
+    key = str(event_id)
+    index = _indexes.get(key)
+    if index is not None and not index.is_stale():
+        return index
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or index.is_stale():
+            index = build_trigger_index(event_id)
+            _indexes[key] = index
+    return index
+
+def pin_trigger_index(index: TriggerIndex) -> None:
+    """Cache an index built elsewhere (e.g. from a board document) for its event; it never goes stale"""
+    index.built_at = float("inf")
+    with _lock:
+        _indexes[str(index.event_id)] = index
+
+def invalidate_trigger_index(event_id: Optional[uuid.UUID] = None) -> None:
+    """Drop the cached index for an event (or every event) after its board definitions change"""
+    with _lock:
+        if event_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(str(event_id), None)
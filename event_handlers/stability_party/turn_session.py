@@ -0,0 +1,95 @@
+"""
+Per-team turn sessions for multi-step rolls
+
+A single turn is several requests (/roll, then /roll/crossroad, /roll/shop,
+/roll/dock, ...), each of which used to look the event up, load the team's
+JSONB data, load its challenge progress and rebuild SaveData from scratch.
+
+After a step commits with the team still mid-turn, the parsed SaveData is kept
+here together with the team's version (EventTeams.version, bumped by every
+write to the team). The next step still locks the team row, but without the
+data column; if the version is unchanged nobody else has written the team
+since, and the kept SaveData is used as is. Any other write (an item used, a
+submission completing a challenge, a moderator edit) bumps the version and the
+step loads the team normally.
+
+A session is taken out of the cache when a step starts and only put back once
+that step has committed, so a step that fails or rolls back never leaves a
+half-updated SaveData behind. Challenge progress rows aren't versioned; steps
+of a roll only ever reset progress to absolute values, so the kept progress
+can't overwrite anything a submission added in between. Sessions expire after
+TURN_SESSION_MAX_AGE_SECONDS.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models.models import EventTeams
+from event_handlers.stability_party.save_data import SaveData, lock_team, run_after_commit
+
+TURN_SESSION_MAX_AGE_SECONDS = int(os.getenv("TURN_SESSION_MAX_AGE_SECONDS", "120"))
+
+class TurnSession:
+    def __init__(self, event_id: uuid.UUID, team_id: uuid.UUID, version: int, data: dict, save: SaveData) -> None:
+        self.event_id = event_id
+        self.team_id = team_id
+        self.version = version
+        self.data = data
+        self.save = save
+        self.stored_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.stored_at > TURN_SESSION_MAX_AGE_SECONDS
+
+_sessions: Dict[str, TurnSession] = {}
+_lock = threading.Lock()
+
+def resume_turn_session(event_id: uuid.UUID, team_id: uuid.UUID) -> Optional[tuple[EventTeams, SaveData]]:
+    """
+    Lock a team and pick up its turn where the last step left it
+
+    Returns:
+        (locked team, SaveData) if the team hasn't changed since its last
+        step, otherwise None and the caller loads the team itself
+    """
+    with _lock:
+        session = _sessions.pop(str(team_id), None)
+    if session is None or session.is_stale() or str(session.event_id) != str(event_id):
+        return None
+
+    team = lock_team(team_id, event_id, defer_data=True)
+    if team is None or team.version != session.version:
+        logging.debug(f"Turn session for team {team_id} is out of date; loading the team")
+        return None
+
+    # The row is exactly what the session was stored from
+    set_committed_value(team, "data", session.data)
+    return team, session.save
+
+def store_turn_session(team: EventTeams, save: SaveData) -> None:
+    """Keep a team's state for its next step once the current step commits (mid-turn only)"""
+    if not save.isRolling:
+        return
+    if getattr(save, "_loaded", None) != team.data:
+        # Something else in this step (e.g. an item grant) wrote fields this SaveData doesn't hold
+        return
+    session = TurnSession(team.event_id, team.id, team.version, team.data, save)
+    run_after_commit(_put_session, session)
+
+def _put_session(session: TurnSession) -> None:
+    with _lock:
+        _sessions[str(session.team_id)] = session
+
+def invalidate_turn_session(team_id: Optional[uuid.UUID] = None) -> None:
+    """Drop a team's (or every team's) turn session"""
+    with _lock:
+        if team_id is None:
+            _sessions.clear()
+        else:
+            _sessions.pop(str(team_id), None)
@@ -0,0 +1,170 @@
+"""
+Duplicate suppression for /events/submit
+
+Dink retries a submission when our response times out, and every retry used to
+count the drop again. A submission is deduplicated on an idempotency key, kept
+for SUBMISSION_IDEMPOTENCY_TTL_SECONDS:
+- The Idempotency-Key header, or an "idempotencyKey" field in the payload
+- Otherwise, if the client sent a field that identifies the drop (DROP_ID_FIELDS,
+  e.g. Dink's timestamp), a hash of the submission fields and that field
+
+A submission with neither isn't deduplicated: two identical drops (two of the
+same item from the same monster) are both real, and nothing in their fields
+tells them apart from a retry.
+
+A key is claimed before any handler runs. Claims are checked against a bounded
+in-process LRU first and then recorded in submission_idempotency_keys with one
+INSERT ... ON CONFLICT statement, so retries landing on another worker or
+process are caught too. A repeat of a live key is dropped. If the database
+can't be reached the submission is let through rather than lost.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from app import db
+from event_handlers.event_handler import EventSubmission
+
+SUBMISSION_IDEMPOTENCY_TTL_SECONDS = int(os.getenv("SUBMISSION_IDEMPOTENCY_TTL_SECONDS", "86400"))
+SUBMISSION_DEDUPE_CACHE_SIZE = int(os.getenv("SUBMISSION_DEDUPE_CACHE_SIZE", "10000"))
+# Payload fields a client sets once per drop (and repeats on retries), in order of preference
+DROP_ID_FIELDS = ("dropId", "timestamp")
+# Expired rows are purged every this many claims
+SUBMISSION_DEDUPE_PURGE_EVERY = 500
+
+_CLAIM_SQL = text("""
+    INSERT INTO submission_idempotency_keys (key, created_at, expires_at)
+    VALUES (:key, :now, :expires_at)
+    ON CONFLICT (key) DO UPDATE
+        SET created_at = EXCLUDED.created_at, expires_at = EXCLUDED.expires_at
+        WHERE submission_idempotency_keys.expires_at <= EXCLUDED.created_at
+    RETURNING key
+""")
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def get_idempotency_key(data: dict, header_key: Optional[str] = None) -> Optional[tuple[str, int]]:
+    """
+    Work out the idempotency key for a submission payload
+
+    Returns:
+        (key, ttl_seconds), or None if the submission can't be told apart from
+        an identical drop and mustn't be deduplicated
+    """
+    explicit = header_key or data.get("idempotencyKey")
+    if explicit:
+        return f"key:{explicit}", SUBMISSION_IDEMPOTENCY_TTL_SECONDS
+
+    drop_id = next((data[field] for field in DROP_ID_FIELDS if data.get(field)), None)
+    if drop_id is None:
+        return None
+
+    submission = EventSubmission.from_dict(data)
+    fields = [submission.rsn, submission.id, submission.trigger, submission.source, submission.quantity, submission.totalValue, submission.type, drop_id]
+    digest = hashlib.sha256("\x1f".join("" if field is None else str(field) for field in fields).encode("utf-8")).hexdigest()
+    return f"hash:{digest}", SUBMISSION_IDEMPOTENCY_TTL_SECONDS
+
+class SubmissionDeduplicator:
+    def __init__(self, cache_size: int) -> None:
+        self.cache_size = cache_size
+        self._recent: OrderedDict[str, datetime] = OrderedDict()
+        self._lock = threading.Lock()
+        self._claims = 0
+        self.accepted = 0
+        self.duplicates = 0
+
+    def _remember(self, key: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._recent[key] = expires_at
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.cache_size:
+                self._recent.popitem(last=False)
+
+    def _seen_recently(self, key: str, now: datetime) -> bool:
+        with self._lock:
+            expires_at = self._recent.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._recent[key]
+                return False
+            self._recent.move_to_end(key)
+            return True
+
+    def _count(self, duplicate: bool) -> None:
+        with self._lock:
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.accepted += 1
+
+    def claim(self, key: str, ttl_seconds: int) -> bool:
+        """
+        Claim an idempotency key
+
+        Returns:
+            True if this is the first live submission with the key, False if it is a duplicate
+        """
+        now = _utcnow()
+        if self._seen_recently(key, now):
+            self._count(True)
+            return False
+
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        try:
+            claimed = db.session.execute(_CLAIM_SQL, {"key": key, "now": now, "expires_at": expires_at}).first() is not None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error claiming submission idempotency key, letting the submission through: {e}")
+            claimed = True
+
+        # Either way the key is live now; remember it so the next retry is caught without a query
+        self._remember(key, expires_at)
+        self._count(not claimed)
+        if claimed:
+            self._maybe_purge(now)
+        return claimed
+
+    def release(self, key: str) -> None:
+        """Forget a claimed key, so a retry of a submission that failed to process is accepted"""
+        with self._lock:
+            self._recent.pop(key, None)
+        try:
+            # The failed handler may have left the session mid-transaction
+            db.session.rollback()
+            db.session.execute(text("DELETE FROM submission_idempotency_keys WHERE key = :key"), {"key": key})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error releasing submission idempotency key {key}: {e}")
+
+    def _maybe_purge(self, now: datetime) -> None:
+        with self._lock:
+            self._claims += 1
+            if self._claims % SUBMISSION_DEDUPE_PURGE_EVERY != 0:
+                return
+        try:
+            db.session.execute(text("DELETE FROM submission_idempotency_keys WHERE expires_at <= :now"), {"now": now})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error purging expired submission idempotency keys: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "duplicates": self.duplicates,
+                "cached": len(self._recent),
+            }
+
+submission_deduplicator = SubmissionDeduplicator(SUBMISSION_DEDUPE_CACHE_SIZE)
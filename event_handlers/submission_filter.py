@@ -0,0 +1,173 @@
+"""
+Whitelist-driven pre-filter for /events/submit
+
+Dink posts every notable drop a clan member gets, and almost none of them are
+event triggers. Rather than running every registered handler (and their
+queries) for each one, /events/submit checks the submission against an
+in-memory copy of the same trigger set served by /events/whitelist:
+- DROP triggers match on (trigger, source); a trigger without a source matches any source
+- KC triggers match on the trigger name alone
+- Handlers can register static triggers that don't live in the database
+
+The set is versioned and rebuilt every SUBMISSION_FILTER_REFRESH_SECONDS, or
+straight away after trigger rows or mappings change in this process. If the
+set can't be built the filter lets everything through rather than dropping
+real submissions.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import event as sa_event
+
+from app import db
+from models.models import Events, EventTriggers, EventTriggerMappings
+from event_handlers.event_handler import EventSubmission
+from event_handlers.stability_party.trigger_index import normalize_trigger_key, get_trigger_index
+
+SUBMISSION_FILTER_REFRESH_SECONDS = int(os.getenv("SUBMISSION_FILTER_REFRESH_SECONDS", "60"))
+
+def _load_running_triggers(now: datetime) -> Tuple[List[Events], List[EventTriggers]]:
+    # Currently running events and events starting in the next 24 hours
+    next_24_hours = now + timedelta(hours=24)
+    running_events = Events.query.filter(Events.start_time <= next_24_hours).filter(now < Events.end_time).all()
+    if not running_events:
+        return [], []
+
+    event_ids = [event.id for event in running_events]
+    trigger_mappings = EventTriggerMappings.query.filter(EventTriggerMappings.event_id.in_(event_ids)).all()
+    trigger_ids = [mapping.trigger_id for mapping in trigger_mappings]
+    triggers = EventTriggers.query.filter(EventTriggers.id.in_(trigger_ids)).all()
+    return running_events, triggers
+
+def load_whitelist(now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Build the trigger whitelist for events that are running or start in the next 24 hours
+
+    Returns:
+        Dict with "triggers", "killCountTriggers" and "messageFilters", or None if there are no such events
+    """
+    running_events, triggers = _load_running_triggers(now or datetime.now(timezone.utc))
+    if not running_events:
+        return None
+
+    triggerSet = set()
+    messageFilterSet = set()
+    killCountTriggerSet = set()
+
+    for trigger in triggers:
+        if trigger.type == "DROP":
+            # Construct the key based on trigger and source
+            triggerSet.add(f"{trigger.trigger}:{trigger.source}" if trigger.source else f"{trigger.trigger}")
+        elif trigger.type == "KC":
+            killCountTriggerSet.add(trigger.trigger)
+        else:
+            logging.warning(f"Unknown trigger type: {trigger.type}")
+            pass
+
+    return {
+        "triggers": list(triggerSet),
+        "killCountTriggers": list(killCountTriggerSet),
+        "messageFilters": list(messageFilterSet),
+    }
+
+class SubmissionFilter:
+    def __init__(self) -> None:
+        self.version = 0
+        self._keys: Set[Tuple[str, str]] = set()
+        self._static_keys: Set[Tuple[str, str]] = set()
+        self._loaded_at: Optional[float] = None
+        self._fail_open = True
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.passed = 0
+        self.rejected = 0
+
+    def register_static_trigger(self, trigger: str, source: str | None = None) -> None:
+        """Always let a (trigger, source) pair through, for handlers that don't use database triggers"""
+        self._static_keys.add(normalize_trigger_key(trigger, source))
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _needs_refresh(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > SUBMISSION_FILTER_REFRESH_SECONDS
+
+    def refresh(self) -> None:
+        keys: Set[Tuple[str, str]] = set()
+        try:
+            running_events, triggers = _load_running_triggers(datetime.now(timezone.utc))
+            for trigger in triggers:
+                if trigger.type == "DROP":
+                    keys.add(normalize_trigger_key(trigger.trigger, trigger.source))
+                elif trigger.type == "KC":
+                    keys.add(normalize_trigger_key(trigger.trigger, None))
+            # Board triggers aren't required to have a whitelist mapping, so fold in
+            # everything the Stability Party trigger index would match as well
+            for event in running_events:
+                if event.type == "STABILITY_PARTY":
+                    keys.update(get_trigger_index(event.id).keys())
+            self._fail_open = False
+        except Exception as e:
+            logging.error(f"Error building submission filter, letting all submissions through: {e}")
+            db.session.rollback()
+            self._fail_open = True
+
+        if keys != self._keys:
+            self.version += 1
+            logging.info(f"Submission filter rebuilt (version {self.version}, {len(keys)} trigger keys)")
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self) -> None:
+        if not self._needs_refresh():
+            return
+        with self._lock:
+            if self._needs_refresh():
+                self.refresh()
+
+    def allows(self, submission: EventSubmission) -> bool:
+        """Check whether any handler could care about a submission"""
+        self._ensure_fresh()
+        trigger, source = normalize_trigger_key(submission.trigger, submission.source)
+        allowed = (
+            self._fail_open
+            or (trigger, source) in self._keys
+            or (trigger, "") in self._keys
+            or (trigger, source) in self._static_keys
+            or (trigger, "") in self._static_keys
+        )
+        with self._stats_lock:
+            if allowed:
+                self.passed += 1
+            else:
+                self.rejected += 1
+        return allowed
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            total = self.passed + self.rejected
+            return {
+                "version": self.version,
+                "triggerKeys": len(self._keys) + len(self._static_keys),
+                "failOpen": self._fail_open,
+                "passed": self.passed,
+                "rejected": self.rejected,
+                "rejectRate": self.rejected / total if total else 0.0,
+            }
+
+submission_filter = SubmissionFilter()
+
+def invalidate_submission_filter() -> None:
+    submission_filter.invalidate()
+
+def _on_triggers_changed(mapper, connection, target) -> None:
+    submission_filter.invalidate()
+
+for _model in (EventTriggers, EventTriggerMappings):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        sa_event.listen(_model, _event_name, _on_triggers_changed)
@@ -0,0 +1,355 @@
+"""
+Postgres-backed ingestion queue for /events/submit
+
+With SUBMISSION_INGEST_MODE=async, /events/submit stores the raw payload in
+event_submission_queue and returns 202 straight away, so a slow database or
+Discord never stalls the Dink client. A pool of SUBMISSION_WORKERS threads per
+process drains the queue through EventHandler.handle_event and hands the
+resulting notifications to the Discord bot.
+
+Rows are claimed with FOR UPDATE SKIP LOCKED, so any number of workers across
+any number of processes can share the queue. A row stuck in PROCESSING for
+longer than SUBMISSION_VISIBILITY_TIMEOUT_SECONDS (a worker died mid-way) is
+picked up again, up to SUBMISSION_MAX_ATTEMPTS times before it is marked FAILED.
+
+Retries never apply a submission twice. Each handler call commits its own
+changes, and the commit also writes the call's key ("<handler>:<position>", or
+"<handler>:batch") into the row's `handled` column in the same transaction, so
+the mark exists exactly when the changes do. A retried row skips the marked
+calls and reuses the notifications stored with them; the notifications are
+stored right after the call returns, so a worker dying in between loses that
+call's notifications rather than counting its progress twice.
+
+Once handled, a row with notifications moves to DELIVERING and stays there
+until the bot accepts them. Failed deliveries are retried by the workers with
+exponential backoff from SUBMISSION_DELIVERY_RETRY_SECONDS, without running the
+handlers again, up to SUBMISSION_MAX_DELIVERY_ATTEMPTS times before the row is
+marked FAILED. A delivery claim holds the row for the visibility timeout, so a
+worker dying mid-delivery doesn't lose the notifications either.
+
+PENDING -> PROCESSING -> DONE, or -> DELIVERING -> DONE
+PROCESSING -> PENDING (handler error) -> ... -> FAILED
+DELIVERING -> DELIVERING (delivery error, retried later) -> ... -> FAILED
+
+Delivery goes to the Discord bot (helper.discord_helper.send_event_notifications):
+    POST {DISCORD_BOT_API}/events/notifications
+    {"token": DISCORD_BOT_API_TOKEN, "notifications": [<notification dict>, ...]}
+Each notification dict has the shape /events/submit returns in "notifications"
+(threadId, title, color, description, thumbnailImage, author, fields), and the
+bot posts each one in its threadId. Any 2xx response means the bot took them
+all; anything else (or no answer within 10 seconds) is retried. A retry resends
+the whole list, so the bot should treat a repeat as harmless.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, event as sa_event, func, or_, update
+
+from app import app, db
+from models.models import EventSubmissionQueue
+from event_handlers.event_handler import EventHandler, EventSubmission
+from helper.discord_helper import send_event_notifications
+
+SUBMISSION_INGEST_MODE = os.getenv("SUBMISSION_INGEST_MODE", "sync").lower()
+SUBMISSION_WORKERS = int(os.getenv("SUBMISSION_WORKERS", "2"))
+SUBMISSION_POLL_INTERVAL_SECONDS = float(os.getenv("SUBMISSION_POLL_INTERVAL_SECONDS", "1"))
+SUBMISSION_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("SUBMISSION_VISIBILITY_TIMEOUT_SECONDS", "300"))
+SUBMISSION_MAX_ATTEMPTS = int(os.getenv("SUBMISSION_MAX_ATTEMPTS", "5"))
+SUBMISSION_DELIVERY_RETRY_SECONDS = float(os.getenv("SUBMISSION_DELIVERY_RETRY_SECONDS", "15"))
+SUBMISSION_MAX_DELIVERY_ATTEMPTS = int(os.getenv("SUBMISSION_MAX_DELIVERY_ATTEMPTS", "10"))
+# Upper bound on the wait between two delivery attempts
+MAX_DELIVERY_BACKOFF_SECONDS = 3600
+
+def is_async_ingest_enabled() -> bool:
+    return SUBMISSION_INGEST_MODE == "async"
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class StageTimer:
+    """Running count/mean/max of one processing stage, in milliseconds"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avgMs": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "maxMs": round(self.max_ms, 2),
+        }
+
+class QueueMetrics:
+    STAGES = ("wait", "handle", "deliver", "total")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageTimer] = {stage: StageTimer() for stage in self.STAGES}
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.stages[stage].record(elapsed_ms)
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "processed": self.processed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "stages": {stage: timer.to_dict() for stage, timer in self.stages.items()},
+            }
+
+metrics = QueueMetrics()
+
+def enqueue_submission(payload: dict | list) -> EventSubmissionQueue:
+    """Durably store a submission payload (or an ordered batch of them) for the workers to process"""
+    row = EventSubmissionQueue(payload=payload, status="PENDING", attempts=0, enqueued_at=_utcnow())
+    db.session.add(row)
+    db.session.commit()
+    worker_pool.wake()
+    return row
+
+def claim_next_submission() -> Optional[EventSubmissionQueue]:
+    """Claim the oldest pending submission, one abandoned by a dead worker, or one whose notifications are due a retry"""
+    now = _utcnow()
+    abandoned_before = now - timedelta(seconds=SUBMISSION_VISIBILITY_TIMEOUT_SECONDS)
+    row = EventSubmissionQueue.query.filter(
+        or_(
+            EventSubmissionQueue.status == "PENDING",
+            and_(EventSubmissionQueue.status == "PROCESSING", EventSubmissionQueue.started_at < abandoned_before),
+            and_(EventSubmissionQueue.status == "DELIVERING", EventSubmissionQueue.next_delivery_at <= now)
+        )
+    ).order_by(EventSubmissionQueue.enqueued_at).with_for_update(skip_locked=True).first()
+
+    if row is None:
+        db.session.rollback()
+        return None
+
+    if row.status == "DELIVERING":
+        # Hold the row while delivering; if this worker dies it's retried after the timeout
+        row.next_delivery_at = now + timedelta(seconds=SUBMISSION_VISIBILITY_TIMEOUT_SECONDS)
+        db.session.commit()
+        return row
+
+    if row.status == "PROCESSING":
+        logging.warning(f"Reclaiming submission {row.id} abandoned since {row.started_at}")
+        metrics.increment("retried")
+    row.status = "PROCESSING"
+    row.started_at = now
+    row.attempts += 1
+    db.session.commit()
+    return row
+
+def deliver_notifications(row: EventSubmissionQueue) -> bool:
+    """Send a handled submission's notifications to the bot, scheduling a retry if it doesn't take them"""
+    started = time.perf_counter()
+    delivered = send_event_notifications(row.notifications)
+    metrics.record("deliver", (time.perf_counter() - started) * 1000)
+
+    row.delivery_attempts += 1
+    if delivered:
+        row.status = "DONE"
+        row.delivered_at = _utcnow()
+        row.next_delivery_at = None
+        row.error = None
+    elif row.delivery_attempts >= SUBMISSION_MAX_DELIVERY_ATTEMPTS:
+        logging.error(f"Giving up delivering notifications of submission {row.id} after {row.delivery_attempts} attempts")
+        row.status = "FAILED"
+        row.next_delivery_at = None
+        row.error = "Notification delivery failed"
+        metrics.increment("failed")
+    else:
+        backoff = min(SUBMISSION_DELIVERY_RETRY_SECONDS * 2 ** (row.delivery_attempts - 1), MAX_DELIVERY_BACKOFF_SECONDS)
+        row.next_delivery_at = _utcnow() + timedelta(seconds=backoff)
+        row.error = "Notification delivery failed"
+        metrics.increment("retried")
+    db.session.commit()
+    return delivered
+
+class HandlerProgress:
+    """The handler calls of a queued row that already committed, with their notifications"""
+
+    def __init__(self, row: EventSubmissionQueue) -> None:
+        self.row_id = row.id
+        self.handled: dict = dict(row.handled or {})
+        self.current: Optional[str] = None  # The call running now, marked by its commit
+
+    def run(self, key: str, call):
+        """Run a handler call unless an earlier attempt committed it; returns its notification dicts"""
+        if key in self.handled:
+            logging.info(f"Skipping {key} for queued submission {self.row_id}; it was applied by an earlier attempt")
+            # None: the worker died before the notifications were stored
+            return self.handled[key] or []
+        self.current = key
+        try:
+            result = call()
+        finally:
+            self.current = None
+        if key in self.handled:
+            # Stored with the next mark, or with the row's status
+            self.handled[key] = result
+        return result
+
+def _mark_handled(session) -> None:
+    # Runs for each commit (and savepoint release) of a handler call, in its transaction
+    progress = session.info.get("handler_progress")
+    if progress is None or progress.current is None:
+        return
+    session.execute(
+        update(EventSubmissionQueue)
+        .where(EventSubmissionQueue.id == progress.row_id)
+        .values(handled={**progress.handled, progress.current: None})
+        .execution_options(synchronize_session=False)
+    )
+
+def _handled_committed(session) -> None:
+    progress = session.info.get("handler_progress")
+    if progress is not None and progress.current is not None:
+        progress.handled.setdefault(progress.current, None)
+
+sa_event.listen(db.session, "before_commit", _mark_handled)
+sa_event.listen(db.session, "after_commit", _handled_committed)
+
+def process_submission(row: EventSubmissionQueue) -> None:
+    """Run a claimed submission through the handlers (unless it already was) and deliver its notifications"""
+    if row.status == "DELIVERING":
+        deliver_notifications(row)
+        return
+
+    row_id = row.id
+    attempts = row.attempts
+    metrics.record("wait", (row.started_at - row.enqueued_at).total_seconds() * 1000)
+
+    progress = HandlerProgress(row)
+    started = time.perf_counter()
+    try:
+        db.session.info["handler_progress"] = progress
+        try:
+            if isinstance(row.payload, list):
+                # Enqueued from /events/submit/batch
+                response = EventHandler.handle_batch([EventSubmission.from_dict(item) for item in row.payload], progress)
+            else:
+                response = EventHandler.handle_event(EventSubmission.from_dict(row.payload), progress)
+        finally:
+            db.session.info.pop("handler_progress", None)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error processing queued submission {row_id} (attempt {attempts}): {e}", exc_info=True)
+        row = db.session.get(EventSubmissionQueue, row_id)
+        row.handled = dict(progress.handled)
+        row.error = str(e)
+        if attempts >= SUBMISSION_MAX_ATTEMPTS:
+            row.status = "FAILED"
+            metrics.increment("failed")
+        else:
+            row.status = "PENDING"
+            metrics.increment("retried")
+        db.session.commit()
+        return
+    metrics.record("handle", (time.perf_counter() - started) * 1000)
+
+    row = db.session.get(EventSubmissionQueue, row_id)
+    row.handled = dict(progress.handled)
+    row.notifications = response["notifications"]
+    # The handlers' changes are committed; from here on only the delivery is retried
+    row.status = "DELIVERING" if row.notifications else "DONE"
+    row.error = None
+    row.processed_at = _utcnow()
+    if row.notifications:
+        # Delivered below; if this worker dies first, another one retries after the timeout
+        row.next_delivery_at = row.processed_at + timedelta(seconds=SUBMISSION_VISIBILITY_TIMEOUT_SECONDS)
+    db.session.commit()
+    metrics.increment("processed")
+
+    if row.notifications:
+        deliver_notifications(row)
+
+    metrics.record("total", (_utcnow() - row.enqueued_at).total_seconds() * 1000)
+
+def get_queue_stats() -> dict:
+    """Queue depth and lag (from the database) plus this process's per-stage timings"""
+    depth, oldest = db.session.query(
+        func.count(EventSubmissionQueue.id), func.min(EventSubmissionQueue.enqueued_at)
+    ).filter(EventSubmissionQueue.status == "PENDING").one()
+    processing = EventSubmissionQueue.query.filter(EventSubmissionQueue.status == "PROCESSING").count()
+    delivering = EventSubmissionQueue.query.filter(EventSubmissionQueue.status == "DELIVERING").count()
+
+    return {
+        "mode": SUBMISSION_INGEST_MODE,
+        "workers": worker_pool.size if worker_pool.started else 0,
+        "depth": depth,
+        "processing": processing,
+        "delivering": delivering,
+        "lagSeconds": round((_utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+        **metrics.to_dict(),
+    }
+
+class SubmissionWorkerPool:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.started = False
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.started:
+                return
+            for i in range(self.size):
+                thread = threading.Thread(target=self._run, name=f"submission-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self.started = True
+            logging.info(f"Started {self.size} submission queue workers")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            claimed = False
+            with app.app_context():
+                try:
+                    row = claim_next_submission()
+                    if row is not None:
+                        claimed = True
+                        process_submission(row)
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Submission worker error: {e}", exc_info=True)
+
+            # Keep draining while there's work; otherwise sleep until woken or the next poll
+            if not claimed:
+                self._wake.wait(SUBMISSION_POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+
+worker_pool = SubmissionWorkerPool(SUBMISSION_WORKERS)
+
+def ensure_workers_started() -> None:
+    if is_async_ingest_enabled() and not worker_pool.started:
+        worker_pool.start()
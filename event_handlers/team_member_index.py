@@ -0,0 +1,113 @@
+"""
+In-process RSN / Discord ID -> team index
+
+Every submission has to work out which team the player is on. Instead of an
+ilike query on event_team_member_mappings followed by a second lookup on
+event_teams, each event's member list is loaded once (a single indexed query on
+event_id) into two maps:
+- normalize_rsn(username) -> team_id
+- discord_id -> team_id
+
+The index for an event is dropped whenever member mappings are inserted,
+updated or deleted through the ORM (and again once that change commits), and
+explicitly by endpoints that bulk-delete mappings. As a safety net it is also
+rebuilt once it is older than TEAM_MEMBER_INDEX_MAX_AGE_SECONDS.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import object_session
+
+from app import db
+from models.models import EventTeamMemberMappings
+from helper.helpers import normalize_rsn
+
+TEAM_MEMBER_INDEX_MAX_AGE_SECONDS = int(os.getenv("TEAM_MEMBER_INDEX_MAX_AGE_SECONDS", "600"))
+
+class TeamMemberIndex:
+    def __init__(self, event_id: uuid.UUID, by_rsn: Dict[str, uuid.UUID], by_discord_id: Dict[str, uuid.UUID]) -> None:
+        self.event_id = event_id
+        self.by_rsn = by_rsn
+        self.by_discord_id = by_discord_id
+        self.built_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.built_at > TEAM_MEMBER_INDEX_MAX_AGE_SECONDS
+
+    def team_for_rsn(self, rsn: str | None) -> Optional[uuid.UUID]:
+        if not rsn:
+            return None
+        return self.by_rsn.get(normalize_rsn(rsn))
+
+    def team_for_discord_id(self, discord_id: str | None) -> Optional[uuid.UUID]:
+        if not discord_id:
+            return None
+        return self.by_discord_id.get(str(discord_id))
+
+def build_team_member_index(event_id: uuid.UUID) -> TeamMemberIndex:
+    rows = db.session.query(
+        EventTeamMemberMappings.username,
+        EventTeamMemberMappings.username_normalized,
+        EventTeamMemberMappings.discord_id,
+        EventTeamMemberMappings.team_id
+    ).filter(EventTeamMemberMappings.event_id == event_id).all()
+
+    by_rsn: Dict[str, uuid.UUID] = {}
+    by_discord_id: Dict[str, uuid.UUID] = {}
+    for row in rows:
+        # Rows written before username_normalized existed are normalized here until they are backfilled
+        rsn_key = row.username_normalized or normalize_rsn(row.username)
+        if rsn_key:
+            by_rsn.setdefault(rsn_key, row.team_id)
+        if row.discord_id:
+            by_discord_id.setdefault(str(row.discord_id), row.team_id)
+
+    logging.debug(f"Built team member index for event {event_id}: {len(by_rsn)} names, {len(by_discord_id)} Discord IDs")
+    return TeamMemberIndex(event_id, by_rsn, by_discord_id)
+
+_indexes: Dict[str, TeamMemberIndex] = {}
+_lock = threading.Lock()
+
+def get_team_member_index(event_id: uuid.UUID) -> TeamMemberIndex:
+    """Get the member index for an event, building it on first use"""
+    key = str(event_id)
+    index = _indexes.get(key)
+    if index is not None and not index.is_stale():
+        return index
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or index.is_stale():
+            index = build_team_member_index(event_id)
+            _indexes[key] = index
+    return index
+
+def invalidate_team_member_index(event_id: Optional[uuid.UUID] = None) -> None:
+    """Drop the cached index for an event (or every event) after its members change"""
+    with _lock:
+        if event_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(str(event_id), None)
+
+def _on_members_changed(mapper, connection, target) -> None:
+    invalidate_team_member_index(target.event_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("member_index_dirty", set()).add(target.event_id)
+
+def _on_commit(session) -> None:
+    # Invalidate again once the change is visible to other sessions, so a rebuild
+    # that raced the flush doesn't keep the old members around
+    for event_id in session.info.pop("member_index_dirty", set()):
+        invalidate_team_member_index(event_id)
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    sa_event.listen(EventTeamMemberMappings, _event_name, _on_members_changed)
+sa_event.listen(db.session, "after_commit", _on_commit)
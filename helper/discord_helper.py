@@ -138,4 +138,31 @@ def get_event_category_id() -> Optional[str]:
         return None
     except requests.exceptions.RequestException as e:
         logging.error(f"Failed to get Discord categories: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+def send_event_notifications(notifications: List[Dict[str, Any]]) -> bool:
+    """
+    Sends event notifications to the Discord bot for posting in their threads
+    
+    Args:
+        notifications: Notification dicts in the same shape /events/submit returns
+        
+    Returns:
+        True if the bot accepted the notifications, False otherwise
+    """
+    token = os.getenv("DISCORD_BOT_API_TOKEN")
+    url = os.getenv("DISCORD_BOT_API") + "/events/notifications"
+    
+    json_data = {
+        "notifications": notifications,
+        "token": token
+    }
+    
+    try:
+        response = requests.post(url, json=json_data, timeout=10)
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to send event notifications: {str(e)}")
+        return False
@@ -3,6 +3,7 @@ import json
 import decimal
 from datetime import date, datetime
 from uuid import UUID
+import re
 
 # Used to serialize the models to be returned from the endpoints
 class Serializer(object):
@@ -25,3 +26,12 @@ class ModelEncoder(json.JSONEncoder):
         if isinstance(obj, (datetime, date)):
             return obj.isoformat()
         return json.JSONEncoder.default(self, obj)
+
+# OSRS treats spaces, underscores, hyphens and non-breaking spaces in names as the same character
+_RSN_SEPARATORS = re.compile(r"[\s_\-\u00a0]+")
+
+def normalize_rsn(rsn: str | None) -> str | None:
+    """Canonical form of a RuneScape name for case/separator-insensitive matching"""
+    if rsn is None:
+        return None
+    return _RSN_SEPARATORS.sub(" ", rsn).strip().lower()
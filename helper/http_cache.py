@@ -0,0 +1,84 @@
+"""
+ETags and an in-memory response cache for read endpoints that are polled
+
+An endpoint passes the versions its response is built from (e.g. a team's
+version and its board's fingerprint) to conditional_json_response():
+- the ETag is a hash of those versions, so it's the same in every process
+- a request whose If-None-Match holds that ETag gets a 304 without the
+  response being built
+- otherwise the response body is cached under the ETag; identical polls are
+  served from memory until one of the versions changes
+
+Only 200 responses are cached. RESPONSE_CACHE_SIZE bounds the cache (least
+recently used entries are dropped first).
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from flask import Response, request
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+
+def make_etag(*parts) -> str:
+    """A strong ETag (unquoted) for a response built from these versions"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+class ResponseCache:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._entries: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag: str, body: bytes, mimetype: str) -> None:
+        with self._lock:
+            self._entries[etag] = (body, mimetype)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+def _with_etag(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # Clients may keep the response but must check it's current before using it
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def conditional_json_response(etag: Optional[str], build: Callable[[], tuple]):
+    """
+    Answer a GET from If-None-Match or the response cache, building it only when needed
+
+    build() returns (response, status) like an endpoint does. etag must
+    already identify the endpoint and its arguments (see make_etag); without
+    one the response is just built.
+    """
+    if etag is None:
+        return build()
+    if request.if_none_match.contains_weak(etag):
+        return _with_etag(Response(status=304), etag)
+
+    cached = response_cache.get(etag)
+    if cached is not None:
+        body, mimetype = cached
+        return _with_etag(Response(body, status=200, mimetype=mimetype), etag)
+
+    response, status = build()
+    if status != 200:
+        return response, status
+    response_cache.put(etag, response.get_data(), response.mimetype)
+    return _with_etag(response, etag), status
@@ -1,6 +1,7 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
-from helper.helpers import Serializer
+from helper.helpers import Serializer, normalize_rsn
+from sqlalchemy.orm import validates
 import uuid
 import datetime
 
@@ -313,6 +314,13 @@ class EventTeams(db.Model, Serializer):
     image = db.Column(db.String)
     captain = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete="CASCADE"))  # Cascade delete
     data = db.Column(JSONB, default={})
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1") # Bumped on every write; stale writes raise StaleDataError
+
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        # Region occupancy lookups (which teams are on an island)
+        db.Index('ix_event_teams_event_id_island_id', 'event_id', db.text("(data ->> 'islandId')")),
+    )
 
     def serialize(self):
         return Serializer.serialize(self)
@@ -323,8 +331,19 @@ class EventTeamMemberMappings(db.Model, Serializer):
     event_id = db.Column(UUID(as_uuid=True), db.ForeignKey('events.id', ondelete="CASCADE"), nullable=False)
     team_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_teams.id', ondelete="CASCADE"), nullable=False)
     username = db.Column(db.String)
+    username_normalized = db.Column(db.String) # normalize_rsn(username), kept in sync by the validator below
     discord_id = db.Column(db.String)
 
+    __table_args__ = (
+        db.Index('ix_event_team_member_mappings_event_username_normalized', 'event_id', 'username_normalized'),
+        db.Index('ix_event_team_member_mappings_event_discord_id', 'event_id', 'discord_id'),
+    )
+
+    @validates("username")
+    def _set_username_normalized(self, key, username):
+        self.username_normalized = normalize_rsn(username)
+        return username
+
     def serialize(self):
         return Serializer.serialize(self)
     
@@ -357,3 +376,55 @@ class EventTriggers(db.Model, Serializer):
     
     def serialize(self):
         return Serializer.serialize(self)
+
+# Ordered links behind EventChallenges.tasks and EventTasks.triggers, kept in step with the arrays
+# (see event_handlers/stability_party/definition_links.py) so definitions load with JOINs
+class EventChallengeTasks(db.Model, Serializer):
+    __tablename__ = 'event_challenge_tasks'
+    challenge_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_challenges.id', ondelete="CASCADE"), primary_key=True)  # Cascade delete
+    position = db.Column(db.Integer, primary_key=True)  # Index in EventChallenges.tasks
+    task_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_tasks.id', ondelete="CASCADE"), nullable=False, index=True)  # Cascade delete
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
+class EventTaskTriggers(db.Model, Serializer):
+    __tablename__ = 'event_task_triggers'
+    task_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_tasks.id', ondelete="CASCADE"), primary_key=True)  # Cascade delete
+    position = db.Column(db.Integer, primary_key=True)  # Index in EventTasks.triggers
+    trigger_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_triggers.id', ondelete="CASCADE"), nullable=False, index=True)  # Cascade delete
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
+class EventSubmissionQueue(db.Model, Serializer):
+    __tablename__ = 'event_submission_queue'
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    payload = db.Column(JSONB, nullable=False) # Raw /events/submit body, or a list of them from /events/submit/batch
+    status = db.Column(db.String, nullable=False, default="PENDING") # enum: "PENDING", "PROCESSING", "DELIVERING", "DONE", "FAILED"
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    notifications = db.Column(JSONB) # Notification dicts produced by the handlers
+    handled = db.Column(JSONB) # {"<handler>:<position>": notification dicts or null} for handler calls already committed, skipped on a retry
+    enqueued_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    started_at = db.Column(db.DateTime)
+    processed_at = db.Column(db.DateTime)
+    delivered_at = db.Column(db.DateTime)
+    delivery_attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    next_delivery_at = db.Column(db.DateTime) # When a DELIVERING row may be claimed for (another) delivery attempt
+
+    __table_args__ = (
+        db.Index('ix_event_submission_queue_status_enqueued_at', 'status', 'enqueued_at'),
+    )
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
+class SubmissionIdempotencyKeys(db.Model, Serializer):
+    __tablename__ = 'submission_idempotency_keys'
+    key = db.Column(db.String, primary_key=True) # Idempotency-Key header, or a hash of the submission fields and its drop ID
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def serialize(self):
+        return Serializer.serialize(self)
@@ -2,6 +2,7 @@ from app import db
 from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 from helper.helpers import Serializer
 import uuid
+import datetime
     
 class SP3Regions(db.Model, Serializer):
     __tablename__ = 'sp3_regions'
@@ -31,6 +32,15 @@ class SP3EventTiles(db.Model, Serializer):
     def serialize(self):
         return Serializer.serialize(self)
     
+class SP3RegionChallenges(db.Model, Serializer):
+    __tablename__ = 'sp3_region_challenges'  # Ordered links behind SP3Regions.challenges
+    region_id = db.Column(UUID(as_uuid=True), db.ForeignKey('sp3_regions.id', ondelete="CASCADE"), primary_key=True)  # Cascade delete
+    position = db.Column(db.Integer, primary_key=True)  # Index in SP3Regions.challenges
+    challenge_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_challenges.id', ondelete="CASCADE"), nullable=False, index=True)  # Cascade delete
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
 class SP3EventTileChallengeMapping(db.Model, Serializer):
     __tablename__ = 'sp3_event_tile_challenge_mapping'
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -41,3 +51,70 @@ class SP3EventTileChallengeMapping(db.Model, Serializer):
 
     def serialize(self):
         return Serializer.serialize(self)
+
+class SP3ChallengeProgress(db.Model, Serializer):
+    __tablename__ = 'sp3_challenge_progress'
+    team_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_teams.id', ondelete="CASCADE"), primary_key=True)  # Cascade delete
+    challenge_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    task_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Only ever changed with server-side increments or resets
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
+class SP3TeamJournal(db.Model, Serializer):
+    __tablename__ = 'sp3_team_journal'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)  # Global order of changes
+    team_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_teams.id', ondelete="CASCADE"), nullable=False)  # Cascade delete
+    event_id = db.Column(UUID(as_uuid=True), db.ForeignKey('events.id', ondelete="CASCADE"))  # Cascade delete
+    action = db.Column(db.String, nullable=False)  # What made the change, e.g. "stability_party_handler", "roll_dice_progression", "undo_roll"
+    data = db.Column(JSONB, nullable=False)  # Changed top-level team.data fields, or the whole document when full is set
+    full = db.Column(db.Boolean, nullable=False, default=False)
+    progress = db.Column(JSONB)  # Challenge progress changes: {"seed"|"add"|"set"|"replace": {challenge_id: {task_id: value}}}
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        db.Index('ix_sp3_team_journal_team_id_id', 'team_id', 'id'),
+    )
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
+class SP3TeamSnapshots(db.Model, Serializer):
+    __tablename__ = 'sp3_team_snapshots'
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    team_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_teams.id', ondelete="CASCADE"), nullable=False)  # Cascade delete
+    journal_id = db.Column(db.BigInteger, nullable=False, default=0)  # Last journal entry included in this state
+    reason = db.Column(db.String, nullable=False)  # "baseline", "periodic", "pre_roll", "pre_roll_undone", "undo"
+    data = db.Column(JSONB, nullable=False)  # Full team.data
+    progress = db.Column(JSONB, nullable=False)  # Full {challenge_id: {task_id: progress}}
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        db.Index('ix_sp3_team_snapshots_team_id_journal_id', 'team_id', 'journal_id'),
+    )
+
+    def serialize(self):
+        return Serializer.serialize(self)
+
+class SP3EventStandings(db.Model, Serializer):
+    __tablename__ = 'sp3_event_standings'
+    team_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_teams.id', ondelete="CASCADE"), primary_key=True)  # Cascade delete
+    event_id = db.Column(UUID(as_uuid=True), db.ForeignKey('events.id', ondelete="CASCADE"), nullable=False)  # Cascade delete
+    team_name = db.Column(db.String)
+    stars = db.Column(db.Integer, nullable=False, default=0)
+    coins = db.Column(db.Integer, nullable=False, default=0)
+    current_tile_id = db.Column(UUID(as_uuid=True))
+    current_tile_name = db.Column(db.String)
+    region_id = db.Column(UUID(as_uuid=True))
+    region_name = db.Column(db.String)
+    tile_completed = db.Column(db.Boolean, nullable=False, default=False)
+    rank = db.Column(db.Integer, nullable=False)  # Stars then coins; tied teams share a rank
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        db.Index('ix_sp3_event_standings_event_id_rank', 'event_id', 'rank'),
+    )
+
+    def serialize(self):
+        return Serializer.serialize(self)
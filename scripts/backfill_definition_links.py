@@ -0,0 +1,34 @@
+import sys
+import os
+
+# Add the project root directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import db, app  # Import the Flask app
+from event_handlers.stability_party.definition_links import backfill_definition_links
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+def backfill():
+    """
+    Fills the challenge definition link tables from the ID arrays they replace as a read path.
+    Returns the number of links written per table.
+    """
+    logging.info("Starting challenge definition link backfill")
+
+    with app.app_context():
+        counts = backfill_definition_links()
+        db.session.commit()
+        logging.info(f"Backfilled challenge definition links: {counts}")
+        return counts
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,43 @@
+import sys
+import os
+
+# Add the project root directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import db, app  # Import the Flask app
+from models.models import EventTeamMemberMappings
+from helper.helpers import normalize_rsn
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+def backfill_member_usernames():
+    """
+    Fills event_team_member_mappings.username_normalized for rows created before the column existed.
+    Returns the number of rows updated.
+    """
+    logging.info("Starting username_normalized backfill")
+
+    with app.app_context():
+        members = EventTeamMemberMappings.query.all()
+        count = 0
+
+        for member in members:
+            normalized = normalize_rsn(member.username)
+            if member.username_normalized != normalized:
+                member.username_normalized = normalized
+                count += 1
+
+        db.session.commit()
+        logging.info(f"Backfilled username_normalized for {count} of {len(members)} member mappings")
+        return count
+
+if __name__ == "__main__":
+    backfill_member_usernames()
@@ -0,0 +1,73 @@
+import sys
+import os
+
+# Add the project root directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import db, app  # Import the Flask app
+from event_handlers.stability_party.board_io import export_board, import_board, invalidate_board_caches
+import argparse
+import json
+import logging
+import time
+import uuid
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+def export_to_file(event_id, path):
+    """Write an event's board document to a file ("-" for stdout)"""
+    with app.app_context():
+        document = export_board(uuid.UUID(event_id))
+    output = json.dumps(document, indent=2)
+    if path == "-":
+        print(output)
+    else:
+        with open(path, "w") as file:
+            file.write(output)
+        logging.info(f"Exported {len(document['tiles'])} tiles and {len(document['regions'])} regions to {path}")
+
+def import_from_file(event_id, path, replace=False):
+    """
+    Load a board document file into an event in one transaction.
+    Returns the number of rows inserted per table.
+    """
+    with open(path, "r") as file:
+        document = json.load(file)
+
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            counts = import_board(uuid.UUID(event_id), document, replace=replace)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        invalidate_board_caches(uuid.UUID(event_id))
+        logging.info(f"Imported board from {path} in {time.perf_counter() - started:.2f}s: {counts}")
+        return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import or export a Stability Party board")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write an event's board to a JSON document")
+    export_parser.add_argument("event_id")
+    export_parser.add_argument("path", nargs="?", default="-")
+
+    import_parser = subparsers.add_parser("import", help="Load a JSON board document into an event")
+    import_parser.add_argument("event_id")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--replace", action="store_true", help="Overwrite the event's existing board")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_to_file(args.event_id, args.path)
+    else:
+        import_from_file(args.event_id, args.path, replace=args.replace)
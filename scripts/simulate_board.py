@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add the project root directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import app  # Import the Flask app
+from event_handlers.stability_party.board_io import export_board
+from event_handlers.stability_party.simulator import STRATEGIES, simulate_board
+import argparse
+import json
+import logging
+import time
+import uuid
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+def load_board(source):
+    """Read a board document from a file, or export it from the event with that ID"""
+    if os.path.exists(source):
+        with open(source, "r") as file:
+            return json.load(file)
+    with app.app_context():
+        return export_board(uuid.UUID(source))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate games on a Stability Party board and report how stars, coins and laps are distributed")
+    parser.add_argument("source", help="Board document file, or the ID of the event to export the board from")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--teams", type=int, default=4, help="Teams per game")
+    parser.add_argument("--turns", type=int, default=30, help="Rolls per team per game")
+    parser.add_argument("--strategy", action="append", choices=sorted(STRATEGIES), help="Repeat to mix strategies in each game (default: greedy)")
+    parser.add_argument("--region-rate", type=float, default=0.1, help="Chance a team completes its region challenge instead of its tile")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+
+    args = parser.parse_args()
+    document = load_board(args.source)
+
+    started = time.perf_counter()
+    report = simulate_board(
+        document,
+        games=args.games,
+        teams=args.teams,
+        turns=args.turns,
+        strategies=args.strategy or ["greedy"],
+        seed=args.seed,
+        workers=args.workers,
+        region_rate=args.region_rate
+    )
+    logging.info(f"Simulation finished in {time.perf_counter() - started:.2f}s")
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,90 @@
+"""Shared fixtures for the database tests (a Postgres database is required)"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import app, db
+from models.models import Events, EventTeams, EventTeamMemberMappings, EventChallenges, EventTasks, EventTriggers
+from models.stability_party_3 import SP3Regions, SP3EventTiles, SP3EventTileChallengeMapping
+from event_handlers.active_event_registry import invalidate_active_events
+from event_handlers.stability_party.trigger_index import invalidate_trigger_index
+
+@pytest.fixture
+def database():
+    """An empty schema, for tests that don't need a board"""
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def sp3_team():
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+
+        now = datetime.now(timezone.utc)
+        event = Events(
+            type="STABILITY_PARTY",
+            name="Concurrency Test",
+            start_time=now - timedelta(days=1),
+            end_time=now + timedelta(days=1),
+            data={}
+        )
+        db.session.add(event)
+        db.session.flush()
+
+        trigger = EventTriggers(trigger="Test Drop", source="Test Boss", type="DROP")
+        db.session.add(trigger)
+        db.session.flush()
+
+        # A quantity no test will reach, so the challenge keeps accepting progress
+        task = EventTasks(triggers=[str(trigger.id)], quantity=1_000_000, value=1)
+        db.session.add(task)
+        db.session.flush()
+
+        challenge = EventChallenges(type="AND", tasks=[str(task.id)], value=1)
+        db.session.add(challenge)
+        db.session.flush()
+
+        region = SP3Regions(event_id=event.id, name="Test Island", challenges=[], data={})
+        db.session.add(region)
+        db.session.flush()
+
+        tile = SP3EventTiles(event_id=event.id, region_id=region.id, name="Test Tile", data={"nextTiles": []})
+        db.session.add(tile)
+        db.session.flush()
+
+        db.session.add(SP3EventTileChallengeMapping(tile_id=tile.id, challenge_id=challenge.id, type="TILE"))
+
+        team = EventTeams(
+            event_id=event.id,
+            name="Test Team",
+            data={"currentTile": str(tile.id), "islandId": str(region.id), "isTileCompleted": False}
+        )
+        db.session.add(team)
+        db.session.flush()
+
+        db.session.add(EventTeamMemberMappings(event_id=event.id, team_id=team.id, username="TestPlayer"))
+        db.session.commit()
+
+        invalidate_active_events()
+        invalidate_trigger_index()
+
+        yield {"event_id": event.id, "team_id": team.id, "challenge_id": str(challenge.id), "task_id": str(task.id)}
+
+        db.session.remove()
+        db.drop_all()
+
+def _load_team(team_id: uuid.UUID) -> EventTeams:
+    db.session.expire_all()
+    return EventTeams.query.filter_by(id=team_id).first()
+
+@pytest.fixture
+def load_team():
+    """Reload a team from the database, dropping anything the session has cached"""
+    return _load_team
@@ -0,0 +1,166 @@
+from sqlalchemy.orm.attributes import flag_modified
+
+from app import db
+from models.models import Events
+from models.stability_party_3 import SP3EventTiles
+from event_handlers.stability_party.board_graph import get_board_graph, invalidate_board_graph
+from event_handlers.stability_party.stability_party_handler import is_dock_tile, is_star_tile
+
+def test_board_graph_follows_board_edits(sp3_team):
+    invalidate_board_graph()
+    event_id = sp3_team["event_id"]
+    tile = SP3EventTiles.query.filter_by(event_id=event_id).first()
+
+    graph = get_board_graph(event_id)
+    assert graph.next_tiles(tile.id) == ()
+    assert not is_dock_tile(tile.id)
+    assert get_board_graph(event_id) is graph
+
+    # Adding a tile and linking to it rebuilds the graph
+    dock = SP3EventTiles(event_id=event_id, region_id=tile.region_id, name="Dock", data={"isDock": True, "nextTiles": []})
+    db.session.add(dock)
+    db.session.flush()
+    tile.data = {**tile.data, "nextTiles": [str(dock.id)]}
+    db.session.commit()
+
+    graph = get_board_graph(event_id)
+    assert graph.next_tiles(tile.id) == (dock.id,)
+    assert is_dock_tile(dock.id)
+
+    # Moving a star is picked up too
+    event = db.session.get(Events, event_id)
+    event.data["star_tiles"] = [str(dock.id)]
+    flag_modified(event, "data")
+    db.session.commit()
+
+    assert is_star_tile(dock.id)
+    assert get_board_graph(event_id).region_has_star(tile.region_id)
+
+def test_movement_runs_to_the_next_decision_point(sp3_team):
+    from event_handlers.stability_party.save_data import RollState, SaveData
+    from event_handlers.stability_party.stability_party_handler import _process_next_move
+
+    invalidate_board_graph()
+    event_id = sp3_team["event_id"]
+    start = SP3EventTiles.query.filter_by(event_id=event_id).first()
+
+    # start -> 1 -> 2 -> 3 -> dock
+    dock = SP3EventTiles(event_id=event_id, region_id=start.region_id, name="Dock", data={"isDock": True, "nextTiles": []})
+    db.session.add(dock)
+    db.session.flush()
+    next_id = dock.id
+    for number in (3, 2, 1):
+        tile = SP3EventTiles(event_id=event_id, region_id=start.region_id, name=f"Tile {number}", data={"nextTiles": [str(next_id)]})
+        db.session.add(tile)
+        db.session.flush()
+        next_id = tile.id
+    start.data = {**start.data, "nextTiles": [str(next_id)]}
+    db.session.commit()
+
+    save = SaveData.from_dict({"currentTile": str(start.id), "islandId": str(start.region_id)})
+    save.roll_state = RollState(event_id, sp3_team["team_id"], 6, start.id)
+
+    response = _process_next_move(event_id, sp3_team["team_id"], save)
+
+    # One call walks the straight path and stops at the dock with moves left over
+    assert response["action_required"] == RollState.ACTION_TYPES["DOCK"]
+    assert [tile["name"] for tile in response["path_segment"]] == ["Tile 1", "Tile 2", "Tile 3", "Dock"]
+    assert save.currentTile == dock.id
+    assert save.roll_state.roll_remaining == 2
+
+def test_region_occupancy_follows_team_moves(sp3_team, load_team):
+    from models.stability_party_3 import SP3Regions
+    from event_handlers.stability_party.save_data import SaveData, save_team_data
+    from event_handlers.stability_party.stability_party_handler import is_region_populated
+
+    event_id = sp3_team["event_id"]
+    start = SP3EventTiles.query.filter_by(event_id=event_id).first()
+    other = SP3Regions(event_id=event_id, name="Other Island", challenges=[], data={})
+    db.session.add(other)
+    db.session.commit()
+
+    assert is_region_populated(start.region_id, event_id)
+    assert not is_region_populated(start.region_id, event_id, exclude_team_id=sp3_team["team_id"])
+    assert not is_region_populated(other.id, event_id)
+
+    # A partial write of islandId moves the team in the index
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data, team.id)
+    save.islandId = str(other.id)
+    save_team_data(team, save)
+
+    assert is_region_populated(other.id, event_id)
+    assert not is_region_populated(start.region_id, event_id)
+
+def test_star_moves_to_an_open_tile_on_an_empty_region(sp3_team):
+    from models.stability_party_3 import SP3Regions
+    from event_handlers.stability_party.star_placement import move_star
+
+    invalidate_board_graph()
+    event_id = sp3_team["event_id"]
+    start = SP3EventTiles.query.filter_by(event_id=event_id).first()
+
+    # The team is on start's region; the only open tile is "Open" on the empty island
+    empty = SP3Regions(event_id=event_id, name="Empty Island", challenges=[], data={})
+    db.session.add(empty)
+    db.session.flush()
+    shop = SP3EventTiles(event_id=event_id, region_id=empty.id, name="Shop", data={"isShop": True, "nextTiles": []})
+    open_tile = SP3EventTiles(event_id=event_id, region_id=empty.id, name="Open", data={"nextTiles": []})
+    db.session.add_all([shop, open_tile])
+    event = db.session.get(Events, event_id)
+    event.data = {**(event.data or {}), "star_tiles": [str(start.id)]}
+    db.session.commit()
+
+    graph = get_board_graph(event_id)
+    assert graph.region_has_star(start.region_id)
+    assert [node.name for node in graph.placement_pools[str(empty.id)]] == ["Open"]
+
+    old, new = move_star(event_id, start.id)
+    db.session.commit()
+
+    assert old.id == start.id
+    assert new.id == open_tile.id
+    # The stars are swapped into the cached board without a rebuild
+    moved = get_board_graph(event_id)
+    assert moved.placement_pools is graph.placement_pools
+    assert is_star_tile(open_tile.id) and not is_star_tile(start.id)
+    assert moved.region_has_star(empty.id) and not moved.region_has_star(start.region_id)
+
+def test_board_distances_follow_next_tiles(sp3_team):
+    from event_handlers.stability_party.board_distances import get_board_distances
+
+    invalidate_board_graph()
+    event_id = sp3_team["event_id"]
+    start = SP3EventTiles.query.filter_by(event_id=event_id).first()
+
+    # start -> a -> b, plus start -> b as a shortcut; c is off the path
+    b = SP3EventTiles(event_id=event_id, region_id=start.region_id, name="B", data={"nextTiles": []})
+    c = SP3EventTiles(event_id=event_id, region_id=start.region_id, name="C", data={"nextTiles": []})
+    db.session.add_all([b, c])
+    db.session.flush()
+    a = SP3EventTiles(event_id=event_id, region_id=start.region_id, name="A", data={"nextTiles": [str(b.id)]})
+    db.session.add(a)
+    db.session.flush()
+    start.data = {**start.data, "nextTiles": [str(a.id), str(b.id)]}
+    db.session.commit()
+
+    distances = get_board_distances(event_id)
+    assert distances.distance(start.id, start.id) == 0
+    assert distances.distance(start.id, a.id) == 1
+    assert distances.distance(start.id, b.id) == 1
+    assert distances.distance(b.id, start.id) is None
+    assert distances.nearest(start.id, [str(c.id), str(a.id)]) == (str(a.id), 1)
+
+    # Moving stars keeps the table; editing tiles recomputes it
+    event = db.session.get(Events, event_id)
+    event.data = {**(event.data or {}), "star_tiles": [str(b.id)]}
+    db.session.commit()
+    assert get_board_distances(event_id) is distances
+
+    # A rebuild of the same layout keeps it as well
+    invalidate_board_graph()
+    assert get_board_distances(event_id) is distances
+
+    b.data = {"nextTiles": [str(c.id)]}
+    db.session.commit()
+    assert get_board_distances(event_id).distance(start.id, c.id) == 2
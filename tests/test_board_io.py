@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from models.models import Events, EventTriggers, EventTriggerMappings
+from models.stability_party_3 import SP3EventTiles, SP3EventTileChallengeMapping
+from event_handlers.stability_party.board_io import export_board, import_board
+
+def test_exported_board_clones_into_a_new_event(sp3_team):
+    source_id = sp3_team["event_id"]
+    start = SP3EventTiles.query.filter_by(event_id=source_id).first()
+    second = SP3EventTiles(event_id=source_id, region_id=start.region_id, name="Second Tile", data={"nextTiles": [str(start.id)]})
+    db.session.add(second)
+    db.session.flush()
+    start.data = {**start.data, "nextTiles": [str(second.id)]}
+    source = db.session.get(Events, source_id)
+    source.data = {**(source.data or {}), "star_tiles": [str(second.id)]}
+    db.session.commit()
+
+    document = export_board(source_id)
+
+    now = datetime.now(timezone.utc)
+    clone = Events(type="STABILITY_PARTY", name="Clone", start_time=now, end_time=now + timedelta(days=1), data={})
+    db.session.add(clone)
+    db.session.commit()
+    triggers_before = EventTriggers.query.count()
+
+    counts = import_board(clone.id, document)
+    db.session.commit()
+
+    assert counts["tiles"] == 2
+    # The existing trigger is reused rather than duplicated
+    assert counts["triggers"] == 0
+    assert EventTriggers.query.count() == triggers_before
+    assert EventTriggerMappings.query.filter_by(event_id=clone.id).count() == 1
+
+    tiles = {tile.name: tile for tile in SP3EventTiles.query.filter_by(event_id=clone.id).all()}
+    assert tiles["Test Tile"].id != start.id
+    assert tiles["Test Tile"].data["nextTiles"] == [str(tiles["Second Tile"].id)]
+    assert tiles["Second Tile"].region_id == tiles["Test Tile"].region_id != start.region_id
+    assert SP3EventTileChallengeMapping.query.filter_by(tile_id=tiles["Test Tile"].id).count() == 1
+    assert db.session.get(Events, clone.id).data["star_tiles"] == [str(tiles["Second Tile"].id)]
+
+    # A second import needs replace, and a bad reference leaves the board untouched
+    with pytest.raises(ValueError):
+        import_board(clone.id, document)
+    db.session.rollback()
+
+    document["tiles"][0]["data"]["nextTiles"] = ["missing"]
+    with pytest.raises(ValueError):
+        import_board(clone.id, document, replace=True)
+    db.session.rollback()
+    assert SP3EventTiles.query.filter_by(event_id=clone.id).count() == 2
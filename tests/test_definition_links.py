@@ -0,0 +1,50 @@
+import uuid
+
+from sqlalchemy import event as sa_event
+
+from app import db
+from models.models import EventChallenges, EventChallengeTasks, EventTasks
+from event_handlers.stability_party.definition_links import backfill_definition_links, load_challenge_tree
+
+def test_challenge_tree_loads_in_array_order_with_one_query(sp3_team):
+    # The challenge is flushed before two of the tasks it refers to
+    first = EventTasks(id=uuid.uuid4(), triggers=[], quantity=1, value=1)
+    second = EventTasks(id=uuid.uuid4(), triggers=[], quantity=2, value=1)
+    challenge = EventChallenges(type="OR", tasks=[str(second.id), sp3_team["task_id"], str(first.id)], value=1)
+    db.session.add(challenge)
+    db.session.flush()
+    db.session.add_all([first, second])
+    db.session.commit()
+    challenge_id, first_id, second_id = str(challenge.id), str(first.id), str(second.id)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        challenges, tasks, triggers = load_challenge_tree([challenge_id])
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    assert [challenge_row.tasks for challenge_row in challenges] == [[second_id, sp3_team["task_id"], first_id]]
+    assert {str(task.id) for task in tasks} == {first_id, second_id, sp3_team["task_id"]}
+    assert [trigger.trigger for trigger in triggers] == ["Test Drop"]
+
+    # A rebuild from the arrays gives the same links
+    before = EventChallengeTasks.query.count()
+    counts = backfill_definition_links()
+    db.session.commit()
+    assert counts["event_challenge_tasks"] == before == EventChallengeTasks.query.count()
+
+def test_arrays_are_used_where_links_are_missing(sp3_team):
+    # As after `flask db upgrade` creates the tables, before the backfill has run
+    db.session.execute(db.text("DELETE FROM event_challenge_tasks"))
+    db.session.execute(db.text("DELETE FROM event_task_triggers"))
+    db.session.commit()
+
+    challenges, tasks, triggers = load_challenge_tree([sp3_team["challenge_id"]])
+    assert [challenge.tasks for challenge in challenges] == [[sp3_team["task_id"]]]
+    assert [str(task.id) for task in tasks] == [sp3_team["task_id"]]
+    assert [trigger.trigger for trigger in triggers] == ["Test Drop"]
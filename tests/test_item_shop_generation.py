@@ -170,6 +170,18 @@ def test_item_distribution_over_many_runs(
             "This could be due to limited unique items or generation logic issues.")
 
 
+def test_seeded_shop_inventory_is_repeatable(mock_get_all_items_fixture, mock_rarity_weights_fixture):
+    """The same seed gives the same items and prices; every registered item can be drawn once"""
+    for shop_tier in (1, 3):
+        first = generate_shop_inventory("seeded_event", shop_tier=shop_tier, item_count=3, seed=1234)
+        second = generate_shop_inventory("seeded_event", shop_tier=shop_tier, item_count=3, seed=1234)
+        assert first == second
+        assert len({item["id"] for item in first}) == len(first) == min(3, len(ACTUAL_ITEM_REGISTRY))
+
+    everything = generate_shop_inventory("seeded_event", item_count=len(ACTUAL_ITEM_REGISTRY) + 5, seed=1)
+    assert sorted(item["id"] for item in everything) == sorted(str(item_id) for item_id in ACTUAL_ITEM_REGISTRY)
+
+
 # To run this test:
 # 1. Ensure `event_handlers.stability_party.item_system.py` exists.
 # 2. Ensure `event_handlers/stability_party/item_registry.py` exists and is populated.
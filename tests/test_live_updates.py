@@ -0,0 +1,66 @@
+import time
+
+from app import app
+from event_handlers.stability_party import live_updates
+from event_handlers.stability_party.live_updates import live_hub
+from event_handlers.stability_party.save_data import SaveData, save_team_data
+
+def test_updates_resume_from_a_cursor(sp3_team, load_team):
+    event_id = sp3_team["event_id"]
+    team_id = str(sp3_team["team_id"])
+    client = app.test_client()
+
+    # Without a cursor the client gets a snapshot to follow the event from
+    client.get(f"/events/{event_id}/updates")
+    assert live_hub.listening.wait(10)
+    response = client.get(f"/events/{event_id}/updates")
+    assert response.status_code == 200
+    body = response.get_json()
+    snapshot = body["updates"][0]
+    assert snapshot["snapshot"] is True
+    assert [team["team_id"] for team in snapshot["teams"]] == [team_id]
+    cursor = body["cursor"]
+
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data, team.id)
+    save.coins = 42
+    save_team_data(team, save)
+
+    # The write and the standings refresh after its commit arrive as one update or two
+    updates = []
+    for _ in range(2):
+        body = client.get(f"/events/{event_id}/updates?since={cursor}&wait=10").get_json()
+        updates += body["updates"]
+        cursor = body["cursor"]
+        if any(update["standings"] for update in updates):
+            break
+    assert all(update["snapshot"] is False for update in updates)
+    assert [(team["team_id"], team["coins"]) for update in updates for team in update["teams"]] == [(team_id, 42)]
+    assert [(row["team_id"], row["coins"]) for update in updates for row in update["standings"]] == [(team_id, 42)]
+
+    # Nothing new since the last update
+    response = client.get(f"/events/{event_id}/updates?since={cursor}")
+    assert response.get_json() == {"cursor": cursor, "updates": []}
+
+    # A cursor from another hub run can't be resumed from
+    response = client.get(f"/events/{event_id}/updates?since=stale.1")
+    assert response.get_json()["updates"][0]["snapshot"] is True
+
+def test_waiting_requests_leave_server_threads_free(sp3_team, monkeypatch):
+    event_id = sp3_team["event_id"]
+    client = app.test_client()
+    client.get(f"/events/{event_id}/updates")
+    assert live_hub.listening.wait(10)
+    cursor = client.get(f"/events/{event_id}/updates").get_json()["cursor"]
+    monkeypatch.setattr(live_updates, "LIVE_UPDATES_MAX_WAITING", 0)
+
+    response = client.get(f"/events/{event_id}/stream")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+    # A long-poll past the limit answers like a plain poll instead of waiting
+    started = time.monotonic()
+    response = client.get(f"/events/{event_id}/updates?since={cursor}&wait=10")
+    assert time.monotonic() - started < 5
+    assert response.get_json() == {"cursor": cursor, "updates": []}
+    assert live_hub.waiting == 0
@@ -0,0 +1,72 @@
+from sqlalchemy import event as sa_event
+
+from app import app, db
+from helper.http_cache import response_cache
+from event_handlers.stability_party.save_data import SaveData, save_team_data
+
+def test_team_reads_answer_304_until_the_team_changes(sp3_team, load_team):
+    client = app.test_client()
+    url = f"/events/{sp3_team['event_id']}/teams/{sp3_team['team_id']}/tile-progress"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # Progress changes don't touch the team row, but still change the ETag
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data, team.id)
+    save.tileProgress.increment(sp3_team["challenge_id"], sp3_team["task_id"], 1)
+    save_team_data(team, save)
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["tile_progress"] == ["1/1000000 Test Drop from Test Boss"]
+
+    missing = client.get(f"/events/{sp3_team['event_id']}/teams/{sp3_team['event_id']}/stats")
+    assert missing.status_code == 404
+
+def test_tile_progress_renders_without_definition_queries(sp3_team):
+    client = app.test_client()
+    url = f"/events/{sp3_team['event_id']}/teams/{sp3_team['team_id']}/tile-progress"
+    client.get(url)  # Compiles the event's definitions
+    response_cache.clear()
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", record)
+
+    assert response.get_json()["tile_progress"] == ["0/1000000 Test Drop from Test Boss"]
+    assert not [statement for statement in statements if any(table in statement for table in ("event_challenges", "event_tasks", "event_triggers"))]
+
+def test_available_actions_answer_304_until_the_team_changes(sp3_team, load_team):
+    client = app.test_client()
+    url = f"/events/{sp3_team['event_id']}/teams/{sp3_team['team_id']}/available-actions"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.get_json()["current_tile"]["name"] == "Test Tile"
+    assert response.get_json()["available_actions"] == []
+    etag = response.headers["ETag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data, team.id)
+    save.isTileCompleted = True
+    save_team_data(team, save)
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [action["action"] for action in response.get_json()["available_actions"]] == ["roll"]
@@ -0,0 +1,50 @@
+from event_handlers.stability_party.simulator import simulate_board
+
+def _loop_board() -> dict:
+    """Two islands of start -> 1 -> 2 -> 3 -> dock -> start, with a charter between them"""
+    tiles = []
+    for island, other in (("north", "south"), ("south", "north")):
+        names = ["start", "1", "2", "3", "dock"]
+        for i, name in enumerate(names):
+            data = {"nextTiles": [f"{island}-{names[(i + 1) % len(names)]}"]}
+            if name == "start":
+                data["isIslandStart"] = True
+            if name == "dock":
+                data["isDock"] = True
+            tiles.append({
+                "key": f"{island}-{name}",
+                "region": island,
+                "name": f"{island.title()} {name}",
+                "data": data,
+                "challenges": [] if name == "dock" else [{"challenge": "drop", "type": "TILE"}]
+            })
+
+    return {
+        "version": 1,
+        "triggers": [{"key": "bones", "trigger": "Bones", "source": None, "type": "DROP"}],
+        "tasks": [{"key": "bones", "triggers": ["bones"], "quantity": 1, "value": 1}],
+        "challenges": [{"key": "drop", "type": "OR", "tasks": ["bones"], "value": 1}],
+        "regions": [
+            {"key": "north", "name": "North", "challenges": ["drop"], "data": {"charter": {"south": 10}}},
+            {"key": "south", "name": "South", "challenges": ["drop"], "data": {"charter": {"north": 10}}}
+        ],
+        "tiles": tiles,
+        "star_tiles": ["south-2"]
+    }
+
+def test_simulation_is_reproducible_and_runs_the_rules_cleanly():
+    options = dict(games=6, teams=2, turns=20, strategies=["greedy", "random"], seed=7, workers=2)
+
+    report = simulate_board(_loop_board(), **options)
+
+    assert report["games"] == 6
+    assert set(report["strategies"]) == {"greedy", "random"}
+    greedy = report["strategies"]["greedy"]
+    assert greedy["teams"] == 6
+    assert greedy["errors"] == 0
+    # Every team completes laps and earns coins
+    assert greedy["laps"]["min"] > 0
+    assert greedy["coins"]["max"] > 0
+
+    # Same seed, same games, however they are split over workers
+    assert simulate_board(_loop_board(), **{**options, "workers": 1})["strategies"] == report["strategies"]
@@ -0,0 +1,47 @@
+from app import app, db
+from models.models import EventTeams
+from models.stability_party_3 import SP3EventStandings, SP3EventTiles
+from event_handlers.stability_party import standings as standings_module
+from event_handlers.stability_party.save_data import SaveData, save_team_data
+
+def test_standings_follow_team_writes(sp3_team, load_team):
+    event_id = sp3_team["event_id"]
+    tile = SP3EventTiles.query.filter_by(event_id=event_id).first()
+    rival = EventTeams(event_id=event_id, name="Rival", data={"stars": 1, "coins": 5, "currentTile": str(tile.id)})
+    db.session.add(rival)
+    db.session.commit()
+
+    rows = SP3EventStandings.query.filter_by(event_id=event_id).order_by(SP3EventStandings.rank).all()
+    assert [(row.team_name, row.rank) for row in rows] == [("Rival", 1), ("Test Team", 2)]
+    assert rows[0].current_tile_name == tile.name
+
+    # A partial save_team_data write re-ranks the event
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data, team.id)
+    save.stars = 1
+    save.coins = 50
+    save_team_data(team, save)
+
+    response = app.test_client().get(f"/events/{event_id}/progress")
+    assert response.status_code == 200
+    standings = response.get_json()["team_standings"]
+    assert [(team["team_name"], team["rank"], team["coins"]) for team in standings] == [("Test Team", 1, 50), ("Rival", 2, 5)]
+    assert standings[0]["current_region"] == "Test Island"
+
+def test_refresh_runs_after_the_write_commits(sp3_team, load_team, monkeypatch):
+    event_id = sp3_team["event_id"]
+
+    # While another thread is refreshing, a writer only queues its event
+    monkeypatch.setattr(standings_module, "_refreshing", True)
+    team = load_team(sp3_team["team_id"])
+    team.name = "Renamed Team"
+    db.session.commit()
+    assert event_id in standings_module._refresh_queue
+    assert SP3EventStandings.query.filter_by(team_id=sp3_team["team_id"]).one().team_name == "Test Team"
+
+    # The running refresher works through the queue
+    monkeypatch.setattr(standings_module, "_refreshing", False)
+    standings_module.request_standings_refresh([])
+    db.session.expire_all()
+    assert SP3EventStandings.query.filter_by(team_id=sp3_team["team_id"]).one().team_name == "Renamed Team"
+    assert not standings_module._refresh_queue
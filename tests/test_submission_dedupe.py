@@ -0,0 +1,67 @@
+import json
+
+from app import app
+from event_handlers.submission_dedupe import SubmissionDeduplicator, get_idempotency_key
+from event_handlers.stability_party.challenge_progress import ChallengeProgress
+
+SUBMISSION = {
+    "rsn": "TestPlayer",
+    "id": "12345",
+    "trigger": "Test Drop",
+    "source": "Test Boss",
+    "quantity": 1,
+    "totalValue": 0,
+    "type": "LOOT",
+}
+
+def test_derived_key_needs_a_drop_id():
+    # Nothing tells two identical drops apart, so they aren't deduplicated
+    assert get_idempotency_key(SUBMISSION) is None
+
+    drop = {**SUBMISSION, "timestamp": "2026-10-17T00:00:00Z"}
+    key, ttl = get_idempotency_key(dict(reversed(list(drop.items()))))
+    assert key == get_idempotency_key(drop)[0]
+    assert key.startswith("hash:")
+    assert key != get_idempotency_key({**drop, "timestamp": "2026-10-17T00:00:01Z"})[0]
+
+def test_explicit_key_takes_precedence():
+    assert get_idempotency_key(SUBMISSION, "abc")[0] == "key:abc"
+    assert get_idempotency_key({**SUBMISSION, "idempotencyKey": "def"})[0] == "key:def"
+
+def test_repeat_is_dropped_across_processes(database):
+    first = SubmissionDeduplicator(cache_size=10)
+    second = SubmissionDeduplicator(cache_size=10)
+
+    assert first.claim("key:retry", 60)
+    assert not first.claim("key:retry", 60)
+    # A separate process has nothing cached and has to rely on the key table
+    assert not second.claim("key:retry", 60)
+    assert first.stats()["duplicates"] == 1
+    assert second.stats()["duplicates"] == 1
+
+def test_released_key_can_be_claimed_again(database):
+    deduplicator = SubmissionDeduplicator(cache_size=10)
+
+    assert deduplicator.claim("key:failed", 60)
+    deduplicator.release("key:failed")
+    assert deduplicator.claim("key:failed", 60)
+
+def test_expired_key_can_be_claimed_again(database):
+    deduplicator = SubmissionDeduplicator(cache_size=10)
+
+    assert deduplicator.claim("key:expired", 0)
+    assert deduplicator.claim("key:expired", 60)
+
+def test_identical_drops_without_a_key_all_count(sp3_team):
+    client = app.test_client()
+    drop = {**SUBMISSION, "trigger": "Test Drop", "source": "Test Boss"}
+
+    assert client.post("/events/submit", json=drop).status_code == 200
+    assert client.post("/events/submit", json=drop).status_code == 200
+    assert client.post("/events/submit/batch", json=[drop, drop]).status_code == 200
+    # The same drop retried with its key is only counted once
+    assert client.post("/events/submit/batch", json=[{**drop, "idempotencyKey": "once"}]).status_code == 200
+    assert json.loads(client.post("/events/submit", json={**drop, "idempotencyKey": "once"}).data)["duplicate"] is True
+
+    progress = ChallengeProgress.load(sp3_team["team_id"])
+    assert progress[sp3_team["challenge_id"]][sp3_team["task_id"]] == 5
@@ -0,0 +1,44 @@
+from app import db
+from models.models import EventTriggers, EventTriggerMappings
+from event_handlers import submission_filter as submission_filter_module
+from event_handlers.event_handler import EventSubmission
+from event_handlers.submission_filter import SubmissionFilter, submission_filter
+
+def _drop(trigger, source=None):
+    return EventSubmission(rsn="TestPlayer", id=None, trigger=trigger, source=source, quantity=1, totalValue=0, type="LOOT")
+
+def test_only_whitelisted_drops_are_allowed(sp3_team):
+    drop_filter = SubmissionFilter()
+    drop_filter.register_static_trigger("Static Drop")
+
+    assert drop_filter.allows(_drop("test drop", "TEST BOSS"))
+    assert drop_filter.allows(_drop("Static Drop", "Anything"))
+    assert not drop_filter.allows(_drop("Test Drop", "Other Boss"))
+    assert not drop_filter.allows(_drop("Bones", "Goblin"))
+
+    stats = drop_filter.stats()
+    assert (stats["passed"], stats["rejected"], stats["failOpen"]) == (2, 2, False)
+
+def test_filter_fails_open_when_triggers_cannot_load(sp3_team, monkeypatch):
+    def broken(now):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(submission_filter_module, "_load_running_triggers", broken)
+    drop_filter = SubmissionFilter()
+
+    assert drop_filter.allows(_drop("Bones", "Goblin"))
+    assert drop_filter.stats()["failOpen"] is True
+
+def test_trigger_changes_invalidate_the_filter(sp3_team):
+    submission_filter.invalidate()
+    assert not submission_filter.allows(_drop("Zulrah"))
+    version = submission_filter.version
+
+    trigger = EventTriggers(trigger="Zulrah", source=None, type="KC")
+    db.session.add(trigger)
+    db.session.flush()
+    db.session.add(EventTriggerMappings(event_id=sp3_team["event_id"], trigger_id=trigger.id))
+    db.session.commit()
+
+    assert submission_filter.allows(_drop("Zulrah"))
+    assert submission_filter.version == version + 1
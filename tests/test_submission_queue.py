@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app import db
+from models.models import EventSubmissionQueue, SubmissionIdempotencyKeys
+from event_handlers import submission_queue
+from event_handlers.event_handler import EventHandler, NotificationResponse
+from event_handlers.submission_queue import claim_next_submission, enqueue_submission, process_submission
+
+SUBMISSION = {"rsn": "TestPlayer", "trigger": "Test Drop", "source": "Test Boss", "quantity": 1, "type": "LOOT"}
+
+def _reload(row_id) -> EventSubmissionQueue:
+    db.session.expire_all()
+    return db.session.get(EventSubmissionQueue, row_id)
+
+def test_claims_skip_locked_rows_and_reclaim_abandoned_ones(database):
+    first = enqueue_submission(SUBMISSION)
+    second = enqueue_submission(SUBMISSION)
+
+    # Another worker holds the oldest row
+    with db.engine.connect() as other:
+        other.execute(text("SELECT id FROM event_submission_queue WHERE id = :id FOR UPDATE"), {"id": first.id})
+        claimed = claim_next_submission()
+        assert claimed.id == second.id
+        assert claim_next_submission() is None
+        other.rollback()
+
+    # A row left in PROCESSING by a dead worker is picked up once the timeout has passed
+    claimed = claim_next_submission()
+    assert claimed.id == first.id
+    claimed.started_at -= timedelta(seconds=submission_queue.SUBMISSION_VISIBILITY_TIMEOUT_SECONDS + 1)
+    db.session.commit()
+
+    reclaimed = claim_next_submission()
+    assert (reclaimed.id, reclaimed.status, reclaimed.attempts) == (first.id, "PROCESSING", 2)
+
+def test_failed_handling_is_retried_until_max_attempts(database, monkeypatch):
+    def broken(cls, submission, progress=None):
+        raise RuntimeError("handler failed")
+
+    monkeypatch.setattr(EventHandler, "handle_event", classmethod(broken))
+    monkeypatch.setattr(submission_queue, "SUBMISSION_MAX_ATTEMPTS", 2)
+    row_id = enqueue_submission(SUBMISSION).id
+
+    process_submission(claim_next_submission())
+    row = _reload(row_id)
+    assert (row.status, row.attempts, row.error) == ("PENDING", 1, "handler failed")
+
+    process_submission(claim_next_submission())
+    assert _reload(row_id).status == "FAILED"
+    assert claim_next_submission() is None
+
+def test_retry_skips_handler_calls_that_already_committed(database, monkeypatch):
+    calls = []
+
+    def applied(submission):
+        calls.append("applied")
+        db.session.add(SubmissionIdempotencyKeys(key=f"applied-{len(calls)}"))
+        db.session.commit()
+        return [NotificationResponse(threadId=None, title="Applied")]
+
+    def flaky(submission):
+        calls.append("flaky")
+        if calls.count("flaky") == 1:
+            raise RuntimeError("handler failed")
+        return None
+
+    monkeypatch.setattr(EventHandler, "handlers", [applied, flaky])
+    monkeypatch.setattr(EventHandler, "batch_handlers", {})
+    monkeypatch.setattr(submission_queue, "send_event_notifications", lambda notifications: True)
+    row_id = enqueue_submission(SUBMISSION).id
+
+    process_submission(claim_next_submission())
+    row = _reload(row_id)
+    assert row.status == "PENDING"
+    assert list(row.handled) == ["applied:0"]
+
+    # The retry only runs the handler that failed, and keeps the first one's notification
+    process_submission(claim_next_submission())
+    row = _reload(row_id)
+    assert row.status == "DONE"
+    assert calls == ["applied", "flaky", "flaky"]
+    assert SubmissionIdempotencyKeys.query.count() == 1
+    assert [notification["title"] for notification in row.notifications] == ["Applied"]
+
+def test_undelivered_notifications_are_retried_without_rerunning_handlers(database, monkeypatch):
+    handled = []
+    deliveries = []
+
+    def handle(cls, submission, progress=None):
+        handled.append(submission)
+        return {"notifications": [{"title": "Test Drop"}]}
+
+    monkeypatch.setattr(EventHandler, "handle_event", classmethod(handle))
+    monkeypatch.setattr(submission_queue, "send_event_notifications", lambda notifications: deliveries.pop(0))
+    monkeypatch.setattr(submission_queue, "SUBMISSION_MAX_DELIVERY_ATTEMPTS", 3)
+    row_id = enqueue_submission(SUBMISSION).id
+
+    deliveries[:] = [False]
+    process_submission(claim_next_submission())
+    row = _reload(row_id)
+    assert (row.status, row.delivery_attempts, row.delivered_at) == ("DELIVERING", 1, None)
+    # Not due yet
+    assert claim_next_submission() is None
+
+    row.next_delivery_at -= timedelta(hours=2)
+    db.session.commit()
+    deliveries[:] = [True]
+    process_submission(claim_next_submission())
+    row = _reload(row_id)
+    assert (row.status, row.delivery_attempts) == ("DONE", 2)
+    assert row.delivered_at is not None
+    assert len(handled) == 1
+
+    # A delivery that keeps failing ends up FAILED with its notifications kept
+    row_id = enqueue_submission(SUBMISSION).id
+    for _ in range(3):
+        deliveries[:] = [False]
+        row = claim_next_submission()
+        process_submission(row)
+        row = _reload(row_id)
+        if row.next_delivery_at is not None:
+            row.next_delivery_at -= timedelta(hours=2)
+            db.session.commit()
+    row = _reload(row_id)
+    assert (row.status, row.delivery_attempts) == ("FAILED", 3)
+    assert row.notifications == [{"title": "Test Drop"}]
@@ -0,0 +1,214 @@
+import uuid
+import threading
+
+from sqlalchemy import text
+
+from app import app, db
+from models.models import EventTasks
+from models.stability_party_3 import SP3EventTiles
+from event_handlers.event_handler import EventSubmission
+from event_handlers.stability_party.stability_party_handler import stability_party_handler
+from event_handlers.stability_party.item_system import add_item_to_inventory
+from event_handlers.stability_party.challenge_progress import ChallengeProgress
+from event_handlers.stability_party.trigger_index import invalidate_trigger_index
+
+THREADS = 8
+SUBMISSIONS_PER_THREAD = 25
+
+def run_threads(target):
+    errors = []
+
+    def worker():
+        try:
+            with app.app_context():
+                target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def test_concurrent_submissions_do_not_lose_progress(sp3_team, load_team):
+    def submit_many():
+        for _ in range(SUBMISSIONS_PER_THREAD):
+            stability_party_handler(EventSubmission(
+                rsn="TestPlayer",
+                id=None,
+                trigger="Test Drop",
+                source="Test Boss",
+                quantity=1,
+                totalValue=0,
+                type="LOOT"
+            ))
+
+    errors = run_threads(submit_many)
+    assert errors == []
+
+    team = load_team(sp3_team["team_id"])
+    progress = ChallengeProgress.load(team.id)[sp3_team["challenge_id"]][sp3_team["task_id"]]
+    assert progress == THREADS * SUBMISSIONS_PER_THREAD
+    # Progress lives in its own table; only the first save rewrites the team row (to fill in its defaults)
+    assert "tileProgress" not in team.data
+    assert team.version == 2
+
+def _tick():
+    return stability_party_handler(EventSubmission(
+        rsn="TestPlayer",
+        id=None,
+        trigger="Test Drop",
+        source="Test Boss",
+        quantity=1,
+        totalValue=0,
+        type="LOOT"
+    ))
+
+def test_progress_ticks_do_not_wait_for_the_team_lock(sp3_team, load_team):
+    assert _tick() == [] # The first save fills in the team's defaults under the lock
+
+    # Another request holds the team, as lock_team() does
+    with db.engine.connect() as other:
+        other.execute(text("SELECT id FROM event_teams WHERE id = :id FOR NO KEY UPDATE"), {"id": sp3_team["team_id"]})
+        db.session.execute(text("SET LOCAL lock_timeout = '1s'"))
+        assert _tick() == []
+        other.rollback()
+
+    progress = ChallengeProgress.load(sp3_team["team_id"])[sp3_team["challenge_id"]][sp3_team["task_id"]]
+    assert progress == 2
+
+def test_completing_tick_is_applied_under_the_team_lock(sp3_team, load_team):
+    task = db.session.get(EventTasks, uuid.UUID(sp3_team["task_id"]))
+    task.quantity = 3
+    db.session.commit()
+    invalidate_trigger_index(sp3_team["event_id"])
+
+    assert _tick() == []
+    assert _tick() == []
+    notifications = _tick()
+    assert len(notifications) == 1
+
+    team = load_team(sp3_team["team_id"])
+    assert team.data["isTileCompleted"] is True
+    assert team.data["coins"] == 10
+    # The completed tile no longer accepts progress
+    assert _tick() is None
+
+def test_concurrent_inventory_updates_do_not_lose_items(sp3_team, load_team):
+    def add_items():
+        for _ in range(3):
+            assert add_item_to_inventory(str(sp3_team["event_id"]), str(sp3_team["team_id"]), "coin_pouch")
+
+    errors = run_threads(add_items)
+    assert errors == []
+
+    team = load_team(sp3_team["team_id"])
+    assert len(team.data["itemList"]) == THREADS * 3
+
+def test_save_writes_only_changed_fields(sp3_team, load_team):
+    from event_handlers.stability_party.save_data import SaveData, save_team_data
+
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data)
+    save.coins = 10
+    save_team_data(team, save)  # First save adds the missing fields, so it rewrites the whole document
+    version = team.version
+
+    # Anything outside the changed fields, even a key SaveData doesn't know about, is left alone
+    db.session.execute(
+        db.text("UPDATE event_teams SET data = data || '{\"note\": \"kept\"}'::jsonb WHERE id = :id"),
+        {"id": sp3_team["team_id"]}
+    )
+    db.session.commit()
+
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict({key: value for key, value in team.data.items() if key != "note"})
+    save.coins += 5
+    save.itemList.append({"id": "coin_pouch"})
+    assert set(save.dirty_fields()) == {"coins", "itemList"}
+    save_team_data(team, save)
+
+    team = load_team(sp3_team["team_id"])
+    assert team.data["coins"] == 15
+    assert team.data["itemList"] == [{"id": "coin_pouch"}]
+    assert team.data["note"] == "kept"
+    assert team.version == version + 1
+
+def test_legacy_progress_moves_to_progress_table(sp3_team, load_team):
+    from event_handlers.stability_party.save_data import SaveData, save_team_data
+
+    team = load_team(sp3_team["team_id"])
+    team.data = {**team.data, "tileProgress": {sp3_team["challenge_id"]: {sp3_team["task_id"]: 7}}}
+    db.session.commit()
+
+    team = load_team(sp3_team["team_id"])
+    save = SaveData.from_dict(team.data, team.id)
+    save.tileProgress.increment(sp3_team["challenge_id"], sp3_team["task_id"], 3)
+    save_team_data(team, save)
+
+    team = load_team(sp3_team["team_id"])
+    assert "tileProgress" not in team.data
+    assert ChallengeProgress.load(team.id)[sp3_team["challenge_id"]][sp3_team["task_id"]] == 10
+
+    save = SaveData.from_dict(team.data, team.id)
+    save.tileProgress.reset(sp3_team["challenge_id"], [sp3_team["task_id"]])
+    save_team_data(team, save)
+    assert ChallengeProgress.load(team.id)[sp3_team["challenge_id"]][sp3_team["task_id"]] == 0
+
+def _crossroad_at_team_tile(sp3_team, load_team):
+    """Give the team's tile two exits and let the team roll; returns the exits"""
+    start = SP3EventTiles.query.filter_by(event_id=sp3_team["event_id"]).first()
+    exits = [SP3EventTiles(event_id=start.event_id, region_id=start.region_id, name=name, data={"nextTiles": []}) for name in ("Left", "Right")]
+    db.session.add_all(exits)
+    db.session.flush()
+    start.data = {**start.data, "nextTiles": [str(tile.id) for tile in exits]}
+    # load_team() expires the session, which would drop the tile edit if it weren't committed yet
+    db.session.commit()
+    team = load_team(sp3_team["team_id"])
+    team.data = {**team.data, "isTileCompleted": True}
+    db.session.commit()
+    return exits
+
+def test_turn_session_carries_state_between_roll_steps(sp3_team, load_team):
+    from event_handlers.stability_party import turn_session
+    from event_handlers.stability_party.save_data import RollState
+    from event_handlers.stability_party.stability_party_handler import roll_dice_progression
+
+    left, _ = _crossroad_at_team_tile(sp3_team, load_team)
+    event_id, team_id = str(sp3_team["event_id"]), str(sp3_team["team_id"])
+
+    response, status = roll_dice_progression(event_id, team_id)
+    assert status == 200
+    assert response["action_required"] == RollState.ACTION_TYPES["CROSSROAD"]
+    session = turn_session._sessions[team_id]
+    assert session.version == load_team(sp3_team["team_id"]).version
+
+    response, status = roll_dice_progression(event_id, team_id, {"directionId": str(left.id)}, action_type=RollState.ACTION_TYPES["CROSSROAD"])
+    assert status == 200
+    # The step continued from the kept SaveData, and the finished turn isn't kept
+    assert session.save.currentTile == left.id
+    assert team_id not in turn_session._sessions
+    assert load_team(sp3_team["team_id"]).data["currentTile"] == str(left.id)
+
+def test_turn_session_is_dropped_after_another_write(sp3_team, load_team):
+    from event_handlers.stability_party.turn_session import resume_turn_session
+    from event_handlers.stability_party.save_data import RollState
+    from event_handlers.stability_party.stability_party_handler import roll_dice_progression
+
+    left, _ = _crossroad_at_team_tile(sp3_team, load_team)
+    event_id, team_id = str(sp3_team["event_id"]), str(sp3_team["team_id"])
+    roll_dice_progression(event_id, team_id)
+
+    # Another request writes the team between two steps of the turn
+    team = load_team(sp3_team["team_id"])
+    team.data = {**team.data, "coins": 500}
+    db.session.commit()
+
+    assert resume_turn_session(sp3_team["event_id"], sp3_team["team_id"]) is None
+    db.session.rollback()
+
+    response, status = roll_dice_progression(event_id, team_id, {"directionId": str(left.id)}, action_type=RollState.ACTION_TYPES["CROSSROAD"])
+    assert status == 200
+    assert load_team(sp3_team["team_id"]).data["coins"] == 500
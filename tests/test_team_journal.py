@@ -0,0 +1,48 @@
+from app import db
+from event_handlers.stability_party.save_data import SaveData, save_team_data
+from event_handlers.stability_party.challenge_progress import ChallengeProgress
+from event_handlers.stability_party.team_journal import rebuild_team_state, take_team_snapshot, undo_last_roll
+from models.stability_party_3 import SP3TeamJournal
+
+def save_coins(load_team, team_id, coins, challenge_id=None, task_id=None):
+    team = load_team(team_id)
+    save = SaveData.from_dict(team.data, team.id)
+    save.coins = coins
+    if challenge_id is not None:
+        save.tileProgress.increment(challenge_id, task_id, 1)
+    save_team_data(team, save)
+
+def test_rebuild_matches_current_state(sp3_team, load_team):
+    for coins in range(1, 8):
+        save_coins(load_team, sp3_team["team_id"], coins, sp3_team["challenge_id"], sp3_team["task_id"])
+
+    team = load_team(sp3_team["team_id"])
+    data, progress = rebuild_team_state(team.id)
+    assert data == team.data
+    assert progress == ChallengeProgress.load(team.id).to_dict()
+
+    # Any earlier point can be rebuilt too
+    third = SP3TeamJournal.query.filter_by(team_id=team.id).order_by(SP3TeamJournal.id).offset(2).first()
+    data, progress = rebuild_team_state(team.id, third.id)
+    assert data["coins"] == 3
+    assert progress[sp3_team["challenge_id"]][sp3_team["task_id"]] == 3
+
+def test_undo_roll_restores_state_before_the_roll(sp3_team, load_team):
+    save_coins(load_team, sp3_team["team_id"], 10)
+
+    team = load_team(sp3_team["team_id"])
+    take_team_snapshot(team, "pre_roll")
+    db.session.commit()
+    save_coins(load_team, sp3_team["team_id"], 25, sp3_team["challenge_id"], sp3_team["task_id"])
+
+    team = load_team(sp3_team["team_id"])
+    assert undo_last_roll(team) is not None
+    db.session.commit()
+
+    team = load_team(sp3_team["team_id"])
+    assert team.data["coins"] == 10
+    assert ChallengeProgress.load(team.id).get(sp3_team["challenge_id"], {}).get(sp3_team["task_id"], 0) == 0
+    assert rebuild_team_state(team.id)[0] == team.data
+
+    # The same roll can't be undone twice
+    assert undo_last_roll(team) is None
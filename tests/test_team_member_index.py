@@ -0,0 +1,27 @@
+from app import db
+from models.models import EventTeamMemberMappings
+from helper.helpers import normalize_rsn
+from event_handlers.team_member_index import get_team_member_index
+
+def test_normalize_rsn_ignores_case_and_separators():
+    assert normalize_rsn("Zezima") == normalize_rsn("ZEZIMA") == "zezima"
+    assert normalize_rsn("Iron Man") == normalize_rsn("iron_man") == normalize_rsn("Iron-Man") == "iron man"
+    assert normalize_rsn("Iron  _Man ") == "iron man"
+    assert normalize_rsn(None) is None
+
+def test_team_is_resolved_by_rsn_and_discord_id(sp3_team):
+    event_id, team_id = sp3_team["event_id"], sp3_team["team_id"]
+    index = get_team_member_index(event_id)
+    assert index.team_for_rsn("testplayer") == team_id
+    assert index.team_for_rsn(" TESTPLAYER") == team_id
+    assert index.team_for_rsn("Someone Else") is None
+    assert index.team_for_discord_id("1234") is None
+
+    # A new member shows up without waiting for the index to expire
+    db.session.add(EventTeamMemberMappings(event_id=event_id, team_id=team_id, username="Alt_Account", discord_id="1234"))
+    db.session.commit()
+
+    index = get_team_member_index(event_id)
+    assert index.team_for_rsn("alt account") == index.team_for_rsn("ALT-ACCOUNT") == team_id
+    assert index.team_for_discord_id("1234") == team_id
+    assert index.team_for_discord_id(None) is None
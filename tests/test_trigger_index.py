@@ -0,0 +1,59 @@
+import uuid
+from types import SimpleNamespace
+
+from app import db
+from models.models import EventTriggers
+from event_handlers.stability_party import trigger_index
+from event_handlers.stability_party.trigger_index import compile_trigger_index, get_trigger_index, invalidate_trigger_index
+
+def _row(**fields):
+    return SimpleNamespace(id=uuid.uuid4(), **fields)
+
+def test_exact_and_wildcard_sources_merge():
+    exact = _row(trigger="Dragon bones", source="Vorkath", type="DROP")
+    wildcard = _row(trigger="Dragon bones", source=None, type="DROP")
+    other = _row(trigger="Zulrah", source=None, type="KC")
+    task_exact = _row(triggers=[str(exact.id)], quantity=1, value=1)
+    task_wildcard = _row(triggers=[str(wildcard.id)], quantity=1, value=1)
+    task_other = _row(triggers=[str(other.id)], quantity=1, value=1)
+    both = _row(type="OR", tasks=[str(task_exact.id), str(task_wildcard.id)], value=1)
+    only_wildcard = _row(type="OR", tasks=[str(task_wildcard.id), str(task_other.id)], value=1)
+    region = _row(challenges=[str(both.id), str(only_wildcard.id)])
+
+    index = compile_trigger_index(
+        uuid.uuid4(), [region], [], [both, only_wildcard],
+        [task_exact, task_wildcard, task_other], [exact, wildcard, other]
+    )
+
+    # The matching source gets its own tasks plus the ones that accept any source
+    assert index.match("DRAGON BONES", "vorkath") == {
+        str(both.id): frozenset({str(task_exact.id), str(task_wildcard.id)}),
+        str(only_wildcard.id): frozenset({str(task_wildcard.id)})
+    }
+    # Any other source only gets the wildcard tasks
+    assert index.match("Dragon bones", "Galvek") == {
+        str(both.id): frozenset({str(task_wildcard.id)}),
+        str(only_wildcard.id): frozenset({str(task_wildcard.id)})
+    }
+    assert index.match("Zulrah", None) == {str(only_wildcard.id): frozenset({str(task_other.id)})}
+    assert index.match("Bones", "Goblin") == {}
+
+def test_index_is_rebuilt_after_invalidation_and_expiry(sp3_team, monkeypatch):
+    event_id = sp3_team["event_id"]
+    index = get_trigger_index(event_id)
+    assert get_trigger_index(event_id) is index
+    assert index.match("Test Drop", "Test Boss")
+
+    trigger = EventTriggers.query.filter_by(trigger="Test Drop").first()
+    trigger.source = "Other Boss"
+    db.session.commit()
+    invalidate_trigger_index(event_id)
+
+    rebuilt = get_trigger_index(event_id)
+    assert rebuilt is not index
+    assert rebuilt.match("Test Drop", "Test Boss") == {}
+    assert rebuilt.match("Test Drop", "Other Boss")
+
+    # An index past its age limit is rebuilt on the next lookup
+    monkeypatch.setattr(trigger_index, "TRIGGER_INDEX_MAX_AGE_SECONDS", -1)
+    assert get_trigger_index(event_id) is not rebuilt